@@ -0,0 +1,57 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Any, Callable, Optional
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+
+def make_etag(*parts: Any) -> str:
+    """由若干版本标识拼出一个弱校验 ETag"""
+    digest = hashlib.sha1("|".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+
+def _to_http_date(value: datetime) -> str:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return format_datetime(value.astimezone(timezone.utc), usegmt=True)
+
+
+def _is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        # If-None-Match 优先于 If-Modified-Since
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        return etag in candidates or "*" in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        current = last_modified if last_modified.tzinfo else last_modified.replace(tzinfo=timezone.utc)
+        return current.replace(microsecond=0) <= since
+    return False
+
+
+def conditional_json(
+        request: Request,
+        etag: str,
+        build: Callable[[], Any],
+        last_modified: Optional[datetime] = None
+) -> Response:
+    """
+    条件 GET：校验器命中时直接返回 304，不调用 build，也就没有序列化和传输开销。
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        headers["Last-Modified"] = _to_http_date(last_modified)
+
+    if _is_not_modified(request, etag, last_modified):
+        return Response(status_code=304, headers=headers)
+
+    return JSONResponse(content=jsonable_encoder(build()), headers=headers)
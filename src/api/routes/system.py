@@ -0,0 +1,33 @@
+from fastapi import APIRouter, Depends
+
+from src.api.deps import get_current_admin
+
+from src.core.logger import log_sink
+from src.engine.retention import storage_gc
+from src.engine.scheduler import scheduler
+
+router = APIRouter()
+
+
+# 1. 日志写入队列状态
+@router.get("/log-sink")
+def get_log_sink_stats():
+    return log_sink.stats()
+
+
+# 2. 调度器状态
+@router.get("/scheduler")
+def get_scheduler_stats():
+    return scheduler.snapshot()
+
+
+# 3. 存储回收状态 (累计释放的字节数与删除的行数)
+@router.get("/gc")
+def get_gc_stats():
+    return storage_gc.stats()
+
+
+# 4. 立即执行一轮存储回收 (仅管理员；有任务排队或另一轮回收进行中时跳过)
+@router.post("/gc", dependencies=[Depends(get_current_admin)])
+def run_gc():
+    return storage_gc.run_once()
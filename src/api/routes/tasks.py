@@ -1,26 +1,89 @@
 import os
-import shutil
+import json
+import time
+import base64
 import uuid
+import threading
 import traceback
+from datetime import datetime
 from typing import List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
-from sqlalchemy.orm import Session
-
-from src.db.session import get_db
-from src.db.models import Task, TestCase, StreamLog, User
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Header, Request, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy import String, and_, or_, func, type_coerce
+from sqlalchemy.orm import Session, joinedload, load_only
+from starlette.concurrency import run_in_threadpool
+
+from src.core.config import settings
+from src.core.metrics import cache_lookup
+from src.db.session import get_db, SessionLocal
+from src.db.search import task_name_filter
+from src.db.blob_store import put_code, resolve_code
+from src.core.logger import log_broker
+from src.core.log_archive import read_archived_logs
+from src.db.models import Task, TestCase, StreamLog, User, TaskSpan, TaskArtifact, LLMCall, GasReport
 from src.engine.manager import TaskManager
+from src.engine.scheduler import scheduler, estimate_wait_seconds
+from src.engine.dedup import content_fingerprint, find_previous_task, clone_task_result, ACTIVE_STATUSES
+from src.engine.budget import task_budgets, budget_usage
 from src.engine.tools.file_manager import FileManager
 from src.api.deps import get_current_user
+from src.api.etag import make_etag, conditional_json
 
 router = APIRouter()
 
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
 
 # 1. 获取任务列表
+# 列表总数允许近似：同一组过滤条件的 count 结果缓存 LIST_COUNT_CACHE_TTL 秒
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+
+
+def _cached_count(key, query) -> int:
+    now = time.monotonic()
+    with _count_cache_lock:
+        hit = _count_cache.get(key)
+        if hit and now - hit[1] < settings.LIST_COUNT_CACHE_TTL:
+            cache_lookup("task_list_count", True)
+            return hit[0]
+    cache_lookup("task_list_count", False)
+
+    total = query.order_by(None).count()
+    with _count_cache_lock:
+        if len(_count_cache) > 1000:
+            _count_cache.clear()
+        _count_cache[key] = (total, now)
+    return total
+
+
+def _encode_cursor(task: Task) -> str:
+    raw = json.dumps([task.created_at.isoformat() if task.created_at else None, task.id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        created_at, task_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), task_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _cursor_time(db: Session, value: datetime):
+    # SQLite 中 server_default 写入的时间不带微秒 ("YYYY-MM-DD HH:MM:SS")，
+    # 按同样的字符串格式比较，避免与 SQLAlchemy 默认的微秒格式错位
+    if db.bind.dialect.name == "sqlite" and value.microsecond == 0:
+        return type_coerce(value.strftime("%Y-%m-%d %H:%M:%S"), String)
+    return value
+
+
 @router.get("/")
 def list_tasks(
         page: int = 1,
         page_size: int = 20,
+        cursor: Optional[str] = None,
         owner_id: Optional[int] = None,
         keyword: Optional[str] = None,
         status: Optional[str] = None,
@@ -35,18 +98,40 @@ def list_tasks(
     if owner_id:
         query = query.filter(Task.owner_id == owner_id)
     if keyword:
-        query = query.filter(Task.name.like(f"%{keyword}%"))
+        query = query.filter(task_name_filter(keyword))
     if status and status != "all":
         query = query.filter(Task.status == status)
     if creator_name:
-        query = query.join(User).filter(User.username.like(f"%{creator_name}%"))
+        # 用户表很小，先解析出 owner_id，再走 tasks.owner_id 索引
+        owner_ids = [uid for (uid,) in db.query(User.id).filter(User.username.like(f"%{creator_name}%"))]
+        query = query.filter(Task.owner_id.in_(owner_ids))
     if start_date:
         query = query.filter(Task.created_at >= start_date)
     if end_date:
         query = query.filter(Task.created_at <= end_date + " 23:59:59")
 
-    total = query.count()
-    tasks = query.order_by(Task.created_at.desc()).offset((page - 1) * page_size).limit(page_size).all()
+    cache_key = (owner_id, keyword, status, creator_name, start_date, end_date)
+    total = _cached_count(cache_key, query)
+
+    # 列表只需要少量字段，避免加载源码/报告等大字段；owner 一次性 JOIN 加载
+    query = query.options(
+        load_only(Task.id, Task.name, Task.status, Task.contract_name,
+                  Task.created_at, Task.started_at, Task.duration, Task.owner_id),
+        joinedload(Task.owner).load_only(User.username)
+    ).order_by(Task.created_at.desc(), Task.id.desc())
+
+    if cursor:
+        # Keyset 分页：按 (created_at, id) 从上一页最后一行继续
+        cursor_at, cursor_id = _decode_cursor(cursor)
+        cursor_at = _cursor_time(db, cursor_at)
+        query = query.filter(or_(
+            Task.created_at < cursor_at,
+            and_(Task.created_at == cursor_at, Task.id < cursor_id)
+        ))
+    else:
+        query = query.offset((page - 1) * page_size)
+
+    tasks = query.limit(page_size).all()
 
     items = []
     for t in tasks:
@@ -65,7 +150,31 @@ def list_tasks(
         "items": items,
         "total": total,
         "page": page,
-        "page_size": page_size
+        "page_size": page_size,
+        "next_cursor": _encode_cursor(tasks[-1]) if len(tasks) == page_size else None
+    }
+
+
+# 1.1 当前用户的 LLM 用量 (按任务汇总)
+@router.get("/usage")
+def get_user_usage(
+        limit: int = 20,
+        db: Session = Depends(get_db),
+        current_user: User = Depends(get_current_user)
+):
+    base = db.query(*_USAGE_COLUMNS) \
+        .join(Task, Task.id == LLMCall.task_id) \
+        .filter(Task.owner_id == current_user.id)
+    per_task = base.add_columns(Task.id, Task.name) \
+        .group_by(Task.id, Task.name) \
+        .order_by(func.sum(LLMCall.total_tokens).desc()) \
+        .limit(limit) \
+        .all()
+
+    return {
+        "user_id": current_user.id,
+        "totals": _usage_row(base.one()),
+        "top_tasks": [dict(_usage_row(r[:5]), task_id=r[5], name=r[6]) for r in per_task]
     }
 
 
@@ -73,6 +182,11 @@ def list_tasks(
 @router.post("/create")
 def create_task(
         name: str,
+        priority: int = Query(0, ge=0, le=settings.TASK_MAX_PRIORITY),
+        max_rounds: Optional[int] = None,
+        max_wall_seconds: Optional[int] = None,
+        max_container_seconds: Optional[int] = None,
+        token_budget: Optional[int] = None,
         db: Session = Depends(get_db),
         current_user: User = Depends(get_current_user)
 ):
@@ -81,6 +195,11 @@ def create_task(
         id=task_id,
         name=name,
         status="created",
+        priority=priority,
+        max_rounds=max_rounds,
+        max_wall_seconds=max_wall_seconds,
+        max_container_seconds=max_container_seconds,
+        token_budget=token_budget,
         owner_id=current_user.id
     )
     db.add(new_task)
@@ -112,25 +231,51 @@ async def upload_contract(
         file_path = fm.task_dir / file.filename
         print(f"DEBUG: Uploading file to {file_path}")
 
+        # 单次流式读取：边写盘边累计内容，超过大小上限立即中止
+        chunks = []
+        size = 0
         with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                size += len(chunk)
+                if size > settings.MAX_UPLOAD_BYTES:
+                    break
+                buffer.write(chunk)
+                chunks.append(chunk)
 
-        file.file.seek(0)
-        content = await file.read()
+        if size > settings.MAX_UPLOAD_BYTES:
+            file_path.unlink(missing_ok=True)
+            raise HTTPException(status_code=413, detail=f"File exceeds {settings.MAX_UPLOAD_BYTES} bytes")
 
         try:
-            source_code = content.decode("utf-8")
+            source_code = b"".join(chunks).decode("utf-8")
         except UnicodeDecodeError:
-            source_code = "// Error: Unable to decode file content."
+            # 不能用占位文本代替：所有无法解码的上传会共享同一指纹，误复用无关任务的结果
+            file_path.unlink(missing_ok=True)
+            raise HTTPException(status_code=400, detail="Contract file must be UTF-8 encoded")
 
         task.contract_name = file.filename
-        task.source_code = source_code
-        task.codes = {"original": source_code, "fix": ""}
+        task.source_hash = put_code(source_code)
+        task.fixed_hash = None
+        task.content_hash = content_fingerprint(source_code)
         task.status = "uploaded"
 
+        # 相同合约 + 相同流水线配置的历史任务：已完成的可直接复用，否则用于热启动
+        previous = find_previous_task(db, task.content_hash, task.id)
+        cache_lookup("upload_result_reuse", previous is not None)
+        task.warm_start_from = previous.id if previous else None
         db.commit()
-        return {"status": "success", "filename": file.filename}
 
+        response = {"status": "success", "filename": file.filename, "content_hash": task.content_hash}
+        if previous:
+            response["previous_task"] = {
+                "task_id": previous.id,
+                "status": previous.status,
+                "reusable": previous.status == "completed"
+            }
+        return response
+
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Upload Error: {str(e)}")
         traceback.print_exc()
@@ -138,14 +283,36 @@ async def upload_contract(
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
 
+# 3.1 直接复用相同合约的已完成结果
+@router.post("/{task_id}/reuse")
+def reuse_task_result(task_id: str, db: Session = Depends(get_db)):
+    task = _get_task_or_404(db, task_id)
+    if not task.content_hash:
+        raise HTTPException(status_code=400, detail="Upload a contract first")
+    if task.status in ACTIVE_STATUSES or scheduler.is_running(task.id) or scheduler.queue_position(task.id) is not None:
+        raise HTTPException(status_code=409, detail="Task is queued or running")
+
+    previous = find_previous_task(db, task.content_hash, task.id)
+    if previous is None or previous.status != "completed":
+        raise HTTPException(status_code=404, detail="No completed task with identical contract")
+
+    clone_task_result(db, previous, task)
+    return {"status": "reused", "reused_from": previous.id}
+
+
 # 4. 启动任务
 @router.post("/{task_id}/start")
-def start_task(task_id: str, db: Session = Depends(get_db)):
+def start_task(task_id: str, priority: Optional[int] = Query(None, ge=0, le=settings.TASK_MAX_PRIORITY),
+               db: Session = Depends(get_db)):
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
     try:
+        if priority is not None:
+            task.priority = priority
+            db.commit()
+
         manager = TaskManager(db, task_id)
         manager.start_execution()
         return {"status": "started"}
@@ -165,39 +332,365 @@ def stop_task(task_id: str, db: Session = Depends(get_db)):
     return {"status": "stopped"}
 
 
-# 6. 获取详情
-@router.get("/{task_id}/detail")
-def get_task_detail(task_id: str, db: Session = Depends(get_db)):
+# 5.1 查询排队位置
+@router.get("/{task_id}/queue")
+def get_queue_position(task_id: str, db: Session = Depends(get_db)):
     task = db.query(Task).filter(Task.id == task_id).first()
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
+    info = scheduler.queue_info(task_id)
+    position, blocked = info if info else (None, False)
+    # 所属用户已达并发上限时，要等该用户的任务结束才会被调度，无法按位置估算等待时间
+    eta_seconds = estimate_wait_seconds(db, position) if position is not None and not blocked else None
+
+    return {
+        "id": task.id,
+        "status": task.status,
+        "priority": task.priority,
+        "running": scheduler.is_running(task_id),
+        "queue_position": position,
+        "blocked_by_user_limit": blocked,
+        "estimated_wait_seconds": eta_seconds,
+        "scheduler": scheduler.snapshot()
+    }
+
+
+# 6. 获取详情 (完整数据，包含全部代码)
+def _case_brief(tc: TestCase) -> dict:
+    return {
+        "id": tc.id,
+        "name": tc.name,
+        "source": tc.source,
+        "finding": tc.finding,
+        "status": tc.status,
+        "description": tc.description,
+        "version_added": tc.version_added,
+        "created_at": tc.created_at
+    }
+
+
+def _task_codes(db: Session, task: Task) -> dict:
+    return {
+        "original": resolve_code(db, task.source_hash, task.source_code),
+        "fix": resolve_code(db, task.fixed_hash, task.fixed_code)
+    }
+
+
+def _get_task_or_404(db: Session, task_id: str) -> Task:
+    task = db.query(Task).filter(Task.id == task_id).first()
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return task
+
+
+@router.get("/{task_id}/detail")
+def get_task_detail(task_id: str, db: Session = Depends(get_db)):
+    task = _get_task_or_404(db, task_id)
+
     return {
         "id": task.id,
         "name": task.name,
         "status": task.status,
         "contract_name": task.contract_name,
-        "codes": {
-            "original": task.source_code,
-            "fix": task.fixed_code
-        },
+        "codes": _task_codes(db, task),
         "slither_report": task.slither_report,
-        "matrix_cases": task.test_cases,
+        "fuzzer_report": json.loads(task.fuzzer_report) if task.fuzzer_report else None,
+        "differential_report": json.loads(task.differential_report) if task.differential_report else None,
+        "matrix_cases": [dict(_case_brief(tc), code=resolve_code(db, tc.code_hash, tc.code)) for tc in task.test_cases],
         "created_at": task.created_at,
         "started_at": task.started_at,
         "duration": task.duration
     }
 
 
-# 7. 获取日志
-@router.get("/{task_id}/logs")
-def get_logs(task_id: str, db: Session = Depends(get_db)):
-    logs = db.query(StreamLog) \
-        .filter(StreamLog.task_id == task_id) \
-        .order_by(StreamLog.timestamp.asc()) \
+# 6.1 轻量摘要 (供前端轮询，带 ETag)
+@router.get("/{task_id}/summary")
+def get_task_summary(task_id: str, request: Request, db: Session = Depends(get_db)):
+    task = _get_task_or_404(db, task_id)
+    # 校验器只用聚合查询 (各状态用例数 + 版本号之和 + 最近一次用例变更)，未变化时不加载用例也不序列化
+    per_status = db.query(TestCase.status, func.count(TestCase.id), func.sum(TestCase.version),
+                          func.max(TestCase.updated_at)) \
+        .filter(TestCase.task_id == task_id) \
+        .group_by(TestCase.status) \
+        .all()
+
+    counts = {"total": 0, "FAILING": 0, "PASSING": 0, "PENDING": 0}
+    last_modified = task.updated_at
+    for case_status, n, _, case_updated_at in per_status:
+        counts[case_status] = counts.get(case_status, 0) + n
+        counts["total"] += n
+        if case_updated_at and (last_modified is None or case_updated_at > last_modified):
+            last_modified = case_updated_at
+
+    etag = make_etag(task.id, "summary", task.version,
+                     *(f"{status_}:{n}:{v}" for status_, n, v, _ in sorted(per_status, key=lambda row: str(row[0]))))
+
+    def build():
+        cases = db.query(TestCase) \
+            .filter(TestCase.task_id == task_id) \
+            .order_by(TestCase.created_at.asc()) \
+            .all()
+        return {
+            "id": task.id,
+            "name": task.name,
+            "status": task.status,
+            "current_phase": task.current_phase,
+            "contract_name": task.contract_name,
+            "priority": task.priority,
+            "counts": counts,
+            "matrix_cases": [_case_brief(tc) for tc in cases],
+            "created_at": task.created_at,
+            "started_at": task.started_at,
+            "finished_at": task.finished_at,
+            "duration": task.duration
+        }
+
+    return conditional_json(request, etag, build, last_modified)
+
+
+# 6.2 按需加载：原始代码与修复代码
+@router.get("/{task_id}/code")
+def get_task_code(task_id: str, request: Request, db: Session = Depends(get_db)):
+    task = _get_task_or_404(db, task_id)
+    if task.source_hash:
+        # 内容寻址：哈希不变即内容不变，阶段切换等无关更新不会让缓存失效
+        etag = f'"{task.source_hash[:16]}-{(task.fixed_hash or "none")[:16]}"'
+    else:
+        etag = make_etag(task.id, "code", task.version)
+    return conditional_json(request, etag, lambda: _task_codes(db, task), task.updated_at)
+
+
+# 6.3 按需加载：Slither 报告
+@router.get("/{task_id}/slither")
+def get_task_slither_report(task_id: str, request: Request, db: Session = Depends(get_db)):
+    task = _get_task_or_404(db, task_id)
+    etag = make_etag(task.id, "slither", task.version)
+    return conditional_json(
+        request, etag,
+        lambda: {
+            "slither_report": task.slither_report,
+            "fuzzer_report": json.loads(task.fuzzer_report) if task.fuzzer_report else None,
+            "differential_report": json.loads(task.differential_report) if task.differential_report else None
+        },
+        task.updated_at
+    )
+
+
+# 6.4 按需加载：单个测试用例的完整代码
+@router.get("/{task_id}/cases/{case_id}")
+def get_test_case(task_id: str, case_id: str, request: Request, db: Session = Depends(get_db)):
+    tc = db.query(TestCase).filter(TestCase.task_id == task_id, TestCase.id == case_id).first()
+    if not tc:
+        raise HTTPException(status_code=404, detail="Test case not found")
+
+    # 用例代码创建后不再变化，只有状态会变
+    etag = make_etag(tc.id, tc.code_hash, tc.status)
+    return conditional_json(
+        request, etag,
+        lambda: dict(_case_brief(tc), code=resolve_code(db, tc.code_hash, tc.code)),
+        tc.created_at
+    )
+
+
+# 6.5 执行时间线 (瀑布图)
+@router.get("/{task_id}/timeline")
+def get_task_timeline(task_id: str, db: Session = Depends(get_db)):
+    _get_task_or_404(db, task_id)
+    spans = db.query(TaskSpan) \
+        .filter(TaskSpan.task_id == task_id) \
+        .order_by(TaskSpan.started_at.asc()) \
         .all()
+    if not spans:
+        return {"task_id": task_id, "spans": [], "totals": {}}
 
-    return [{"time": log.timestamp, "level": log.level, "content": log.content} for log in logs]
+    origin = spans[0].started_at
+    depth = {}
+    items = []
+    totals = {}
+    for sp in spans:
+        depth[sp.id] = depth[sp.parent_id] + 1 if sp.parent_id in depth else 0
+        items.append({
+            "id": sp.id,
+            "parent_id": sp.parent_id,
+            "name": sp.name,
+            "kind": sp.kind,
+            "round": sp.round,
+            "depth": depth[sp.id],
+            "offset_ms": round((sp.started_at - origin).total_seconds() * 1000, 3),
+            "duration_ms": sp.duration_ms,
+            "status": sp.status,
+            "attributes": json.loads(sp.attributes) if sp.attributes else {}
+        })
+        bucket = totals.setdefault(sp.kind, {"count": 0, "duration_ms": 0.0})
+        bucket["count"] += 1
+        bucket["duration_ms"] = round(bucket["duration_ms"] + (sp.duration_ms or 0), 3)
+
+    return {"task_id": task_id, "spans": items, "totals": totals}
+
+
+# 6.6 LLM 用量 (按轮次 / 智能体汇总)
+_USAGE_COLUMNS = (
+    func.count(LLMCall.id),
+    func.coalesce(func.sum(LLMCall.prompt_tokens), 0),
+    func.coalesce(func.sum(LLMCall.completion_tokens), 0),
+    func.coalesce(func.sum(LLMCall.total_tokens), 0),
+    func.coalesce(func.sum(LLMCall.latency_ms), 0),
+)
+
+
+def _usage_row(row) -> dict:
+    calls, prompt, completion, total, latency = row
+    return {
+        "calls": calls,
+        "prompt_tokens": int(prompt),
+        "completion_tokens": int(completion),
+        "total_tokens": int(total),
+        "latency_ms": round(float(latency), 3)
+    }
+
+
+@router.get("/{task_id}/usage")
+def get_task_usage(task_id: str, db: Session = Depends(get_db)):
+    task = _get_task_or_404(db, task_id)
+    base = db.query(*_USAGE_COLUMNS).filter(LLMCall.task_id == task_id)
+
+    by_round = base.add_columns(LLMCall.round).group_by(LLMCall.round).order_by(LLMCall.round).all()
+    by_agent = base.add_columns(LLMCall.agent, LLMCall.model).group_by(LLMCall.agent, LLMCall.model).all()
+    errors = db.query(func.count(LLMCall.id)) \
+        .filter(LLMCall.task_id == task_id, LLMCall.status != "ok") \
+        .scalar()
+
+    return {
+        "task_id": task_id,
+        "totals": dict(_usage_row(base.one()), errors=errors),
+        "budget": task_budgets(task)["tokens"] or None,
+        "by_round": [dict(_usage_row(r[:5]), round=r[5]) for r in by_round],
+        "by_agent": [dict(_usage_row(r[:5]), agent=r[5], model=r[6]) for r in by_agent]
+    }
+
+
+# 6.7 资源预算与当前用量
+@router.get("/{task_id}/budget")
+def get_task_budget(task_id: str, db: Session = Depends(get_db)):
+    task = _get_task_or_404(db, task_id)
+    usage = budget_usage(db, task)
+    usage["rounds"] = db.query(TaskArtifact) \
+        .filter(TaskArtifact.task_id == task_id, TaskArtifact.artifact_type == "source_version") \
+        .count()
+    return {"task_id": task_id, "status": task.status, "limits": task_budgets(task), "usage": usage}
+
+
+# 6.8 各版本合法路径的 gas 及与上一版本的差值
+@router.get("/{task_id}/gas")
+def get_task_gas(task_id: str, db: Session = Depends(get_db)):
+    _get_task_or_404(db, task_id)
+    rows = db.query(GasReport) \
+        .filter(GasReport.task_id == task_id) \
+        .order_by(GasReport.id.asc()) \
+        .all()
+
+    versions = {}
+    for r in rows:
+        versions.setdefault(r.version, []).append({
+            "function": r.function,
+            "gas": r.gas,
+            "previous_gas": r.previous_gas,
+            "delta": r.delta,
+            "delta_pct": r.delta_pct,
+            "status": r.status
+        })
+    return {
+        "task_id": task_id,
+        "threshold_pct": settings.GAS_REGRESSION_THRESHOLD_PCT,
+        "action": settings.GAS_REGRESSION_ACTION,
+        "versions": [{"version": v, "functions": fns} for v, fns in versions.items()]
+    }
+
+
+# 7. 获取日志 (支持 since_id 游标增量拉取)
+def query_logs(db: Session, task_id: str, since_id: int = 0, limit: Optional[int] = None):
+    # 已结束的任务日志被归档到压缩文件，先从归档读取，再接上归档之后写入数据库的行
+    archived = read_archived_logs(db, task_id, since_id, limit)
+    if archived:
+        since_id = archived[-1]["id"]
+        if limit:
+            limit -= len(archived)
+            if limit <= 0:
+                return archived
+
+    query = db.query(StreamLog) \
+        .filter(StreamLog.task_id == task_id, StreamLog.id > since_id) \
+        .order_by(StreamLog.id.asc())
+    if limit:
+        query = query.limit(limit)
+
+    return archived + [
+        {"id": log.id, "time": log.timestamp, "level": log.level, "content": log.content}
+        for log in query.all()
+    ]
+
+
+@router.get("/{task_id}/logs")
+def get_logs(task_id: str, since_id: int = 0, limit: Optional[int] = None, db: Session = Depends(get_db)):
+    return query_logs(db, task_id, since_id, limit)
+
+
+# 7.1 日志实时推送 (Server-Sent Events)
+SSE_BATCH_SIZE = 500
+SSE_HEARTBEAT_SECONDS = 15
+ACTIVE_TASK_STATUSES = ("created", "uploaded", "queued", "running")
+
+
+def _fetch_log_batch(task_id: str, since_id: int):
+    db = SessionLocal()
+    try:
+        logs = query_logs(db, task_id, since_id, SSE_BATCH_SIZE)
+        task = db.query(Task.status).filter(Task.id == task_id).first()
+        finished = task is None or task.status not in ACTIVE_TASK_STATUSES
+        return logs, finished
+    finally:
+        db.close()
+
+
+@router.get("/{task_id}/logs/stream")
+async def stream_logs(
+        task_id: str,
+        since_id: int = 0,
+        last_event_id: Optional[str] = Header(None)
+):
+    # 浏览器 EventSource 断线重连时会带上 Last-Event-ID，优先于 since_id
+    cursor = since_id
+    if last_event_id and last_event_id.isdigit():
+        cursor = max(cursor, int(last_event_id))
+
+    async def event_source(cursor: int):
+        sub = log_broker.subscribe(task_id)
+        try:
+            while True:
+                logs, finished = await run_in_threadpool(_fetch_log_batch, task_id, cursor)
+                for log in logs:
+                    cursor = log["id"]
+                    payload = json.dumps(log, default=str, ensure_ascii=False)
+                    yield f"id: {cursor}\nevent: log\ndata: {payload}\n\n"
+
+                if len(logs) >= SSE_BATCH_SIZE:
+                    # 积压较多时继续读取，不等待通知
+                    continue
+                if finished:
+                    yield f"event: end\ndata: {json.dumps({'last_id': cursor})}\n\n"
+                    return
+
+                if not await sub.wait(SSE_HEARTBEAT_SECONDS):
+                    yield ": heartbeat\n\n"
+        finally:
+            log_broker.unsubscribe(sub)
+
+    return StreamingResponse(
+        event_source(cursor),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 # 8. 删除任务
@@ -212,6 +705,7 @@ def delete_task(
         raise HTTPException(status_code=404, detail="Task not found")
 
     task.is_deleted = True
+    task.deleted_at = datetime.now()
     db.commit()
 
     return {"status": "success", "id": task_id, "message": "Task moved to trash"}
\ No newline at end of file
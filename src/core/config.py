@@ -1,5 +1,6 @@
 import os
 from pathlib import Path
+from typing import Dict
 from pydantic_settings import BaseSettings
 
 
@@ -24,6 +25,73 @@ class Settings(BaseSettings):
     DASHSCOPE_API_KEY: str = os.getenv("DASHSCOPE_API_KEY", "")
     LLM_MODEL: str = os.getenv("LLM_MODEL", "qwen-plus")
 
+    # 单任务资源预算 (可在创建任务时单独指定，0 表示不限制)
+    TASK_MAX_ROUNDS: int = 10  # 最多修复轮次
+    TASK_MAX_WALL_SECONDS: int = 3600  # 获得执行槽位后的墙钟时间
+    TASK_MAX_CONTAINER_SECONDS: int = 0  # 容器 (forge / slither) 累计运行时间
+    TASK_TOKEN_BUDGET: int = 0  # LLM token 用量
+
+    # 红队按 Slither 发现分组并行生成攻击脚本
+    RED_TEAM_MAX_JOBS: int = 6  # 每轮最多生成的攻击脚本数 (按检测器分组)
+    RED_TEAM_CONCURRENCY: int = 3  # 同时进行的 LLM 调用数
+    RED_TEAM_REPAIR_ATTEMPTS: int = 2  # 攻击脚本编译预检失败后，带编译错误让红队修复的次数
+
+    # 编译预检：auto (本机 solc，否则常驻容器) / local / container / off
+    COMPILE_CHECK_MODE: str = "auto"
+    SOLC_BINARY: str = "solc"
+    COMPILE_CHECK_TIMEOUT: int = 60  # 单次检查超时 (秒)，容器内首次安装编译器版本也计入
+
+    # 不变量模糊测试 (基于 ABI 生成的 Handler)
+    FUZZ_INVARIANT_RUNS: int = 2048  # 每轮调用序列数上限 (按增量分批，多个 worker 平分)
+    FUZZ_INCREMENT_RUNS: int = 128  # 每个增量的调用序列数，增量之间采样覆盖率
+    FUZZ_PLATEAU_INCREMENTS: int = 2  # 连续多少个增量没有新覆盖即停止
+    FUZZ_TIME_BUDGET_SECONDS: int = 300  # 每轮探索的时间上限
+    FUZZ_WORKERS: int = 4  # 并行 fuzz 进程数，各自使用不同的 --fuzz-seed
+    FUZZ_INVARIANT_DEPTH: int = 20  # 每个序列的调用数
+    FUZZ_DICTIONARY_WEIGHT: int = 80  # 从字典 (常量 / 存储值) 取参数的比例 (%)
+    FUZZ_INCLUDE_STORAGE: bool = True  # 将目标合约的存储值加入字典
+    FUZZ_INCLUDE_PUSH_BYTES: bool = True  # 将字节码中的 PUSH 常量加入字典
+    FUZZ_SHRINK_MAX_ROUNDS: int = 8  # 反例最小化的最大批次数 (每批一次 forge 调用)
+    DIFF_FUZZ_RUNS: int = 128  # 修复前后版本差分测试的调用序列数 (0 表示关闭)
+
+    # Gas 回归门禁：合法路径单个函数的 gas 增幅超过阈值 (%) 时 flag 仅记录告警，reject 退回蓝队
+    GAS_REGRESSION_THRESHOLD_PCT: float = 50.0
+    GAS_REGRESSION_ACTION: str = "reject"  # flag / reject / off
+
+    # 任务工作区：容器挂载的可写层 (out/ cache/ 生成的测试等)，只有声明的产物写回 storage/tasks
+    WORKSPACE_ROOT: str = ""  # 可写层的独立根目录；为空时由 WORKSPACE_TMPFS 决定
+    WORKSPACE_TMPFS: bool = False  # 未配置 WORKSPACE_ROOT 时把可写层放到 /dev/shm (tmpfs，占用内存)
+    WORKSPACE_MIN_FREE_MB: int = 2048  # 可写层根目录剩余空间低于该值时新任务退回 storage/tasks
+
+    # 存储回收 (后台 GC)
+    GC_INTERVAL_SECONDS: int = 600  # 回收周期 (0 表示关闭)
+    GC_PRUNE_AFTER_SECONDS: int = 3600  # 任务完成多久后删除构建产物与缓存 (out/ cache/ lib/ 等)
+    GC_PRUNE_FAILED_AFTER_SECONDS: int = 86400  # 失败 / 停止的任务保留构建现场更久，便于排查
+    GC_DELETED_RETENTION_SECONDS: int = 7 * 86400  # 软删除任务的宽限期，之后删除目录与全部数据库行
+    GC_BATCH_SIZE: int = 20  # 每轮最多处理的任务数
+    GC_PAUSE_SECONDS: float = 0.5  # 每处理一个任务后的停顿，避免与运行中的任务争抢 IO
+
+    # 上传与结果复用
+    MAX_UPLOAD_BYTES: int = 1024 * 1024  # 单个合约文件大小上限
+    PIPELINE_VERSION: str = "1"  # 流水线逻辑有不兼容变化时递增，使旧结果不再复用
+
+    # 任务调度配置
+    MAX_CONCURRENT_TASKS: int = 3  # 全局并发执行槽数
+    MAX_RUNNING_TASKS_PER_USER: int = 2  # 单个用户同时运行的任务上限 (0 表示不限制)
+    TASK_MAX_PRIORITY: int = 10  # 任务优先级上限，只在同一用户的任务之间生效
+    SCHEDULER_ROLE_WEIGHTS: Dict[str, float] = {"admin": 2.0, "user": 1.0}  # 各角色获得执行份额的权重
+    QUEUE_ETA_SAMPLE_SIZE: int = 20  # 估算排队时间时参考的最近完成任务数
+    LIST_COUNT_CACHE_TTL: int = 30  # 任务列表总数缓存秒数
+
+    # 日志批量写入配置
+    LOG_BUFFER_SIZE: int = 10000  # 内存队列容量
+    LOG_FLUSH_BATCH: int = 200  # 累计多少条写一次数据库
+    LOG_FLUSH_INTERVAL: float = 0.5  # 最长多少秒写一次数据库
+    LOG_SAMPLE_WATERMARK: float = 0.8  # 队列占用超过该比例后开始采样 INFO/DEBUG
+    LOG_SAMPLE_RATE: int = 10  # 采样时每 N 条保留 1 条
+    LOG_ARCHIVE_BATCH: int = 1000  # 归档时每批读取/删除的日志行数
+    LOG_ARCHIVE_FLUSH_TIMEOUT: float = 60.0  # 归档前等待内存队列写完的最长时间 (秒)
+
     class Config:
         env_file = ".env"
 
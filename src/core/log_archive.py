@@ -0,0 +1,104 @@
+import gzip
+import json
+from pathlib import Path
+from typing import List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.db.models import StreamLog, TaskArtifact
+
+ARCHIVE_ARTIFACT_TYPE = "log_archive"
+
+
+def archive_filename(task_id: str) -> str:
+    return f"execution_{task_id}.log.jsonl.gz"
+
+
+def get_archive_path(db: Session, task_id: str) -> Optional[Path]:
+    artifact = db.query(TaskArtifact) \
+        .filter(TaskArtifact.task_id == task_id, TaskArtifact.artifact_type == ARCHIVE_ARTIFACT_TYPE) \
+        .first()
+    if not artifact:
+        return None
+    path = settings.BASE_DIR / artifact.file_path
+    return path if path.exists() else None
+
+
+def archive_task_logs(db: Session, task_dir: Path, task_id: str) -> int:
+    """
+    将任务的 StreamLog 流式归档为 gzip 压缩的 JSON Lines 文件，并删除已归档的行。
+
+    - 按 LOG_ARCHIVE_BATCH 分批从数据库游标读取，不会一次性加载全部日志
+    - 每行一条 JSON，保留原始 id，便于 /logs 接口按 since_id 游标继续读取
+    - 任务重跑时以新的 gzip member 追加到同一个文件
+    返回归档的行数。
+    """
+    batch_size = settings.LOG_ARCHIVE_BATCH
+    log_path = task_dir / archive_filename(task_id)
+
+    # 只取需要的列，配合 yield_per 走服务端游标分批读取
+    stmt = select(StreamLog.id, StreamLog.timestamp, StreamLog.level, StreamLog.content) \
+        .where(StreamLog.task_id == task_id) \
+        .order_by(StreamLog.id.asc()) \
+        .execution_options(yield_per=batch_size)
+
+    archived = 0
+    first_id = last_id = None
+    with gzip.open(log_path, "at", encoding="utf-8") as f:
+        for log in db.execute(stmt):
+            timestamp = log.timestamp.isoformat() if log.timestamp else None
+            item = {"id": log.id, "time": timestamp, "level": log.level, "content": log.content}
+            f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            if first_id is None:
+                first_id = log.id
+            last_id = log.id
+            archived += 1
+
+    if not archived:
+        return 0
+
+    exists = db.query(TaskArtifact) \
+        .filter(TaskArtifact.task_id == task_id, TaskArtifact.artifact_type == ARCHIVE_ARTIFACT_TYPE) \
+        .first()
+    if not exists:
+        db.add(TaskArtifact(
+            task_id=task_id,
+            artifact_type=ARCHIVE_ARTIFACT_TYPE,
+            filename=log_path.name,
+            file_path=str(log_path.relative_to(settings.BASE_DIR)),
+            phase="archive"
+        ))
+        db.commit()
+
+    # 分段删除已归档的行，避免长事务锁表
+    for start in range(first_id, last_id + 1, batch_size):
+        db.query(StreamLog) \
+            .filter(StreamLog.task_id == task_id,
+                    StreamLog.id >= start,
+                    StreamLog.id < min(start + batch_size, last_id + 1)) \
+            .delete(synchronize_session=False)
+        db.commit()
+
+    return archived
+
+
+def read_archived_logs(db: Session, task_id: str, since_id: int = 0, limit: Optional[int] = None) -> List[dict]:
+    """从归档文件中按 since_id 游标读取日志，格式与 /logs 接口一致"""
+    path = get_archive_path(db, task_id)
+    if path is None:
+        return []
+
+    logs = []
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if item["id"] <= since_id:
+                continue
+            logs.append(item)
+            if limit and len(logs) >= limit:
+                break
+    return logs
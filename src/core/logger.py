@@ -1,29 +1,283 @@
+import asyncio
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Set
+
+from sqlalchemy import insert
+
+from src.core.config import settings
+from src.core.metrics import registry, LOG_ROWS_WRITTEN, LOG_ROWS_DROPPED, LOG_FLUSH_SECONDS
 from src.db.session import SessionLocal
 from src.db.models import StreamLog
-from datetime import datetime
+
+# 高优先级日志在背压时不会被采样丢弃
+_PRIORITY_LEVELS = {"ERROR", "WARNING"}
+
+
+class _FlushRequest:
+    """写入线程看到该标记后立即落盘，并通知等待方"""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class _Shutdown(_FlushRequest):
+    pass
+
+
+class LogSubscription:
+    """
+    某个任务日志的订阅句柄，供 SSE 等异步推送端点等待“有新日志”的通知。
+    通知只是一个唤醒信号，真正的数据仍然按 id 游标从数据库读取。
+    """
+
+    def __init__(self, task_id: str, loop: asyncio.AbstractEventLoop):
+        self.task_id = task_id
+        self._loop = loop
+        self._event = asyncio.Event()
+
+    def notify(self):
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def wait(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self._event.clear()
+
+
+class LogBroker:
+    """进程内日志发布/订阅：写入线程落库后按 task_id 通知订阅者"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers: Dict[str, Set[LogSubscription]] = {}
+
+    def subscribe(self, task_id: str) -> LogSubscription:
+        sub = LogSubscription(task_id, asyncio.get_running_loop())
+        with self._lock:
+            self._subscribers.setdefault(task_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: LogSubscription):
+        with self._lock:
+            subs = self._subscribers.get(sub.task_id)
+            if subs:
+                subs.discard(sub)
+                if not subs:
+                    self._subscribers.pop(sub.task_id, None)
+
+    def publish(self, task_ids: Iterable[str]):
+        with self._lock:
+            targets = [sub for task_id in set(task_ids) for sub in self._subscribers.get(task_id, ())]
+        for sub in targets:
+            try:
+                sub.notify()
+            except RuntimeError:
+                # 订阅方的事件循环已关闭
+                self.unsubscribe(sub)
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(subs) for subs in self._subscribers.values())
+
+
+class LogSink:
+    """
+    后台批量日志写入器。
+
+    log_to_db 只负责把日志放进内存队列，由单独的写入线程按
+    “条数阈值 (LOG_FLUSH_BATCH) 或时间阈值 (LOG_FLUSH_INTERVAL)” 批量 INSERT，
+    一次事务提交多条，避免每行一次 commit 造成的写放大和锁竞争。
+
+    背压策略：
+      - 队列超过高水位 (LOG_SAMPLE_WATERMARK) 后，INFO/DEBUG 日志按 1/LOG_SAMPLE_RATE 采样
+      - 队列满时丢弃 INFO/DEBUG，ERROR/WARNING 最多阻塞 1 秒等待空位
+    """
+
+    def __init__(self, max_size: int, batch_size: int, flush_interval: float, broker: LogBroker):
+        self.broker = broker
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_size)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._sample_counter = 0
+        self._stats = {
+            "written": 0,
+            "dropped": 0,
+            "sampled_out": 0,
+            "failed": 0,
+            "flushes": 0,
+            "last_flush_rows": 0,
+            "last_flush_ms": 0.0,
+        }
+
+    # --- 生产者侧 ---
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+                self._thread.start()
+
+    def _should_sample_out(self, level: str) -> bool:
+        if level in _PRIORITY_LEVELS:
+            return False
+        watermark = int(self._queue.maxsize * settings.LOG_SAMPLE_WATERMARK)
+        if self._queue.qsize() < watermark:
+            return False
+        with self._lock:
+            self._sample_counter += 1
+            return self._sample_counter % settings.LOG_SAMPLE_RATE != 0
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._stats[key] += n
+
+    def submit(self, task_id: str, content: str, level: str = "INFO"):
+        self._ensure_started()
+
+        if self._should_sample_out(level):
+            self._count("sampled_out")
+            LOG_ROWS_DROPPED.inc(reason="sampled")
+            return
+
+        row = {
+            "task_id": task_id,
+            "content": content,
+            "level": level,
+            "timestamp": datetime.now(),
+        }
+        try:
+            if level in _PRIORITY_LEVELS:
+                self._queue.put(row, timeout=1.0)
+            else:
+                self._queue.put_nowait(row)
+        except queue.Full:
+            self._count("dropped")
+            LOG_ROWS_DROPPED.inc(reason="queue_full")
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """阻塞直到调用前入队的日志全部写入数据库"""
+        self._ensure_started()
+        request = _FlushRequest()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return False
+        return request.done.wait(timeout)
+
+    def drain(self, timeout: float) -> bool:
+        """反复 flush 直到成功或超时：队列满时 flush 请求本身可能入队失败"""
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self.flush(timeout=min(remaining, 10.0)):
+                return True
+
+    def shutdown(self, timeout: float = 10.0):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        request = _Shutdown()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return
+        request.done.wait(timeout)
+        self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats)
+        data["queue_depth"] = self._queue.qsize()
+        data["queue_capacity"] = self._queue.maxsize
+        data["running"] = self._thread is not None and self._thread.is_alive()
+        data["subscribers"] = self.broker.subscriber_count()
+        return data
+
+    # --- 写入线程 ---
+    def _write(self, rows: List[dict]):
+        if not rows:
+            return
+        started = time.perf_counter()
+        db = SessionLocal()
+        try:
+            db.execute(insert(StreamLog), rows)
+            db.commit()
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            LOG_ROWS_WRITTEN.inc(len(rows))
+            LOG_FLUSH_SECONDS.observe(elapsed_ms / 1000)
+            with self._lock:
+                self._stats["written"] += len(rows)
+                self._stats["flushes"] += 1
+                self._stats["last_flush_rows"] = len(rows)
+                self._stats["last_flush_ms"] = round(elapsed_ms, 2)
+        except Exception as e:
+            db.rollback()
+            self._count("failed", len(rows))
+            LOG_ROWS_DROPPED.inc(len(rows), reason="write_error")
+            print(f"❌ Log Error: {e}")
+            return
+        finally:
+            db.close()
+
+        self.broker.publish(row["task_id"] for row in rows)
+
+    def _run(self):
+        buffer: List[dict] = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while True:
+            timeout = max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, _FlushRequest):
+                self._write(buffer)
+                buffer = []
+                deadline = time.monotonic() + self.flush_interval
+                item.done.set()
+                if isinstance(item, _Shutdown):
+                    return
+                continue
+
+            if item is not None:
+                buffer.append(item)
+
+            if len(buffer) >= self.batch_size or time.monotonic() >= deadline:
+                self._write(buffer)
+                buffer = []
+                deadline = time.monotonic() + self.flush_interval
+
+
+log_broker = LogBroker()
+log_sink = LogSink(settings.LOG_BUFFER_SIZE, settings.LOG_FLUSH_BATCH, settings.LOG_FLUSH_INTERVAL, log_broker)
+
+registry.gauge("soliforge_log_queue_depth", "StreamLog rows buffered in memory",
+               callback=lambda: log_sink.stats()["queue_depth"])
 
 
 def log_to_db(task_id: str, content: str, level: str = "INFO"):
     """
-    将日志直接写入数据库，供前端实时轮询。
+    将日志写入数据库，供前端实时轮询。
     同时打印到控制台，供后端调试。
+    数据库写入由 LogSink 在后台批量完成，这里不会阻塞调用方。
     """
     # 1. 打印到后端控制台 (带时间戳)
     time_str = datetime.now().strftime("%H:%M:%S")
     print(f"[{time_str}] [{level}] Task[{task_id[:8]}]: {content}")
 
-    # 2. 写入数据库
-    db = SessionLocal()
-    try:
-        safe_content = content.encode('utf-8', 'replace').decode('utf-8')
-        log = StreamLog(
-            task_id=task_id,
-            content=safe_content,
-            level=level
-        )
-        db.add(log)
-        db.commit()
-    except Exception as e:
-        print(f"❌ Log Error: {e}")
-    finally:
-        db.close()
\ No newline at end of file
+    # 2. 放入批量写入队列
+    safe_content = content.encode('utf-8', 'replace').decode('utf-8')
+    log_sink.submit(task_id, safe_content, level)
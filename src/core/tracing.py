@@ -0,0 +1,129 @@
+import contextvars
+import functools
+import json
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from src.core.metrics import CONTAINER_RUN_SECONDS, CONTAINER_RUN_ERRORS, LLM_REQUEST_SECONDS, LLM_ERRORS
+from src.db.session import SessionLocal
+from src.db.models import TaskSpan
+
+# 当前线程 (及其派生的 ContextThreadPoolExecutor 线程) 所属的任务/轮次/父 span
+_current_task: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_task", default=None)
+_current_round: contextvars.ContextVar[Optional[int]] = contextvars.ContextVar("current_round", default=None)
+_current_span: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_span", default=None)
+
+
+def current_task_id() -> Optional[str]:
+    return _current_task.get()
+
+
+def current_round() -> Optional[int]:
+    return _current_round.get()
+
+
+class Span:
+    """一次计时区间，attributes 会以 JSON 形式落库"""
+
+    def __init__(self, name: str, kind: str, task_id: Optional[str], parent_id: Optional[str],
+                 round_idx: Optional[int], attributes: Dict[str, Any]):
+        self.id = str(uuid.uuid4())
+        self.name = name
+        self.kind = kind
+        self.task_id = task_id
+        self.parent_id = parent_id
+        self.round = round_idx
+        self.attributes = attributes
+        self.status = "ok"
+        self.started_at = datetime.now()
+        self.duration_ms = 0.0
+
+    def set(self, key: str, value: Any):
+        self.attributes[key] = value
+
+
+def _save_span(span: Span):
+    db = SessionLocal()
+    try:
+        db.add(TaskSpan(
+            id=span.id,
+            task_id=span.task_id,
+            parent_id=span.parent_id,
+            name=span.name,
+            kind=span.kind,
+            round=span.round,
+            started_at=span.started_at,
+            duration_ms=round(span.duration_ms, 3),
+            status=span.status,
+            attributes=json.dumps(span.attributes, default=str, ensure_ascii=False)
+        ))
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ Span save failed: {e}")
+    finally:
+        db.close()
+
+
+def _observe(span: Span):
+    """执行器与 LLM 的 span 同时汇总为进程级指标"""
+    seconds = span.duration_ms / 1000
+    if span.kind == "executor":
+        tool = span.attributes.get("tool", "unknown")
+        CONTAINER_RUN_SECONDS.observe(seconds, tool=tool)
+        if span.status == "error":
+            CONTAINER_RUN_ERRORS.inc(tool=tool)
+    elif span.kind == "llm":
+        labels = {"model": span.attributes.get("model", "unknown"), "agent": span.attributes.get("agent", "unknown")}
+        LLM_REQUEST_SECONDS.observe(seconds, **labels)
+        if span.status == "error":
+            LLM_ERRORS.inc(**labels)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", task_id: Optional[str] = None,
+         round_idx: Optional[int] = None, **attributes):
+    """
+    记录一段耗时到 task_spans 表。
+    task_id / round 未显式传入时沿用外层上下文；不属于任何任务时只计时不落库。
+    """
+    task_id = task_id or _current_task.get()
+    round_idx = round_idx if round_idx is not None else _current_round.get()
+    current = Span(name, kind, task_id, _current_span.get(), round_idx, attributes)
+
+    tokens = [
+        _current_task.set(task_id),
+        _current_round.set(round_idx),
+        _current_span.set(current.id),
+    ]
+    started = time.perf_counter()
+    try:
+        yield current
+    except BaseException as e:
+        current.status = "error"
+        current.set("error", f"{type(e).__name__}: {e}"[:500])
+        raise
+    finally:
+        current.duration_ms = (time.perf_counter() - started) * 1000
+        for var, token in zip((_current_span, _current_round, _current_task), reversed(tokens)):
+            var.reset(token)
+        _observe(current)
+        if task_id:
+            _save_span(current)
+
+
+def traced_node(name: str):
+    """LangGraph 节点装饰器：以 state 中的 task_id / round_count 建立节点级 span"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(state, *args, **kwargs):
+            with span(name, kind="node", task_id=state.get("task_id"), round_idx=state.get("round_count", 0)):
+                return func(state, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
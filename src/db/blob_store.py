@@ -0,0 +1,128 @@
+import hashlib
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from src.core.metrics import cache_lookup
+from src.db.session import SessionLocal
+from src.db.models import CodeBlob
+
+# 代码块内容不可变，读缓存无需失效
+_CACHE_SIZE = 256
+_cache: "OrderedDict[str, str]" = OrderedDict()
+_cache_lock = threading.Lock()
+# put_code 命中已有代码块时刷新 last_used_at (GC 宽限期由此起算)；同一块在该间隔内只刷新一次，
+# 间隔必须远小于 GC 的宽限期
+_TOUCH_INTERVAL = 600
+_touched: Dict[str, float] = {}
+
+
+def code_hash(content: str) -> str:
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def _remember(digest: str, content: str):
+    with _cache_lock:
+        _cache[digest] = content
+        _cache.move_to_end(digest)
+        while len(_cache) > _CACHE_SIZE:
+            evicted, _ = _cache.popitem(last=False)
+            _touched.pop(evicted, None)
+
+
+def put_code(content: Optional[str]) -> Optional[str]:
+    """
+    以 SHA-256 为键存储 (zlib 压缩后的) 代码，返回哈希。
+    相同内容只存一份，跨任务自动去重。
+
+    使用独立会话提交：代码块不可变，即使调用方事务回滚也只会留下可回收的孤儿块，
+    同时避免并发写入同一哈希时污染调用方的事务。
+    命中已有代码块时刷新其 last_used_at，调用方提交引用之前 GC 不会把它当作孤儿块删除。
+    """
+    if content is None:
+        return None
+
+    digest = code_hash(content)
+    now = time.monotonic()
+    with _cache_lock:
+        fresh = digest in _cache and now - _touched.get(digest, float("-inf")) < _TOUCH_INTERVAL
+    if fresh:
+        cache_lookup("code_blob_dedup", True)
+        return digest
+
+    db = SessionLocal()
+    try:
+        exists = db.query(CodeBlob).filter(CodeBlob.hash == digest) \
+            .update({CodeBlob.last_used_at: func.now()}, synchronize_session=False) > 0
+        cache_lookup("code_blob_dedup", exists)
+        if not exists:
+            raw = content.encode("utf-8")
+            db.add(CodeBlob(hash=digest, data=zlib.compress(raw, 6), size=len(raw)))
+        db.commit()
+    except IntegrityError:
+        # 其他线程刚刚写入了同一内容
+        db.rollback()
+    finally:
+        db.close()
+
+    _remember(digest, content)
+    with _cache_lock:
+        _touched[digest] = now
+    return digest
+
+
+def forget_codes(digests: Iterable[str]):
+    """代码块被回收后移出读缓存，否则 put_code 会误以为内容仍然存在"""
+    with _cache_lock:
+        for digest in digests:
+            _cache.pop(digest, None)
+            _touched.pop(digest, None)
+
+
+def get_code(db: Session, digest: Optional[str]) -> Optional[str]:
+    if not digest:
+        return None
+
+    with _cache_lock:
+        content = _cache.get(digest)
+        if content is not None:
+            _cache.move_to_end(digest)
+    cache_lookup("code_blob_read", content is not None)
+    if content is not None:
+        return content
+
+    blob = db.get(CodeBlob, digest)
+    if blob is None:
+        return None
+
+    content = zlib.decompress(blob.data).decode("utf-8")
+    _remember(digest, content)
+    return content
+
+
+def resolve_code(db: Session, digest: Optional[str], legacy: Optional[str] = None) -> Optional[str]:
+    """优先读取代码块，兼容改造前直接存在行里的旧数据"""
+    if digest:
+        content = get_code(db, digest)
+        if content is not None:
+            return content
+    return legacy
+
+
+def unique_codes(db: Session, rows: Iterable) -> list:
+    """按 code_hash 去重读取多个测试用例的代码 (同一攻击文件往往对应多个用例)"""
+    seen = set()
+    codes = []
+    for row in rows:
+        key = row.code_hash or row.id
+        if key in seen:
+            continue
+        seen.add(key)
+        codes.append((row, resolve_code(db, row.code_hash, row.code)))
+    return codes
@@ -13,17 +13,41 @@ CREATE TABLE IF NOT EXISTS `tasks` (
   `id` VARCHAR(36) NOT NULL,
   `name` VARCHAR(100) DEFAULT NULL,
   `status` VARCHAR(20) DEFAULT 'created',
+  `priority` INT DEFAULT 0 COMMENT '调度优先级，数值越大越先执行',
+  `is_deleted` TINYINT(1) DEFAULT 0,
+  `deleted_at` DATETIME DEFAULT NULL COMMENT '软删除时间，宽限期后由 GC 清除',
   `contract_name` VARCHAR(100) DEFAULT NULL,
   `source_code` TEXT,
   `exploit_code` TEXT,
   `fixed_code` TEXT,
+  `source_hash` CHAR(64) DEFAULT NULL,
+  `fixed_hash` CHAR(64) DEFAULT NULL,
+  `content_hash` CHAR(64) DEFAULT NULL COMMENT '归一化源码 + 流水线配置指纹',
+  `reused_from` VARCHAR(36) DEFAULT NULL,
+  `warm_start_from` VARCHAR(36) DEFAULT NULL,
+  `prompt_tokens` INT DEFAULT 0,
+  `completion_tokens` INT DEFAULT 0,
+  `total_tokens` INT DEFAULT 0,
+  `max_rounds` INT DEFAULT NULL,
+  `max_wall_seconds` INT DEFAULT NULL,
+  `max_container_seconds` INT DEFAULT NULL,
+  `token_budget` INT DEFAULT NULL,
   `slither_report` TEXT,
+  `fuzzer_report` TEXT,
+  `differential_report` TEXT,
   `current_phase` VARCHAR(50) DEFAULT NULL,
   `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP,
   `finished_at` DATETIME DEFAULT NULL,
+  `pruned_at` DATETIME DEFAULT NULL COMMENT 'GC 删除构建产物的时间',
+  `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  `version` INT NOT NULL DEFAULT 0 COMMENT '每次更新自增，用于 ETag',
   `owner_id` INT DEFAULT NULL,
   PRIMARY KEY (`id`),
   KEY `fk_tasks_owner_id` (`owner_id`),
+  KEY `ix_tasks_created_at_id` (`created_at`, `id`),
+  KEY `ix_tasks_content_hash` (`content_hash`),
+  KEY `ix_tasks_is_deleted` (`is_deleted`),
+  FULLTEXT KEY `ft_tasks_name` (`name`) WITH PARSER ngram,
   CONSTRAINT `fk_tasks_owner_id` FOREIGN KEY (`owner_id`) REFERENCES `users` (`id`) ON DELETE SET NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
@@ -35,11 +59,17 @@ CREATE TABLE IF NOT EXISTS `test_cases` (
   `name` VARCHAR(200) DEFAULT NULL,
   `description` TEXT,
   `code` TEXT,
+  `code_hash` CHAR(64) DEFAULT NULL,
+  `finding` VARCHAR(200) DEFAULT NULL COMMENT '对应的 Slither 检测器',
+  `test_file` VARCHAR(255) DEFAULT NULL COMMENT 'test/ 下的攻击脚本文件名',
   `status` VARCHAR(20) DEFAULT 'PENDING' COMMENT 'FAILING, PASSING, PENDING',
   `version_added` VARCHAR(10) DEFAULT 'v1',
   `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP,
+  `updated_at` DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  `version` INT NOT NULL DEFAULT 0 COMMENT '每次更新自增，用于摘要 ETag',
   PRIMARY KEY (`id`),
   KEY `ix_test_cases_task_id` (`task_id`),
+  KEY `ix_test_cases_code_hash` (`code_hash`),
   CONSTRAINT `fk_test_cases_task_id` FOREIGN KEY (`task_id`) REFERENCES `tasks` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
@@ -52,6 +82,7 @@ CREATE TABLE IF NOT EXISTS `stream_logs` (
   `content` TEXT,
   PRIMARY KEY (`id`),
   KEY `ix_stream_logs_task_id` (`task_id`),
+  KEY `ix_stream_logs_task_id_id` (`task_id`, `id`),
   CONSTRAINT `fk_stream_logs_task_id` FOREIGN KEY (`task_id`) REFERENCES `tasks` (`id`) ON DELETE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
 
@@ -67,4 +98,66 @@ CREATE TABLE IF NOT EXISTS `task_artifacts` (
   PRIMARY KEY (`id`),
   KEY `ix_task_artifacts_task_id` (`task_id`),
   CONSTRAINT `fk_task_artifacts_task_id` FOREIGN KEY (`task_id`) REFERENCES `tasks` (`id`) ON DELETE CASCADE
-) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
\ No newline at end of file
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 6. 创建 code_blobs 表 (内容寻址代码存储)
+CREATE TABLE IF NOT EXISTS `code_blobs` (
+  `hash` CHAR(64) NOT NULL COMMENT 'SHA-256',
+  `data` LONGBLOB COMMENT 'zlib 压缩后的代码',
+  `size` INT DEFAULT NULL COMMENT '压缩前字节数',
+  `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP,
+  `last_used_at` DATETIME DEFAULT NULL COMMENT 'put_code 最近一次命中，GC 宽限期由此起算',
+  PRIMARY KEY (`hash`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 7. 创建 task_spans 表 (执行时间线)
+CREATE TABLE IF NOT EXISTS `task_spans` (
+  `id` VARCHAR(36) NOT NULL,
+  `task_id` VARCHAR(36) NOT NULL,
+  `parent_id` VARCHAR(36) DEFAULT NULL,
+  `name` VARCHAR(100) DEFAULT NULL,
+  `kind` VARCHAR(20) DEFAULT NULL COMMENT 'task, node, executor, llm, db',
+  `round` INT DEFAULT NULL,
+  `started_at` DATETIME(6) DEFAULT NULL,
+  `duration_ms` DOUBLE DEFAULT 0,
+  `status` VARCHAR(20) DEFAULT 'ok',
+  `attributes` TEXT COMMENT 'JSON',
+  PRIMARY KEY (`id`),
+  KEY `ix_task_spans_task_id` (`task_id`),
+  CONSTRAINT `fk_task_spans_task_id` FOREIGN KEY (`task_id`) REFERENCES `tasks` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 8. 创建 llm_calls 表 (LLM 调用用量)
+CREATE TABLE IF NOT EXISTS `llm_calls` (
+  `id` INT NOT NULL AUTO_INCREMENT,
+  `task_id` VARCHAR(36) NOT NULL,
+  `agent` VARCHAR(20) DEFAULT NULL,
+  `model` VARCHAR(100) DEFAULT NULL,
+  `round` INT DEFAULT NULL,
+  `prompt_tokens` INT DEFAULT 0,
+  `completion_tokens` INT DEFAULT 0,
+  `total_tokens` INT DEFAULT 0,
+  `latency_ms` DOUBLE DEFAULT 0,
+  `status` VARCHAR(20) DEFAULT 'ok',
+  `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  KEY `ix_llm_calls_task_id` (`task_id`),
+  CONSTRAINT `fk_llm_calls_task_id` FOREIGN KEY (`task_id`) REFERENCES `tasks` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
+
+-- 9. 创建 gas_reports 表 (各版本合法路径的 gas 探针与差值)
+CREATE TABLE IF NOT EXISTS `gas_reports` (
+  `id` INT NOT NULL AUTO_INCREMENT,
+  `task_id` VARCHAR(36) NOT NULL,
+  `version` VARCHAR(10) DEFAULT NULL,
+  `function` VARCHAR(255) DEFAULT NULL,
+  `gas` INT DEFAULT NULL,
+  `previous_gas` INT DEFAULT NULL,
+  `delta` INT DEFAULT NULL,
+  `delta_pct` DOUBLE DEFAULT NULL,
+  `status` VARCHAR(20) DEFAULT 'ok',
+  `created_at` DATETIME DEFAULT CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  KEY `ix_gas_reports_task_id` (`task_id`),
+  CONSTRAINT `fk_gas_reports_task_id` FOREIGN KEY (`task_id`) REFERENCES `tasks` (`id`) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4;
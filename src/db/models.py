@@ -1,6 +1,6 @@
-from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime
-from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy import Column, Integer, String, Text, Boolean, ForeignKey, DateTime, Index, LargeBinary, Float
+from sqlalchemy.orm import relationship, deferred
+from sqlalchemy.sql import func, literal_column
 from src.db.base import Base
 
 
@@ -20,26 +20,55 @@ class User(Base):
 
 class Task(Base):
     __tablename__ = "tasks"
+    # 任务列表按 (created_at, id) 做 keyset 分页
+    __table_args__ = (Index("ix_tasks_created_at_id", "created_at", "id"),)
 
     id = Column(String(36), primary_key=True, index=True)
     name = Column(String(100))
     status = Column(String(20), default="created")
+    priority = Column(Integer, default=0)  # 调度优先级，数值越大越先执行
     is_deleted = Column(Boolean, default=False, index=True)
+    deleted_at = Column(DateTime(timezone=True), nullable=True)  # 软删除时间，宽限期后由 GC 彻底清除
     contract_name = Column(String(100), nullable=True)
     started_at = Column(DateTime(timezone=True), nullable=True)  # 点击开始的时间
     duration = Column(Integer, default=0)  # 执行耗时(秒)
-    # 存储代码资产
-    source_code = Column(Text, nullable=True)
-    exploit_code = Column(Text, nullable=True)
-    fixed_code = Column(Text, nullable=True)
+    # 存储代码资产 (大字段延迟加载，轮询摘要时不读取)
+    # 新数据只写 *_hash，内容存放在 code_blobs；*_code 列仅为兼容旧数据保留
+    source_code = deferred(Column(Text, nullable=True))
+    exploit_code = deferred(Column(Text, nullable=True))
+    fixed_code = deferred(Column(Text, nullable=True))
+    source_hash = Column(String(64), nullable=True)
+    fixed_hash = Column(String(64), nullable=True)
+
+    # 上传去重：归一化源码 + 流水线配置的指纹
+    content_hash = Column(String(64), nullable=True, index=True)
+    reused_from = Column(String(36), nullable=True)  # 直接复用了哪个任务的结果
+    warm_start_from = Column(String(36), nullable=True)  # 从哪个任务的矩阵与修复热启动
+
+    # LLM 用量汇总 (明细见 llm_calls)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    total_tokens = Column(Integer, default=0)
+
+    # 资源预算 (为空时使用 Settings 中的 TASK_* 默认值)
+    max_rounds = Column(Integer, nullable=True)
+    max_wall_seconds = Column(Integer, nullable=True)
+    max_container_seconds = Column(Integer, nullable=True)
+    token_budget = Column(Integer, nullable=True)
 
     # 报告存储
-    slither_report = Column(Text, nullable=True)
+    slither_report = deferred(Column(Text, nullable=True))
+    fuzzer_report = deferred(Column(Text, nullable=True))  # JSON: 合并后的多 worker 统计
+    differential_report = deferred(Column(Text, nullable=True))  # JSON: 最近一次修复前后的差分测试结论
 
     # 流程控制
     current_phase = Column(String(50), nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     finished_at = Column(DateTime(timezone=True), nullable=True)  # 之前加的字段
+    pruned_at = Column(DateTime(timezone=True), nullable=True)  # GC 删除构建产物的时间
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())  # 用于 Last-Modified
+    # 每次 UPDATE 在 SQL 中自增；updated_at 只有秒级精度，同一秒内的多次更新靠它区分 ETag
+    version = Column(Integer, nullable=False, default=0, server_default="0", onupdate=literal_column("version") + 1)
 
     owner_id = Column(Integer, ForeignKey("users.id"))
     owner = relationship("User", back_populates="tasks")
@@ -48,6 +77,9 @@ class Task(Base):
     test_cases = relationship("TestCase", back_populates="task", cascade="all, delete-orphan")
     logs = relationship("StreamLog", back_populates="task", cascade="all, delete-orphan")
     artifacts = relationship("TaskArtifact", back_populates="task", cascade="all, delete-orphan")
+    spans = relationship("TaskSpan", back_populates="task", cascade="all, delete-orphan")
+    llm_calls = relationship("LLMCall", back_populates="task", cascade="all, delete-orphan")
+    gas_reports = relationship("GasReport", back_populates="task", cascade="all, delete-orphan")
 
 
 class TestCase(Base):
@@ -59,10 +91,15 @@ class TestCase(Base):
     source = Column(String(50))
     name = Column(String(200))
     description = Column(Text, nullable=True)
-    code = Column(Text, nullable=True)
+    code = deferred(Column(Text, nullable=True))  # 旧数据兼容，新数据见 code_hash
+    code_hash = Column(String(64), nullable=True, index=True)
+    finding = Column(String(200), nullable=True)  # 对应的 Slither 检测器 (红队用例)
+    test_file = Column(String(255), nullable=True)  # test/ 下的攻击脚本文件名，回归验证按 文件+用例名 匹配
     status = Column(String(20), default="PENDING")
     version_added = Column(String(10), default="v1")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+    version = Column(Integer, nullable=False, default=0, server_default="0", onupdate=literal_column("version") + 1)  # 摘要 ETag
 
     # 这里的 back_populates="test_cases" 必须对应 Task 类里的属性名
     task = relationship("Task", back_populates="test_cases")
@@ -70,6 +107,8 @@ class TestCase(Base):
 
 class StreamLog(Base):
     __tablename__ = "stream_logs"
+    # 日志按 (task_id, id) 游标增量读取
+    __table_args__ = (Index("ix_stream_logs_task_id_id", "task_id", "id"),)
 
     id = Column(Integer, primary_key=True, index=True)
     task_id = Column(String(36), ForeignKey("tasks.id"))
@@ -93,4 +132,70 @@ class TaskArtifact(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # 新增关联
-    task = relationship("Task", back_populates="artifacts")
\ No newline at end of file
+    task = relationship("Task", back_populates="artifacts")
+
+
+class CodeBlob(Base):
+    """按 SHA-256 内容寻址的代码存储 (zlib 压缩)，被 Task / TestCase 以哈希引用"""
+    __tablename__ = "code_blobs"
+
+    hash = Column(String(64), primary_key=True)
+    data = Column(LargeBinary)
+    size = Column(Integer)  # 压缩前字节数
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    last_used_at = Column(DateTime(timezone=True), nullable=True)  # put_code 最近一次命中，GC 宽限期由此起算
+
+
+class TaskSpan(Base):
+    """任务执行时间线：节点 / 执行器 / 智能体调用的耗时区间"""
+    __tablename__ = "task_spans"
+
+    id = Column(String(36), primary_key=True)
+    task_id = Column(String(36), ForeignKey("tasks.id"), index=True)
+    parent_id = Column(String(36), nullable=True)
+    name = Column(String(100))
+    kind = Column(String(20))  # task / node / executor / llm / db
+    round = Column(Integer, nullable=True)
+    started_at = Column(DateTime(timezone=True))
+    duration_ms = Column(Float, default=0)
+    status = Column(String(20), default="ok")
+    attributes = Column(Text, nullable=True)  # JSON
+
+    task = relationship("Task", back_populates="spans")
+
+
+class LLMCall(Base):
+    """单次 LLM 调用的 token 用量与耗时"""
+    __tablename__ = "llm_calls"
+
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(String(36), ForeignKey("tasks.id"), index=True)
+    agent = Column(String(20))  # red / blue
+    model = Column(String(100))
+    round = Column(Integer, nullable=True)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    total_tokens = Column(Integer, default=0)
+    latency_ms = Column(Float, default=0)
+    status = Column(String(20), default="ok")
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    task = relationship("Task", back_populates="llm_calls")
+
+
+class GasReport(Base):
+    """每个版本的合法路径 gas 探针结果，及与上一版本的差值"""
+    __tablename__ = "gas_reports"
+
+    id = Column(Integer, primary_key=True, index=True)
+    task_id = Column(String(36), ForeignKey("tasks.id"), index=True)
+    version = Column(String(10))  # v1, v2 ...
+    function = Column(String(255))  # 函数签名，如 withdraw(uint256)
+    gas = Column(Integer)
+    previous_gas = Column(Integer, nullable=True)
+    delta = Column(Integer, nullable=True)
+    delta_pct = Column(Float, nullable=True)
+    status = Column(String(20), default="ok")  # new / ok / regressed
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    task = relationship("Task", back_populates="gas_reports")
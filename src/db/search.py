@@ -0,0 +1,88 @@
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+
+from src.db.models import Task
+
+# 运行时探测到的全文索引类型: "fts5" / "fulltext" / None (退化为 LIKE)
+_search_backend = None
+
+# trigram / ngram 分词最少需要 3 / 2 个字符，更短的关键词退化为 LIKE
+_MIN_KEYWORD_LEN = {"fts5": 3, "fulltext": 2}
+
+
+def _ensure_sqlite_fts(conn) -> bool:
+    exists = conn.execute(text(
+        "SELECT name FROM sqlite_master WHERE type='table' AND name='tasks_fts'"
+    )).first()
+    if exists:
+        return True
+
+    # trigram 分词支持任意子串匹配 (含中文)，语义与原来的 LIKE '%kw%' 一致
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE tasks_fts USING fts5("
+        "name, content='tasks', content_rowid='rowid', tokenize='trigram')"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER tasks_fts_ai AFTER INSERT ON tasks BEGIN "
+        "INSERT INTO tasks_fts(rowid, name) VALUES (new.rowid, new.name); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER tasks_fts_ad AFTER DELETE ON tasks BEGIN "
+        "INSERT INTO tasks_fts(tasks_fts, rowid, name) VALUES ('delete', old.rowid, old.name); END"
+    ))
+    conn.execute(text(
+        "CREATE TRIGGER tasks_fts_au AFTER UPDATE OF name ON tasks BEGIN "
+        "INSERT INTO tasks_fts(tasks_fts, rowid, name) VALUES ('delete', old.rowid, old.name); "
+        "INSERT INTO tasks_fts(rowid, name) VALUES (new.rowid, new.name); END"
+    ))
+    # 为已有数据建立索引
+    conn.execute(text("INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')"))
+    return True
+
+
+def _ensure_mysql_fulltext(conn) -> bool:
+    exists = conn.execute(text(
+        "SELECT 1 FROM information_schema.statistics "
+        "WHERE table_schema = DATABASE() AND table_name = 'tasks' AND index_name = 'ft_tasks_name'"
+    )).first()
+    if not exists:
+        # ngram parser 支持中文及子串检索
+        conn.execute(text("ALTER TABLE tasks ADD FULLTEXT INDEX ft_tasks_name (name) WITH PARSER ngram"))
+    return True
+
+
+def ensure_task_search_index(engine: Engine):
+    """
+    根据 DATABASE_URL 的方言为 Task.name 建立全文索引:
+      - SQLite: FTS5 (trigram) 外部内容表 + 同步触发器
+      - MySQL: FULLTEXT (ngram) 索引
+    不支持或创建失败时保持 LIKE 检索。
+    """
+    global _search_backend
+    dialect = engine.dialect.name
+    try:
+        with engine.begin() as conn:
+            if dialect == "sqlite" and _ensure_sqlite_fts(conn):
+                _search_backend = "fts5"
+            elif dialect == "mysql" and _ensure_mysql_fulltext(conn):
+                _search_backend = "fulltext"
+    except Exception as e:
+        print(f"⚠️ Warning: Full-text index unavailable, falling back to LIKE: {e}")
+        _search_backend = None
+
+
+def task_name_filter(keyword: str):
+    """返回按任务名检索的过滤条件，优先走全文索引"""
+    backend = _search_backend
+    if backend is None or len(keyword) < _MIN_KEYWORD_LEN[backend]:
+        return Task.name.like(f"%{keyword}%")
+
+    if backend == "fts5":
+        # 整体作为短语匹配，转义双引号
+        phrase = '"' + keyword.replace('"', '""') + '"'
+        return text(
+            "tasks.rowid IN (SELECT rowid FROM tasks_fts WHERE tasks_fts MATCH :kw)"
+        ).bindparams(kw=phrase)
+
+    phrase = '"' + keyword.replace('"', ' ') + '"'
+    return text("MATCH (tasks.name) AGAINST (:kw IN BOOLEAN MODE)").bindparams(kw=phrase)
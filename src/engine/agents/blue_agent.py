@@ -1,6 +1,7 @@
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from src.core.config import settings
+from src.engine.llm.client import invoke_llm
 
 
 class BlueAgent:
@@ -12,7 +13,8 @@ class BlueAgent:
             temperature=0.1  # 降低温度，由0.2降为0.1，要求修复更精准
         )
 
-    def fix_vulnerability(self, source_code: str, report: str, exploit_code: str) -> str:
+    def fix_vulnerability(self, source_code: str, report: str, exploit_code: str, divergence: str = "",
+                          gas_report: str = "") -> str:
         """
         根据漏洞报告和一组攻击脚本，修复合约
         """
@@ -37,20 +39,29 @@ class BlueAgent:
             {exploit}
             ```
 
+            【行为回归 (上一次修复引入)】:
+            {divergence}
+
+            【Gas 回归 (上一次修复引入)】:
+            {gas_report}
+
             【任务要求】:
             1. 分析攻击代码的原理（Reentrancy, Overflow, Access Control 等）。
             2. 修改原始合约代码以修复漏洞。
-            3. 保持合约名称和基本逻辑不变，只修补漏洞。
-            4. **只返回修复后的完整 Solidity 代码**，不要包含 Markdown 标记或解释文字。
+            3. 保持合约名称和基本逻辑不变，只修补漏洞；若上方列出了行为回归，需恢复这些正常路径的原有行为。
+            4. 若上方列出了 Gas 回归，在保证安全的前提下降低这些函数的开销 (如减少存储写入、合并检查)。
+            5. **只返回修复后的完整 Solidity 代码**，不要包含 Markdown 标记或解释文字。
             """
         )
         chain = prompt | self.llm
         try:
-            result = chain.invoke({
+            result = invoke_llm(chain, {
                 "source": source_code,
                 "report": report,
-                "exploit": exploit_code
-            })
+                "exploit": exploit_code,
+                "divergence": divergence or "无",
+                "gas_report": gas_report or "无"
+            }, "blue")
             # 清洗 markdown
             code = result.content.replace("```solidity", "").replace("```", "").strip()
             return code
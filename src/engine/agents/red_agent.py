@@ -1,7 +1,9 @@
 import re
+from typing import List
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from src.core.config import settings
+from src.engine.llm.client import invoke_llm
 
 class RedAgent:
     def __init__(self):
@@ -103,46 +105,12 @@ class RedAgent:
         )
         chain = prompt | self.llm
         try:
-            result = chain.invoke({
+            result = invoke_llm(chain, {
                 "source": source_code,
                 "report": report
-            })
+            }, "red")
 
-            raw_content = result.content
-
-            # =======================================================
-            # 🧹 代码清洗逻辑 (保持不变)
-            # =======================================================
-
-            # 1. 提取代码块
-            code_blocks = re.findall(r'```solidity(.*?)```', raw_content, re.DOTALL)
-            if code_blocks:
-                code = code_blocks[-1].strip()
-            else:
-                code_blocks = re.findall(r'```(.*?)```', raw_content, re.DOTALL)
-                if code_blocks:
-                    code = code_blocks[-1].strip()
-                else:
-                    code = raw_content.strip()
-
-            # 2. 移除 Markdown
-            code = code.replace("```solidity", "").replace("```", "")
-
-            # 3. 强制补全头部依赖
-            if "pragma solidity" not in code:
-                version_match = re.search(r'pragma solidity\s+([\^><=0-9\.]+);', source_code)
-                version = version_match.group(1) if version_match else "^0.8.20"
-                code = f"pragma solidity {version};\n" + code
-
-            if 'import "forge-std/Test.sol"' not in code:
-                pragma_match = re.search(r'pragma solidity.*?;', code)
-                if pragma_match:
-                    end_idx = pragma_match.end()
-                    code = code[:end_idx] + '\nimport "forge-std/Test.sol";' + code[end_idx:]
-                else:
-                    code = 'import "forge-std/Test.sol";\n' + code
-
-            return code
+            return self._clean_code(result.content, source_code)
 
         except Exception as e:
             print(f"RedAgent Error: {e}")
@@ -154,4 +122,80 @@ contract ErrorLog is Test {{
         assertTrue(false, "RedAgent LLM Generation Failed: {str(e)}");
     }}
 }}
-"""
\ No newline at end of file
+"""
+
+    def repair_exploit(self, source_code: str, exploit_code: str, errors: List[str]) -> str:
+        """
+        根据编译器报错修复攻击脚本 (只修编译错误，不改攻击逻辑)
+        """
+        prompt = ChatPromptTemplate.from_template(
+            """
+            你是一个世界顶级的智能合约安全研究员（Red Team）。
+            你编写的 Foundry 攻击脚本没有通过编译，请根据编译器报错修复它。
+
+            【目标合约代码】(位于 `src/Target.sol`，测试文件位于 `test/` 目录):
+            ```solidity
+            {source}
+            ```
+
+            【当前攻击脚本】:
+            ```solidity
+            {exploit}
+            ```
+
+            【编译器报错】:
+            {errors}
+
+            【要求】
+            1. 只修复导致编译失败的问题 (类型、函数签名、可见性、缺失的 import 等)，保持攻击逻辑和断言不变。
+            2. 必须保留 `import "forge-std/Test.sol";` 与 `import "../src/Target.sol";`，不要复制目标合约代码。
+            3. 只返回一段完整的 Solidity 代码，不要包含 Markdown 标记。
+            """
+        )
+        chain = prompt | self.llm
+        try:
+            result = invoke_llm(chain, {
+                "source": source_code,
+                "exploit": exploit_code,
+                "errors": "\n".join(errors)[:4000]
+            }, "red")
+            return self._clean_code(result.content, source_code)
+        except Exception as e:
+            print(f"RedAgent Repair Error: {e}")
+            return exploit_code
+
+    @staticmethod
+    def _clean_code(raw_content: str, source_code: str) -> str:
+        # =======================================================
+        # 🧹 代码清洗逻辑
+        # =======================================================
+
+        # 1. 提取代码块
+        code_blocks = re.findall(r'```solidity(.*?)```', raw_content, re.DOTALL)
+        if code_blocks:
+            code = code_blocks[-1].strip()
+        else:
+            code_blocks = re.findall(r'```(.*?)```', raw_content, re.DOTALL)
+            if code_blocks:
+                code = code_blocks[-1].strip()
+            else:
+                code = raw_content.strip()
+
+        # 2. 移除 Markdown
+        code = code.replace("```solidity", "").replace("```", "")
+
+        # 3. 强制补全头部依赖
+        if "pragma solidity" not in code:
+            version_match = re.search(r'pragma solidity\s+([\^><=0-9\.]+);', source_code)
+            version = version_match.group(1) if version_match else "^0.8.20"
+            code = f"pragma solidity {version};\n" + code
+
+        if 'import "forge-std/Test.sol"' not in code:
+            pragma_match = re.search(r'pragma solidity.*?;', code)
+            if pragma_match:
+                end_idx = pragma_match.end()
+                code = code[:end_idx] + '\nimport "forge-std/Test.sol";' + code[end_idx:]
+            else:
+                code = 'import "forge-std/Test.sol";\n' + code
+
+        return code
@@ -0,0 +1,111 @@
+import functools
+import time
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.core.logger import log_to_db
+from src.db.session import SessionLocal
+from src.db.models import Task, TaskSpan
+
+BUDGET_EXHAUSTED = "budget_exhausted"
+
+# 每轮的 LangGraph superstep 数：build -> (validate ‖ discovery ‖ differential ‖ gas) -> weaponize -> check -> fix
+SUPERSTEPS_PER_ROUND = 5
+# 轮次不限制 (max_rounds=0) 时的递归上限，仍由墙钟 / 容器 / token 预算兜底
+UNLIMITED_RECURSION_LIMIT = 10000
+
+
+def _limit(value: Optional[int], default: int) -> int:
+    return value if value is not None else default
+
+
+def task_budgets(task: Task) -> dict:
+    """任务的各项上限，未单独设置时使用 Settings 默认值 (0 表示不限制)"""
+    return {
+        "rounds": _limit(task.max_rounds, settings.TASK_MAX_ROUNDS),
+        "wall_seconds": _limit(task.max_wall_seconds, settings.TASK_MAX_WALL_SECONDS),
+        "container_seconds": _limit(task.max_container_seconds, settings.TASK_MAX_CONTAINER_SECONDS),
+        "tokens": _limit(task.token_budget, settings.TASK_TOKEN_BUDGET),
+    }
+
+
+def recursion_limit(max_rounds: int) -> int:
+    """
+    LangGraph 的递归上限 (默认 25 只够 4 轮)：按轮次预算换算 superstep 数并留出余量，
+    保证轮次耗尽时由 check 节点以 budget_exhausted 结束，而不是抛出 GraphRecursionError。
+    """
+    if not max_rounds:
+        return UNLIMITED_RECURSION_LIMIT
+    return (max_rounds + 1) * SUPERSTEPS_PER_ROUND + 10
+
+
+def container_seconds(db: Session, task_id: str, since: Optional[datetime] = None) -> float:
+    """由执行器 span 汇总的容器运行时间"""
+    query = db.query(func.coalesce(func.sum(TaskSpan.duration_ms), 0)) \
+        .filter(TaskSpan.task_id == task_id, TaskSpan.kind == "executor")
+    if since is not None:
+        query = query.filter(TaskSpan.started_at >= since)
+    return float(query.scalar()) / 1000
+
+
+def budget_usage(db: Session, task: Task, run_started_at: Optional[float] = None) -> dict:
+    """
+    当前用量。墙钟与容器时间从本次获得执行槽位 (run_started_at) 起算，
+    未传入时按任务的 started_at 估算 (含排队时间)。
+    """
+    if run_started_at is not None:
+        since = datetime.fromtimestamp(run_started_at)
+        wall = time.time() - run_started_at
+    else:
+        since = task.started_at.replace(tzinfo=None) if task.started_at else None
+        wall = (datetime.now() - since).total_seconds() if since else 0
+    return {
+        "wall_seconds": round(wall, 3),
+        "container_seconds": round(container_seconds(db, task.id, since), 3),
+        "tokens": task.total_tokens or 0,
+    }
+
+
+def exhausted_budget(db: Session, task_id: str, run_started_at: Optional[float] = None) -> Optional[str]:
+    """墙钟 / 容器时间 / token 任一超限时返回说明文字，否则返回 None (轮次由 check 节点判定)"""
+    task = db.query(Task).filter(Task.id == task_id).first()
+    if task is None:
+        return None
+
+    limits = task_budgets(task)
+    usage = budget_usage(db, task, run_started_at)
+    for key in ("wall_seconds", "container_seconds", "tokens"):
+        if limits[key] and usage[key] >= limits[key]:
+            return f"{key} {usage[key]:g} / {limits[key]}"
+    return None
+
+
+def budget_guard(func_):
+    """
+    LangGraph 节点装饰器：执行节点前检查预算。
+    超限时跳过节点并返回 execution_status=budget_exhausted，后续节点随之直接跳过，
+    check 之后由 router 结束流程。
+    """
+
+    @functools.wraps(func_)
+    def wrapper(state, *args, **kwargs):
+        if state.get("execution_status") == BUDGET_EXHAUSTED:
+            # LangGraph 要求节点至少写入一个字段
+            return {"execution_status": BUDGET_EXHAUSTED}
+
+        db = SessionLocal()
+        try:
+            reason = exhausted_budget(db, state["task_id"], state.get("run_started_at"))
+        finally:
+            db.close()
+
+        if reason:
+            log_to_db(state["task_id"], f"💸 [Budget] Exhausted before '{func_.__name__}': {reason}", "WARNING")
+            return {"execution_status": BUDGET_EXHAUSTED, "budget_reason": reason}
+        return func_(state, *args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import re
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.db.models import Task, TestCase
+from src.db.blob_store import resolve_code, unique_codes
+from src.engine.tools.file_manager import FileManager
+from src.engine.tools.workspace import persist_artifacts
+
+# 可复用结果的任务状态
+FINISHED_STATUSES = ("completed", "failed", "stopped", "budget_exhausted")
+# 正在排队 / 执行的任务，结果不能被覆盖
+ACTIVE_STATUSES = ("queued", "running")
+
+# 注释与字符串字面量一起扫描：字符串中的 // 或 /* 不是注释
+_TOKEN_RE = re.compile(r'"(?:\\.|[^"\\\n])*"|\'(?:\\.|[^\'\\\n])*\'|//[^\n]*|/\*.*?\*/', re.DOTALL)
+
+
+def normalize_source(source: str) -> str:
+    """
+    归一化合约源码：去掉注释、统一换行并压缩空白。
+    只改格式/注释的同一份合约会得到相同的指纹。
+    """
+    code = source.replace("\r\n", "\n").replace("\r", "\n")
+    parts, text, pos = [], "", 0
+    for match in _TOKEN_RE.finditer(code):
+        token = match.group(0)
+        text += code[pos:match.start()]
+        pos = match.end()
+        if token[0] in "\"'":
+            # 字符串原样保留 (其中的空白也不压缩)
+            parts.extend([re.sub(r"\s+", " ", text), token])
+            text = ""
+        else:
+            text += " "
+    parts.append(re.sub(r"\s+", " ", text + code[pos:]))
+    return "".join(parts).strip()
+
+
+def pipeline_fingerprint() -> str:
+    """影响分析结果的流水线配置，配置变化后旧结果不再复用"""
+    return json.dumps({
+        "pipeline": settings.PIPELINE_VERSION,
+        "model": settings.LLM_MODEL,
+    }, sort_keys=True)
+
+
+def content_fingerprint(source: str) -> str:
+    digest = hashlib.sha256()
+    digest.update(normalize_source(source).encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(pipeline_fingerprint().encode("utf-8"))
+    return digest.hexdigest()
+
+
+def find_previous_task(db: Session, content_hash: str, exclude_id: str) -> Optional[Task]:
+    """查找同一指纹下最近结束的任务，优先返回已完成的"""
+    candidates = db.query(Task) \
+        .filter(Task.content_hash == content_hash,
+                Task.id != exclude_id,
+                Task.is_deleted == False,
+                Task.status.in_(FINISHED_STATUSES)) \
+        .order_by(Task.finished_at.desc()) \
+        .limit(20) \
+        .all()
+    completed = [t for t in candidates if t.status == "completed"]
+    if completed:
+        return completed[0]
+    return candidates[0] if candidates else None
+
+
+def clone_task_result(db: Session, source: Task, target: Task):
+    """把已完成任务的结果直接复制到新任务 (代码块按哈希引用，不复制内容)"""
+    for tc in source.test_cases:
+        db.add(TestCase(
+            id=str(uuid.uuid4()), task_id=target.id,
+            source=tc.source,
+            name=tc.name,
+            description=tc.description,
+            code=tc.code if not tc.code_hash else None,
+            code_hash=tc.code_hash,
+            finding=tc.finding,
+            test_file=tc.test_file,
+            status=tc.status,
+            version_added=tc.version_added
+        ))
+
+    target.fixed_hash = source.fixed_hash
+    target.slither_report = source.slither_report
+    target.fuzzer_report = source.fuzzer_report
+    target.differential_report = source.differential_report
+    target.reused_from = source.id
+    target.status = source.status
+    target.current_phase = "Finished (reused)"
+    target.started_at = target.started_at or datetime.now()
+    target.finished_at = datetime.now()
+    target.duration = 0
+    db.commit()
+
+
+def prepare_warm_start(db: Session, fm: FileManager, source_task_id: str) -> Optional[str]:
+    """
+    从同一合约的历史任务热启动：
+      - 复制测试矩阵：有代码的用例 (红队 / Fuzzer) 置为 FAILING，由首轮回归验证重新判定；
+        没有代码、无法重新验证的用例置为 PENDING
+      - 将攻击脚本以热启动专用文件名写回工作区的 test/ 目录，避免与本任务新生成的脚本同名
+    返回历史任务的修复代码 (若有)，作为本次的起始版本。
+    """
+    source = db.query(Task).filter(Task.id == source_task_id).first()
+    if source is None:
+        return None
+
+    test_dir = fm.work_dir / "test"
+    test_dir.mkdir(exist_ok=True)
+
+    existing = {(name, test_file) for (name, test_file) in
+                db.query(TestCase.name, TestCase.test_file).filter(TestCase.task_id == fm.task_id)}
+    warm_files = {}
+    for tc, code in unique_codes(db, source.test_cases):
+        if code:
+            key = tc.code_hash or tc.id
+            prefix = "Fuzz_Repro" if tc.source == "FUZZER" else "Red_Exploit"
+            warm_files[key] = f"{prefix}_warm_{key[:8]}.t.sol"
+            with open(test_dir / warm_files[key], "w", encoding="utf-8") as f:
+                f.write(code)
+    persist_artifacts(fm.task_id, "test")
+
+    for tc in source.test_cases:
+        test_file = warm_files.get(tc.code_hash or tc.id)
+        if (tc.name, test_file) in existing:
+            continue
+        db.add(TestCase(
+            id=str(uuid.uuid4()), task_id=fm.task_id,
+            source=tc.source,
+            name=tc.name,
+            description=f"{tc.description} (warm start)",
+            code=tc.code if not tc.code_hash else None,
+            code_hash=tc.code_hash,
+            finding=tc.finding,
+            test_file=test_file,
+            status="FAILING" if test_file else "PENDING",
+            version_added="v1"
+        ))
+    db.commit()
+
+    return resolve_code(db, source.fixed_hash, source.fixed_code)
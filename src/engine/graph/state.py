@@ -1,28 +1,47 @@
-from typing import TypedDict, List, Optional
+from typing import TypedDict, List, Optional, Annotated
+
+
+def latest(current, update):
+    """并行分支同一步写入同一字段时取最后一次写入 (无 reducer 的字段会报 InvalidUpdateError)"""
+    return update
 
 
 class AgentState(TypedDict):
     # --- 基础上下文 ---
     task_id: str
     original_source: str  # 原始代码 (只读)
+    warm_start: bool  # 是否从历史任务热启动 (首轮回归验证历史矩阵)
 
     # --- 动态上下文 ---
     current_source: str  # 当前最新版本的合约代码
+    previous_source: str  # 修复前的上一版本，差分测试与当前版本对照
     current_phase: str  # 当前阶段描述
 
     # --- 计数器与熔断 ---
     round_count: int  # 总轮次
-    max_rounds: int  # 最大允许轮次
+    max_rounds: int  # 最大允许轮次 (0 表示不限制)
+    run_started_at: float  # 获得执行槽位的时间戳，墙钟预算由此起算
+    budget_reason: Annotated[str, latest]  # 预算耗尽时的说明
 
     # 👇👇👇 新增字段：本轮新增威胁数 👇👇👇
     # 用于 Check 节点判定 (Condition A)
     new_threats_count: int
 
+    # validate / discovery / differential / gas 并行执行，各自写入独立字段，在 weaponize 汇合
+    discovery_threats: int  # 本轮 Fuzzer 新增威胁数
+    retired_tests: List[str]  # 被新代表接替的旧 Fuzzer 复现脚本，汇合后由 weaponize 删除
+    regression_active: int  # 回归验证后仍然有效的攻击数
+    differential_divergences: int  # 差分测试发现的行为分歧数 (修补路径之外)
+    divergence_report: str  # 差分结论，交给下一轮蓝队
+    gas_regressions: int  # 超过阈值且需退回蓝队的 gas 回归数
+    gas_report: str  # gas 回归说明，交给下一轮蓝队
+
     # --- 报告与日志 ---
     slither_report: str  # 最新 Slither 报告
+    slither_findings: List[dict]  # 按检测器分组的发现，红队逐组生成攻击脚本
 
     # --- 攻防中间产物 ---
     exploit_code: str  # 红方生成的攻击代码 (临时)
 
     # --- 最终状态 ---
-    execution_status: str  # 'secure', 'needs_fix', 'running'等
\ No newline at end of file
+    execution_status: Annotated[str, latest]  # 'secure', 'needs_fix', 'budget_exhausted', 'running'等
\ No newline at end of file
@@ -1,4 +1,5 @@
 import uuid
+from langchain_core.runnables.config import ContextThreadPoolExecutor
 from langgraph.graph import StateGraph, END, START
 import os
 import json
@@ -7,22 +8,53 @@ from src.engine.graph.state import AgentState
 from src.engine.agents.red_agent import RedAgent
 from src.engine.agents.blue_agent import BlueAgent
 from src.engine.tools.file_manager import FileManager
-from src.engine.tools.slither_runner import run_slither_scan
-from src.engine.tools.docker_runner import run_forge_test_json, run_docker_command
-from src.engine.tools.fuzzer import run_fuzz_test
+from src.engine.tools.slither_runner import run_slither_scan, load_slither_findings
+from src.engine.tools.docker_runner import (
+    run_forge, canonical_build, TARGET_SOURCE, GENERATED_DIR, PENDING_DIR
+)
+from src.engine.tools.fuzzer import run_fuzz_test, get_contract_name, read_abi, prepare_fuzz_harness
+from src.engine.tools.differential import (
+    run_differential_fuzz, divergence_summary, write_previous_source, prepare_differential_harness
+)
+from src.engine.tools.gas import run_gas_snapshot, compare_gas, gas_baseline, gas_regression_summary, prepare_gas_probe
+from src.engine.tools.compile_check import check_compiles
+from src.engine.tools.workspace import ensure_base_layer, persists
+from src.core.config import settings
 from src.db.session import SessionLocal
-from src.db.models import Task, TestCase
+from src.db.models import Task, TestCase, TaskArtifact, GasReport
+from src.db.blob_store import put_code, unique_codes
 from src.core.logger import log_to_db
+from src.core.tracing import span, traced_node
+from src.engine.budget import budget_guard, exhausted_budget, BUDGET_EXHAUSTED
 
 
 # === 辅助工具 ===
 def update_phase(task_id, phase):
-    db = SessionLocal()
-    task = db.query(Task).filter(Task.id == task_id).first()
-    if task:
-        task.current_phase = phase
-        db.commit()
-    db.close()
+    with span("db.update_phase", kind="db", phase=phase):
+        db = SessionLocal()
+        task = db.query(Task).filter(Task.id == task_id).first()
+        if task:
+            task.current_phase = phase
+            db.commit()
+        db.close()
+
+
+def write_target_source(task_dir, source: str):
+    """
+    写入 src/Target.sol (只由构建节点调用)。
+    内容未变时不落盘 (mtime 不变，forge 增量编译可直接命中缓存)，变化时先写临时文件再原子替换。
+    """
+    src_dir = task_dir / "src"
+    src_dir.mkdir(exist_ok=True)
+    target_sol_path = task_dir / TARGET_SOURCE
+    if target_sol_path.exists() and target_sol_path.read_text(encoding="utf-8") == source:
+        return target_sol_path
+
+    tmp_path = src_dir / f".Target.sol.{uuid.uuid4().hex[:8]}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(source)
+    os.replace(tmp_path, target_sol_path)
+    return target_sol_path
 
 
 def get_ver_tag(state: AgentState):
@@ -34,9 +66,68 @@ def get_ver_tag(state: AgentState):
     return f"v{state.get('round_count', 0) + 1}"
 
 
+# =========================================
+# 节点 0: 规范构建 (Canonical Build)
+# =========================================
+@traced_node("build")
+@budget_guard
+def node_build(state: AgentState):
+    """
+    每轮只编译一次：写入当前 (与上一) 版本 -> forge build 取 ABI -> 生成各分支的 harness
+    -> 增量构建。之后并行的 Slither / Fuzzer / 差分 / gas / 回归验证都只读取 out/ 中的产物。
+    """
+    task_id = state["task_id"]
+    ver = get_ver_tag(state)
+    update_phase(task_id, f"Build ({ver})")
+
+    db = SessionLocal()
+    task_dir = FileManager(db, task_id).work_dir
+    db.close()
+
+    ensure_base_layer()
+    (task_dir / "test").mkdir(exist_ok=True)
+    contract_path = write_target_source(task_dir, state["current_source"])
+    previous = state.get("previous_source")
+    write_previous_source(task_dir, previous if previous and previous != state["current_source"] else None)
+
+    # 1. 首次构建：源码 + 已有测试，产出 ABI (harness 未变化的轮次这里就是唯一的一次编译)
+    ok, output = canonical_build(task_dir)
+    if not ok:
+        culprit = "Blue Team broke the build" if state.get("round_count", 0) else "Target contract does not compile"
+        log_to_db(task_id, f"❌ [Build - {ver}] Compilation Failed! {culprit}.", "ERROR")
+        raise Exception(f"Build Failed ({ver}): {output[-2000:]}")
+
+    contract_name = get_contract_name(contract_path)
+    abi, error = read_abi(task_dir / "out", contract_path, contract_name)
+    if abi is None:
+        raise Exception(f"Build Failed ({ver}): ABI unavailable for {contract_name}: {error}")
+
+    # 2. 按 ABI 生成 harness，内容不变的文件不重写
+    generated_dir = task_dir / GENERATED_DIR
+    before = {p.name: p.stat().st_mtime_ns for p in generated_dir.glob("*.t.sol")} if generated_dir.exists() else {}
+    prepare_fuzz_harness(task_dir, contract_path, abi)
+    if settings.GAS_REGRESSION_ACTION != "off":
+        prepare_gas_probe(task_dir, contract_path, abi)
+    prepare_differential_harness(task_dir, contract_path, abi)
+    after = {p.name: p.stat().st_mtime_ns for p in generated_dir.glob("*.t.sol")}
+
+    # 3. harness 有变化时增量构建，只重新编译新增 / 改动的测试文件
+    if after != before:
+        ok, output = canonical_build(task_dir)
+        if not ok:
+            log_to_db(task_id, f"❌ [Build - {ver}] Generated harness failed to compile.", "ERROR")
+            raise Exception(f"Harness Build Failed ({ver}): {output[-2000:]}")
+
+    log_to_db(task_id, f"🏗️ [Build - {ver}] Compiled once; {len(after)} generated harness(es) ready.")
+    return {"current_phase": f"Build ({ver})"}
+
+
 # =========================================
 # 节点 1: 侦查 (Discovery)
 # =========================================
+@traced_node("discovery")
+@budget_guard
+@persists("artifacts", "fuzz_corpus")
 def node_discovery(state: AgentState):
     task_id = state["task_id"]
     ver = get_ver_tag(state)
@@ -62,10 +153,10 @@ def node_discovery(state: AgentState):
 
     # 2. 动态模糊测试
     log_to_db(task_id, f"🌪️ [Fuzzer - {ver}] Running fuzzing...")
-    contract_path = fm.task_dir / fm.task.contract_name
+    contract_path = fm.work_dir / TARGET_SOURCE
 
     # 运行 Fuzzer
-    status, stats, test_file_path = run_fuzz_test(fm.task_dir, contract_path, round_idx)
+    status, stats, test_file_path = run_fuzz_test(fm.work_dir, contract_path, round_idx)
 
     # 👇👇👇 关键修复：逻辑漏洞修补 👇👇👇
     # 如果 Fuzzer 连编译都过不去，不能当做 Safe，必须报错！
@@ -84,13 +175,24 @@ def node_discovery(state: AgentState):
     if task:
         fuzzer_data = {
             "total": stats.get("runs", 0),
+            "calls": stats.get("calls", 0),
             "failures": stats.get("failures", 0),
-            "status": "Secure" if stats.get("failures", 0) == 0 else "Vulnerable"
+            "known_failures": stats.get("known_failures", 0),
+            "corpus_size": stats.get("corpus_size", 0),
+            "workers": stats.get("workers", []),
+            "stopped_early": stats.get("stopped_early", False),
+            "stop_reason": stats.get("stop_reason"),
+            "bucket": stats.get("bucket"),
+            "original_length": stats.get("original_length"),
+            "sequence_length": stats.get("sequence_length"),
+            "coverage_curve": stats.get("coverage_curve", []),
+            "status": "Secure" if stats.get("failures", 0) + stats.get("known_failures", 0) == 0 else "Vulnerable"
         }
         task.fuzzer_report = json.dumps(fuzzer_data)
         db.commit()
 
     new_threats_count = 0
+    retired_tests = []
 
     # 处理 Fuzzer 结果
     if stats.get("failures", 0) > 0 and test_file_path and test_file_path.exists():
@@ -99,140 +201,236 @@ def node_discovery(state: AgentState):
                 fuzz_code = f.read()
 
             fuzz_name = f"Fuzz_Crash_{ver}"
+            # 同一分桶 (失败原因 + 最后一次调用) 只保留一个代表进入测试矩阵
+            finding = f"invariant:{stats['bucket']}" if stats.get("bucket") else "invariant"
+            representative = db.query(TestCase).filter_by(task_id=task_id, source="FUZZER", finding=finding).first() \
+                if stats.get("bucket") else None
             exists = db.query(TestCase).filter_by(task_id=task_id, name=fuzz_name).first()
-            if not exists:
+            if representative:
+                # 旧代表的序列已不再复现 (否则语料重放会先命中)，由新的最小序列接替，矩阵规模不变
+                # 新脚本在 pending/；旧代表仍在 test/，回归验证可能正在使用，汇合后再删除
+                if representative.test_file and representative.test_file != test_file_path.name:
+                    retired_tests.append(representative.test_file)
+                representative.code_hash = put_code(fuzz_code)
+                representative.code = None
+                representative.test_file = test_file_path.name
+                representative.status = "FAILING"
+                new_threats_count += 1
+                log_to_db(task_id, f"🟠 [Matrix] Fuzzer crash in {ver} falls into the bucket of {representative.name}; representative replaced.")
+            elif not exists:
+                reason = stats.get("reason") or "invariant violated"
+                length = stats.get("sequence_length")
+                shrunk = f" ({stats.get('original_length')} -> {length} calls)" if length is not None else ""
                 tc = TestCase(
                     id=str(uuid.uuid4()), task_id=task_id,
                     source="FUZZER",
                     name=fuzz_name,
-                    description=f"Automated Fuzzing Crash in {ver}",
-                    code=fuzz_code,
+                    description=f"Automated Fuzzing Crash in {ver}: {reason}{shrunk}",
+                    code_hash=put_code(fuzz_code),
+                    finding=finding,
+                    test_file=test_file_path.name,
                     status="FAILING",
                     version_added=ver
                 )
                 db.add(tc)
                 new_threats_count += 1
-                log_to_db(task_id, f"🔴 [Matrix] New Fuzzer Exploit Injected: {fuzz_name}")
+                log_to_db(task_id, f"🔴 [Matrix] New Fuzzer Exploit Injected: {fuzz_name}{shrunk}")
         except Exception as e:
             log_to_db(task_id, f"⚠️ Failed to read fuzz file: {e}", "WARNING")
+    elif stats.get("known_failures", 0) > 0:
+        log_to_db(task_id, f"🟠 [Fuzzer] {stats['known_failures']} known counterexample(s) from the corpus still reproduce in {ver}; skipping new exploration.")
     else:
         log_to_db(task_id, f"🟢 [Fuzzer] No crashes found in {ver}. Runs: {stats.get('runs', 0)}")
 
     db.commit()
     db.close()
 
-    return {"slither_report": report, "new_threats_count": new_threats_count}
+    return {
+        "slither_report": report,
+        "slither_findings": load_slither_findings(fm, ver),
+        "discovery_threats": new_threats_count,
+        "retired_tests": retired_tests
+    }
+
+
+def _red_jobs(state: AgentState) -> list:
+    """每组 Slither 发现一个攻击任务；没有可用发现时退化为整份报告一个任务"""
+    findings = state.get("slither_findings") or []
+    if not findings:
+        return [{"finding": None, "report": state["slither_report"]}]
+    return [{"finding": f["check"], "report": f["report"]} for f in findings[:settings.RED_TEAM_MAX_JOBS]]
+
+
+def _prepare_exploit(agent: RedAgent, task_id: str, task_dir, source: str, job: dict, filename: str):
+    """
+    生成攻击脚本并做编译预检，预检失败时带编译错误让红队修复，最多 RED_TEAM_REPAIR_ATTEMPTS 次。
+    返回: (代码, 预检错误 | None (预检不可用))
+    """
+    code = agent.generate_exploit(source, job["report"])
+    errors = check_compiles(task_dir, f"test/{filename}", code)
+    attempt = 0
+    while errors and attempt < settings.RED_TEAM_REPAIR_ATTEMPTS:
+        attempt += 1
+        log_to_db(task_id, f"🔧 [Red Team] {filename} failed to compile ({len(errors)} error(s)), repair attempt {attempt}...")
+        code = agent.repair_exploit(source, code, errors)
+        errors = check_compiles(task_dir, f"test/{filename}", code)
+    return code, errors
+
+
+def _run_exploit_tests(task_dir, match_path: str):
+    """
+    运行一批攻击脚本。
+    返回: (forge JSON 结果 | None (编译失败), 完整输出)
+    """
+    result = run_forge(task_dir, f"forge test --json --match-path '{match_path}'", exploits=match_path)
+    stdout = result.stdout or ""
+    full_output = stdout + (result.stderr or "")
+
+    # 编译检查 (保留这个守门员)：有时候 JSON 混在报错里，如果 output 里没有 '{'，那肯定是挂了
+    if "{" not in (stdout or ""):
+        return None, full_output
+
+    json_str = stdout[stdout.find('{'):stdout.rfind('}') + 1]
+    return json.loads(json_str), full_output
 
 
 # =========================================
 # 节点 2: 武器化 (Weaponization)
 # =========================================
+@traced_node("weaponize")
+@budget_guard
+@persists("test")
 def node_red_weaponize(state: AgentState):
     task_id = state["task_id"]
     ver = get_ver_tag(state)
-    current_new_threats = state.get("new_threats_count", 0)
+    current_new_threats = state.get("discovery_threats", 0)
+    jobs = _red_jobs(state)
 
     update_phase(task_id, f"Red Team ({ver})")
-    log_to_db(task_id, f"⚔️ [Red Team - {ver}] Weaponizing static report...")
+    log_to_db(task_id, f"⚔️ [Red Team - {ver}] Weaponizing {len(jobs)} finding group(s)...")
 
     agent = RedAgent()
     db = SessionLocal()
     fm = FileManager(db, task_id)
 
-    # 1. 生成攻击代码
-    exploit_code = agent.generate_exploit(state["current_source"], state["slither_report"])
-
-    # 👇👇👇 改动 1: 创建标准的 src 和 test 目录 👇👇👇
-    src_dir = fm.task_dir / "src"
-    test_dir = fm.task_dir / "test"
-    src_dir.mkdir(exist_ok=True)
+    # 👇👇👇 改动 1: 创建标准的 test 目录 👇👇👇
+    test_dir = fm.work_dir / "test"
     test_dir.mkdir(exist_ok=True)
 
-    # 👇👇👇 改动 2: 将目标合约写入 src/Target.sol 👇👇👇
-    target_sol_path = src_dir / "Target.sol"
-    with open(target_sol_path, "w", encoding="utf-8") as f:
-        f.write(state["current_source"])
-
-    # 👇👇👇 改动 3: 将攻击脚本写入 test/ 目录 👇👇👇
-    temp_filename = f"Red_Exploit_{ver}.t.sol"
-    temp_file_path = test_dir / temp_filename
-
-    with open(temp_file_path, "w", encoding="utf-8") as f:
-        f.write(exploit_code)
-
-    log_to_db(task_id, f"⚡ [Red Team] Pre-validating exploit...")
-
-    # 👇👇👇 改动 4: 运行命令指向 test/ 目录 👇👇👇
-    # 注意：在容器内，fm.task_dir 挂载为 /app
-    container_test_path = f"test/{temp_filename}"
-    cmd = f"forge test --json --match-path {container_test_path}"
+    # 👇👇👇 改动 2: 并行阶段固化的 Fuzzer 复现脚本从 pending/ 移入 test/ 👇👇👇
+    # src/Target.sol 已由构建节点写好，编译预检可直接解析 import
+    pending_dir = fm.work_dir / PENDING_DIR
+    if pending_dir.exists():
+        for pending in pending_dir.glob("*.t.sol"):
+            os.replace(pending, test_dir / pending.name)
+    # 被新代表接替的旧复现脚本：并行阶段回归验证可能仍在运行它，汇合后才删除
+    for name in state.get("retired_tests") or []:
+        (test_dir / name).unlink(missing_ok=True)
+
+    # 1. 按发现分组并行生成攻击代码并预检编译 (线程继承 span / 任务上下文)
+    filenames = [f"Red_Exploit_{ver}_f{idx}.t.sol" for idx in range(len(jobs))]
+    with ContextThreadPoolExecutor(max_workers=settings.RED_TEAM_CONCURRENCY) as pool:
+        prepared = list(pool.map(
+            lambda args: _prepare_exploit(agent, task_id, fm.work_dir, state["current_source"], *args),
+            zip(jobs, filenames)))
+
+    # 👇👇👇 改动 3: 每个任务一个攻击脚本，写入 test/ 目录 👇👇👇
+    # 注意：在容器内，fm.work_dir (工作区) 挂载为 /app
+    batch = {}
+    for job, filename, (exploit_code, errors) in zip(jobs, filenames, prepared):
+        if errors:
+            # 修复次数用尽仍无法编译，不进入 forge 测试
+            log_to_db(task_id, f"🗑️ [Red Team] Discarding uncompilable exploit: {filename} ({errors[0].splitlines()[0][:200]})")
+            continue
+        with open(test_dir / filename, "w", encoding="utf-8") as f:
+            f.write(exploit_code)
+        batch[filename] = {"finding": job["finding"], "code": exploit_code}
+
+    if not batch:
+        error_msg = "Red Team Exploit Compilation Failed! All exploits failed the compile pre-check after repair."
+        log_to_db(task_id, f"❌ {error_msg}", "ERROR")
+        db.close()
+        raise Exception("Red Team Code Compilation Failed. Workflow Halted.")
 
-    stdout, stderr = run_docker_command(fm.task_dir, cmd)
-    full_output = (stdout or "") + (stderr or "")
+    log_to_db(task_id, f"⚡ [Red Team] Pre-validating {len(batch)} exploit(s) in one forge run...")
 
-    # 3. 编译检查 (保留这个守门员)
-    if "Compilation failed" in full_output or "Error:" in full_output or "ParserError" in full_output:
-        # 有时候 JSON 混在报错里，我们需要更智能的判断
-        # 如果 output 里没有 '{'，那肯定是挂了
-        if "{" not in stdout:
+    # 👇👇👇 改动 4: 一次 forge 运行验证整批脚本 👇👇👇
+    results = {}
+    try:
+        data, full_output = _run_exploit_tests(fm.work_dir, f"test/Red_Exploit_{ver}_f*.t.sol")
+        compiled = data is not None
+        if compiled:
+            results = data
+        elif len(batch) > 1:
+            # 任意一个脚本编译失败都会拖垮整批，逐个重跑以隔离坏脚本
+            log_to_db(task_id, "⚠️ [Red Team] Batch compilation failed, isolating broken exploits...", "WARNING")
+            for filename in batch:
+                data, _ = _run_exploit_tests(fm.work_dir, f"test/{filename}")
+                if data is None:
+                    log_to_db(task_id, f"🗑️ [Red Team] Discarding uncompilable exploit: {filename}")
+                    continue
+                compiled = True
+                results.update(data)
+
+        if not compiled:
             error_msg = f"Red Team Exploit Compilation Failed!\nOutput: {full_output}"
             log_to_db(task_id, f"❌ {error_msg}", "ERROR")
+            for filename in batch:
+                os.remove(test_dir / filename)
+            db.close()
             raise Exception("Red Team Code Compilation Failed. Workflow Halted.")
-
-    valid_exploits_count = 0
-
-    # 4. JSON 解析 (替代 Regex)
-    try:
-        # 提取 JSON 部分 (防止有其他日志干扰)
-        if "{" in stdout:
-            json_str = stdout[stdout.find('{'):stdout.rfind('}') + 1]
-            data = json.loads(json_str)
-
-            # 遍历 Forge JSON 结构
-            # 结构通常是: { "tests/Temp_Red_v1.t.sol": { "test_results": { "testExploit_01": { "status": "Success" } } } }
-            for file_path, file_data in data.items():
-                test_results = file_data.get("test_results", {})
-
-                for test_name, result in test_results.items():
-                    status = result.get("status")
-
-                    # Foundry JSON 中: "Success" = PASS, "Failure" = FAIL
-                    if status == "Success":
-                        # 🎯 攻击成功！
-                        exists = db.query(TestCase).filter_by(task_id=task_id, name=test_name).first()
-                        if not exists:
-                            tc = TestCase(
-                                id=str(uuid.uuid4()), task_id=task_id,
-                                source="RED_TEAM",
-                                name=test_name,
-                                description=f"Verified Exploit from {ver}",
-                                code=exploit_code,
-                                status="FAILING",
-                                version_added=ver
-                            )
-                            db.add(tc)
-                            valid_exploits_count += 1
-                            log_to_db(task_id, f"🔴 [Matrix] Verified & Injected: {test_name}")
-                    else:
-                        # 攻击失败
-                        reason = result.get("reason", "Unknown")
-                        log_to_db(task_id, f"🗑️ [Red Team] Discarding failed exploit: {test_name} (Reason: {reason})")
-        else:
-            log_to_db(task_id, f"⚠️ Warning: No JSON output from Forge. Full Output: {full_output}", "WARNING")
-
-    except Exception as e:
+    except json.JSONDecodeError as e:
         log_to_db(task_id, f"❌ JSON Parse Error in Red Team: {str(e)}", "ERROR")
-        # 这里可以选择抛出异常，或者忽略当前轮次
 
-    # 5. 保存有效攻击文件
-    if valid_exploits_count > 0:
-        perm_filename = f"Red_Exploit_{ver}_{uuid.uuid4().hex[:6]}.t.sol"
-        fm.save_artifact(perm_filename, exploit_code, "exploit")
-
-    try:
-        os.remove(fm.task_dir / temp_filename)
-    except:
-        pass
+    valid_exploits_count = 0
+    proven_files = set()
+
+    # 5. 逐个结果归因到对应的发现
+    # 结构通常是: { "test/Red_Exploit_v1_f0.t.sol:ExploitTest": { "test_results": { "testExploit_01": { "status": "Success" } } } }
+    for file_key, file_data in results.items():
+        filename = os.path.basename(file_key.split(":")[0])
+        job = batch.get(filename)
+        if job is None:
+            continue
+        label = job["finding"] or "full report"
+
+        for test_name, result in file_data.get("test_results", {}).items():
+            # Foundry JSON 中: "Success" = PASS, "Failure" = FAIL
+            if result.get("status") == "Success":
+                # 🎯 攻击成功！
+                proven_files.add(filename)
+                exists = db.query(TestCase).filter_by(task_id=task_id, name=test_name, test_file=filename).first()
+                if not exists:
+                    # 同一攻击文件中的多个用例共享一份代码块
+                    job["hash"] = job.get("hash") or put_code(job["code"])
+                    tc = TestCase(
+                        id=str(uuid.uuid4()), task_id=task_id,
+                        source="RED_TEAM",
+                        name=test_name,
+                        description=f"Verified Exploit from {ver} ({label})",
+                        code_hash=job["hash"],
+                        finding=job["finding"],
+                        test_file=filename,
+                        status="FAILING",
+                        version_added=ver
+                    )
+                    db.add(tc)
+                    valid_exploits_count += 1
+                    log_to_db(task_id, f"🔴 [Matrix] Verified & Injected: {test_name} [{label}]")
+            else:
+                # 攻击失败
+                reason = result.get("reason", "Unknown")
+                log_to_db(task_id, f"🗑️ [Red Team] Discarding failed exploit: {test_name} [{label}] (Reason: {reason})")
+
+    # 6. 只保留证明了漏洞的攻击脚本，回归验证会在 test/ 下重跑它们
+    for filename, job in batch.items():
+        if filename not in proven_files:
+            try:
+                os.remove(test_dir / filename)
+            except OSError:
+                pass
+            if job["finding"]:
+                log_to_db(task_id, f"⚪ [Red Team] Finding not proven: {job['finding']}")
 
     db.commit()
     db.close()
@@ -240,13 +438,20 @@ def node_red_weaponize(state: AgentState):
     total_new_threats = current_new_threats + valid_exploits_count
     return {"new_threats_count": total_new_threats}
 
-
 # =========================================
 # 节点 3: 终止判定 (Gatekeeper)
 # =========================================
+@traced_node("check")
 def node_check_termination(state: AgentState):
+    # 不做耗时操作，不加 budget_guard：本轮各节点都已执行时，先判定 secure 再看预算
     task_id = state["task_id"]
+    if state.get("execution_status") == BUDGET_EXHAUSTED:
+        # 本轮有节点因预算被跳过，矩阵状态不完整，不能据此判定 secure
+        return {"execution_status": BUDGET_EXHAUSTED}
+
     new_threats = state.get("new_threats_count", 0)
+    divergences = state.get("differential_divergences", 0)
+    gas_regressions = state.get("gas_regressions", 0)
 
     db = SessionLocal()
     # 查询矩阵中当前还是红色的用例总数
@@ -256,17 +461,35 @@ def node_check_termination(state: AgentState):
     ).count()
     db.close()
 
-    log_to_db(task_id, f"🧐 [Gatekeeper] New Threats: {new_threats} | Total Active Reds: {active_reds}")
+    log_to_db(task_id, f"🧐 [Gatekeeper] New Threats: {new_threats} | Total Active Reds: {active_reds} | Divergences: {divergences} | Gas Regressions: {gas_regressions}")
 
-    if active_reds == 0 and new_threats == 0:
+    if active_reds == 0 and new_threats == 0 and divergences == 0 and gas_regressions == 0:
         return {"execution_status": "secure"}
-    else:
-        return {"execution_status": "needs_fix"}
+
+    # 墙钟 / 容器时间 / token 预算：还需要修复但已超限
+    db = SessionLocal()
+    try:
+        reason = exhausted_budget(db, task_id, state.get("run_started_at"))
+    finally:
+        db.close()
+    if reason:
+        log_to_db(task_id, f"💸 [Budget] Exhausted before 'node_blue_fix': {reason}", "WARNING")
+        return {"execution_status": BUDGET_EXHAUSTED, "budget_reason": reason}
+
+    # 轮次预算：已完成的修复轮次达到上限，不再进入下一轮
+    max_rounds = state.get("max_rounds", 0)
+    round_count = state.get("round_count", 0)
+    if max_rounds and round_count >= max_rounds:
+        return {"execution_status": BUDGET_EXHAUSTED, "budget_reason": f"rounds {round_count} / {max_rounds}"}
+
+    return {"execution_status": "needs_fix"}
 
 
 # =========================================
 # 节点 4: 蓝队修复 (Fix)
 # =========================================
+@traced_node("fix")
+@budget_guard
 def node_blue_fix(state: AgentState):
     task_id = state["task_id"]
     current_ver = get_ver_tag(state)
@@ -282,27 +505,37 @@ def node_blue_fix(state: AgentState):
     # 提取所有红色用例 (FAILING)
     failed_cases = db.query(TestCase).filter(TestCase.task_id == task_id, TestCase.status == "FAILING").all()
 
-    # 拼接 Prompt
-    failed_snippets = "\n".join([f"// Exploit {c.name}\n{c.code}" for c in failed_cases[:3]])
+    # 拼接 Prompt (多个用例往往来自同一攻击文件，按代码哈希去重)
+    failed_snippets = "\n".join([f"// Exploit {c.name}\n{code}" for c, code in unique_codes(db, failed_cases)[:3]])
     db.close()
 
     agent = BlueAgent()
-    fixed_code = agent.fix_vulnerability(state["current_source"], state["slither_report"], failed_snippets)
+    fixed_code = agent.fix_vulnerability(state["current_source"], state["slither_report"], failed_snippets,
+                                         state.get("divergence_report", ""), state.get("gas_report", ""))
 
     # ⚠️ 关键操作：覆盖主文件
     fm = FileManager(db, task_id)
     fm.save_artifact(fm.task.contract_name, fixed_code)
 
-    # 备份
-    fm.save_artifact(f"Backup_{next_ver}.sol", fixed_code)
+    # 备份：版本内容存入代码块，只登记引用，不再另写 Backup_vN.sol
+    fixed_hash = put_code(fixed_code)
+    db.add(TaskArtifact(
+        task_id=task_id,
+        artifact_type="source_version",
+        filename=f"Backup_{next_ver}.sol",
+        file_path=f"blob:{fixed_hash}",
+        phase=next_ver
+    ))
 
     # 更新 DB 供前端 Diff
     task = db.query(Task).filter(Task.id == task_id).first()
     if task:
-        task.fixed_code = fixed_code
-        db.commit()
+        task.fixed_hash = fixed_hash
+    db.commit()
+    db.close()
 
     return {
+        "previous_source": state["current_source"],
         "current_source": fixed_code,
         "round_count": next_round
     }
@@ -311,30 +544,29 @@ def node_blue_fix(state: AgentState):
 # =========================================
 # 节点 5: 全量验证 (Regression Validation)
 # =========================================
+@traced_node("validate")
+@budget_guard
 def node_validate_matrix(state: AgentState):
     task_id = state["task_id"]
     current_ver = get_ver_tag(state)
-    update_phase(task_id, f"Regression ({current_ver})")
-    log_to_db(task_id, f"🧪 [Validation - {current_ver}] Regression testing...")
 
     db = SessionLocal()
-    fm = FileManager(db, task_id)
+    # 首轮 (非热启动) 矩阵为空，直接汇合到 weaponize
+    if db.query(TestCase.id).filter(TestCase.task_id == task_id).first() is None:
+        db.close()
+        return {"regression_active": 0}
 
-    # 👇👇👇 改动 1: 覆盖 src/Target.sol 为最新代码 (v2/v3) 👇👇👇
-    src_dir = fm.task_dir / "src"
-    src_dir.mkdir(exist_ok=True)
-    target_sol_path = src_dir / "Target.sol"
-
-    with open(target_sol_path, "w", encoding="utf-8") as f:
-        f.write(state["current_source"])
+    update_phase(task_id, f"Regression ({current_ver})")
+    log_to_db(task_id, f"🧪 [Validation - {current_ver}] Regression testing...")
+    fm = FileManager(db, task_id)
 
-    # 👇👇👇 改动 2: 扫描 test/ 目录下的所有测试文件 👇👇👇
-    # 这样旧的 Red_Exploit_v1.t.sol (在 test/ 里) 会引用新的 src/Target.sol
-    container_pattern = "test/*.t.sol"
-    cmd = f"forge test --json {container_pattern}"
+    # 👇👇👇 扫描 test/ 目录下的所有攻击脚本 (生成的 harness 除外) 👇👇👇
+    # 旧的 Red_Exploit_v1.t.sol 引用最新的 src/Target.sol，已在本轮的规范构建中编译，这里只执行
+    cmd = f"forge test --json --match-path 'test/*.t.sol' --no-match-path '{GENERATED_DIR}/*'"
 
-    stdout, stderr = run_docker_command(fm.task_dir, cmd)
-    full_output = (stdout or "") + (stderr or "")
+    result = run_forge(fm.work_dir, cmd, regression=True)
+    stdout = result.stdout or ""
+    full_output = stdout + (result.stderr or "")
 
     # 2. 编译检查 (防止蓝队改坏了代码导致编译不过)
     if "Compilation failed" in full_output or "Error:" in full_output:
@@ -350,24 +582,38 @@ def node_validate_matrix(state: AgentState):
     # 3. 解析结果并更新数据库
     try:
         results_map = {}
+        file_results_map = {}
+        file_tests = {}
         if "{" in stdout:
             json_str = stdout[stdout.find('{'):stdout.rfind('}') + 1]
             data = json.loads(json_str)
 
             # 展平结果：文件名 -> 测试函数 -> 结果
+            # 不同发现的攻击脚本可能使用相同的函数名，带 test_file 的用例按 (文件, 函数名) 匹配
             for file_path, file_data in data.items():
+                filename = os.path.basename(file_path.split(":")[0])
                 test_results = file_data.get("test_results", {})
                 for test_name, result in test_results.items():
                     results_map[test_name] = result.get("status")  # "Success" or "Failure"
+                    file_results_map[(filename, test_name)] = result.get("status")
+                    file_tests.setdefault(filename, []).append(result.get("status"))
 
         # 4. 对比数据库中的已知威胁
         all_cases = db.query(TestCase).filter(TestCase.task_id == task_id).all()
 
         for tc in all_cases:
             # 只关心由于 Red Team 生成的测试用例 (Fuzzer的也可以，但主要是 Red)
-            if tc.name in results_map:
+            key = (tc.test_file, tc.name)
+            forge_status = None
+            if key in file_results_map:
+                forge_status = file_results_map[key]
+            elif tc.test_file and len(file_tests.get(tc.test_file, [])) == 1:
+                # Fuzzer 复现脚本只有一个测试函数，用例名与函数名不同
+                forge_status = file_tests[tc.test_file][0]
+            elif not tc.test_file and tc.name in results_map:
                 forge_status = results_map[tc.name]
 
+            if forge_status is not None:
                 # 👇👇👇 关键逻辑反转 (Logic Inversion) 👇👇👇
                 # 在回归测试中：
                 # 如果攻击代码执行 Success -> 说明攻击成功 -> 漏洞依然存在 -> FAILING
@@ -395,8 +641,113 @@ def node_validate_matrix(state: AgentState):
 
     log_to_db(task_id, f"📊 [Regression] {passed_cnt} Green (Fixed) | {failed_cnt} Red (Active)")
 
-    # 返回剩余的威胁数量，如果没有威胁了，Router 就会结束任务
-    return {"new_threats_count": failed_cnt}
+    # 剩余的有效攻击数，Check 节点以数据库中的 FAILING 用例为准
+    return {"regression_active": failed_cnt}
+
+
+# =========================================
+# 节点 6: 差分测试 (Differential Fuzzing)
+# =========================================
+@traced_node("differential")
+@budget_guard
+def node_differential(state: AgentState):
+    """
+    修复前后两个版本并排部署，以相同调用序列比较行为。
+    与回归验证 / 侦查并行，修补路径之外的分歧计入本轮威胁并交给下一轮蓝队。
+    """
+    task_id = state["task_id"]
+    previous = state.get("previous_source")
+    # 首轮没有上一版本
+    if not previous or previous == state["current_source"] or settings.DIFF_FUZZ_RUNS <= 0:
+        return {"differential_divergences": 0, "divergence_report": ""}
+
+    current_ver = get_ver_tag(state)
+    log_to_db(task_id, f"🔀 [Differential - {current_ver}] Comparing behavior with the previous version...")
+
+    db = SessionLocal()
+    try:
+        fm = FileManager(db, task_id)
+        report = run_differential_fuzz(fm.work_dir, fm.work_dir / TARGET_SOURCE, previous)
+
+        task = db.query(Task).filter(Task.id == task_id).first()
+        if task:
+            task.differential_report = json.dumps(dict(report, version=current_ver))
+            db.commit()
+    except Exception as e:
+        # 差分测试只用于发现功能回归，失败不阻断主流程
+        log_to_db(task_id, f"⚠️ Differential fuzzing failed: {e}", "WARNING")
+        return {"differential_divergences": 0, "divergence_report": ""}
+    finally:
+        db.close()
+
+    excluded = ", ".join(report["excluded"]) or "none"
+    if report["status"] == "diverged":
+        log_to_db(task_id, f"🟣 [Differential] {current_ver} diverges from the previous version outside patched paths: "
+                           f"{report['divergence'].get('reason')} (patched: {excluded})")
+        return {"differential_divergences": 1, "divergence_report": divergence_summary(report)}
+    if report["status"] == "failed":
+        log_to_db(task_id, f"⚠️ [Differential] Could not run: {(report.get('detail') or '')[-300:]}", "WARNING")
+    elif report["status"] == "skipped":
+        log_to_db(task_id, f"⚪ [Differential] Skipped: {report.get('detail')}")
+    else:
+        log_to_db(task_id, f"🟢 [Differential] No divergence in {report['runs']} runs (patched: {excluded})")
+    return {"differential_divergences": 0, "divergence_report": ""}
+
+
+# =========================================
+# 节点 7: Gas 回归门禁 (Gas Probe)
+# =========================================
+@traced_node("gas")
+@budget_guard
+@persists("artifacts")
+def node_gas_probe(state: AgentState):
+    """
+    每个版本执行合法路径 gas 探针 (forge snapshot)，逐函数与基线版本对比并落库。
+    增幅超过阈值时按配置告警 (flag) 或计入本轮威胁退回蓝队 (reject)。
+    reject 模式下基线是最近一个未被退回的版本，被退回的版本不会成为下一轮的基线。
+    """
+    task_id = state["task_id"]
+    action = settings.GAS_REGRESSION_ACTION
+    if action == "off":
+        return {"gas_regressions": 0, "gas_report": ""}
+
+    current_ver = get_ver_tag(state)
+    threshold = settings.GAS_REGRESSION_THRESHOLD_PCT
+
+    db = SessionLocal()
+    try:
+        fm = FileManager(db, task_id)
+        current = run_gas_snapshot(fm.work_dir, fm.work_dir / TARGET_SOURCE)
+
+        baseline_ver, previous = gas_baseline(
+            db.query(GasReport).filter(GasReport.task_id == task_id).all(), current_ver, action == "reject")
+        rows = compare_gas(current, previous or None, threshold)
+
+        db.query(GasReport).filter(GasReport.task_id == task_id, GasReport.version == current_ver).delete()
+        for row in rows:
+            db.add(GasReport(task_id=task_id, version=current_ver, **row))
+        db.commit()
+    except Exception as e:
+        # gas 门禁只衡量开销，探针失败不阻断主流程
+        log_to_db(task_id, f"⚠️ Gas probe failed: {e}", "WARNING")
+        return {"gas_regressions": 0, "gas_report": ""}
+    finally:
+        db.close()
+
+    regressed = [r for r in rows if r["status"] == "regressed"]
+    if not regressed:
+        worst = max((r["delta_pct"] for r in rows if r["delta_pct"] is not None), default=None)
+        detail = f"max delta {worst:+}% vs {baseline_ver}" if worst is not None else "baseline recorded"
+        log_to_db(task_id, f"⛽ [Gas - {current_ver}] {len(rows)} function(s) probed, {detail}")
+        return {"gas_regressions": 0, "gas_report": ""}
+
+    summary = gas_regression_summary(rows, threshold)
+    if action == "reject":
+        log_to_db(task_id, f"🟠 [Gas - {current_ver}] Fix rejected (baseline {baseline_ver}): {summary}", "WARNING")
+        return {"gas_regressions": len(regressed), "gas_report": summary}
+
+    log_to_db(task_id, f"🟡 [Gas - {current_ver}] Flagged: {summary}", "WARNING")
+    return {"gas_regressions": 0, "gas_report": ""}
 
 
 # =========================================
@@ -404,15 +755,14 @@ def node_validate_matrix(state: AgentState):
 # =========================================
 def router_decision(state: AgentState):
     status = state.get("execution_status")
-    round_count = state.get("round_count", 0)
-    max_rounds = 10
 
     if status == "secure":
         log_to_db(state["task_id"], "🏆 [Success] System Secure. No new threats & All matrix cases passed.")
         return END
 
-    if round_count >= max_rounds:
-        log_to_db(state["task_id"], "🚫 [Failure] Max iterations reached. Vulnerabilities persist.")
+    if status == BUDGET_EXHAUSTED:
+        reason = state.get("budget_reason", "")
+        log_to_db(state["task_id"], f"🚫 [Failure] Budget exhausted ({reason}). Vulnerabilities persist.")
         return END
 
     return "fix"
@@ -426,16 +776,25 @@ def create_graph():
     workflow = StateGraph(AgentState)
 
     # 注册节点
+    workflow.add_node("build", node_build)
     workflow.add_node("discovery", node_discovery)
     workflow.add_node("weaponize", node_red_weaponize)
     workflow.add_node("check", node_check_termination)
     workflow.add_node("fix", node_blue_fix)
     workflow.add_node("validate", node_validate_matrix)
+    workflow.add_node("differential", node_differential)
+    workflow.add_node("gas", node_gas_probe)
 
     # 流程编排 (闭环结构)
-    workflow.add_edge(START, "discovery")
-    # 1. 侦查 -> 2. 武器化 -> 3. 判定
-    workflow.add_edge("discovery", "weaponize")
+    # 每轮先做一次规范构建，之后回归验证与侦查等分支只读取编译产物，并行执行后在武器化前汇合
+    # (热启动时矩阵来自历史任务，首轮即回归验证；否则 validate 直接返回)
+    workflow.add_edge(START, "build")
+    workflow.add_edge("build", "validate")
+    workflow.add_edge("build", "discovery")
+    workflow.add_edge("build", "differential")
+    workflow.add_edge("build", "gas")
+    # 0. 构建 -> 1. (侦查 ‖ 回归验证 ‖ 差分测试 ‖ gas 门禁) -> 2. 武器化 -> 3. 判定
+    workflow.add_edge(["validate", "discovery", "differential", "gas"], "weaponize")
     workflow.add_edge("weaponize", "check")
 
     # 3. 判定 -> (Secure/End) OR (Fix)
@@ -448,8 +807,7 @@ def create_graph():
         }
     )
 
-    # 4. 修复 -> 5. 回归验证 -> 1. 下一轮侦查 (Loop)
-    workflow.add_edge("fix", "validate")
-    workflow.add_edge("validate", "discovery")  # 强制闭环
+    # 4. 修复 -> 0. 构建新版本 -> (5. 回归验证 ‖ 1. 下一轮侦查 ‖ 6. 差分测试 ‖ 7. gas 门禁) (Loop)
+    workflow.add_edge("fix", "build")  # 强制闭环
 
     return workflow.compile()
\ No newline at end of file
@@ -1,6 +1,12 @@
 import os
+import time
 from langchain_openai import ChatOpenAI
+from sqlalchemy import update, func
 from src.core.config import settings
+from src.core.tracing import span, current_task_id, current_round
+from src.core.metrics import LLM_TOKENS
+from src.db.session import SessionLocal
+from src.db.models import Task, LLMCall
 
 def get_llm():
     """
@@ -17,4 +23,83 @@ def get_llm():
         base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
         temperature=0.1,  # Low temperature for deterministic code generation
         streaming=True    # Enable streaming support
-    )
\ No newline at end of file
+    )
+
+
+def extract_token_usage(result) -> dict:
+    """
+    从 AIMessage 中取出 token 用量 (DashScope 兼容模式返回 OpenAI 格式的 usage)。
+    """
+    usage = getattr(result, "usage_metadata", None) or {}
+    if usage:
+        return {
+            "prompt_tokens": usage.get("input_tokens", 0),
+            "completion_tokens": usage.get("output_tokens", 0),
+            "total_tokens": usage.get("total_tokens", 0),
+        }
+
+    meta = (getattr(result, "response_metadata", None) or {}).get("token_usage") or {}
+    return {
+        "prompt_tokens": meta.get("prompt_tokens", 0),
+        "completion_tokens": meta.get("completion_tokens", 0),
+        "total_tokens": meta.get("total_tokens", 0),
+    }
+
+
+def record_llm_call(agent: str, model: str, usage: dict, latency_ms: float, status: str):
+    """写入调用明细，并原子累加到任务的用量汇总"""
+    task_id = current_task_id()
+    if not task_id:
+        return
+
+    db = SessionLocal()
+    try:
+        db.add(LLMCall(
+            task_id=task_id,
+            agent=agent,
+            model=model,
+            round=current_round(),
+            prompt_tokens=usage["prompt_tokens"],
+            completion_tokens=usage["completion_tokens"],
+            total_tokens=usage["total_tokens"],
+            latency_ms=round(latency_ms, 3),
+            status=status
+        ))
+        db.execute(
+            update(Task)
+            .where(Task.id == task_id)
+            .values(
+                prompt_tokens=func.coalesce(Task.prompt_tokens, 0) + usage["prompt_tokens"],
+                completion_tokens=func.coalesce(Task.completion_tokens, 0) + usage["completion_tokens"],
+                total_tokens=func.coalesce(Task.total_tokens, 0) + usage["total_tokens"],
+            )
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ LLM usage record failed: {e}")
+    finally:
+        db.close()
+
+
+def invoke_llm(chain, inputs: dict, agent: str):
+    """
+    调用 LLM chain，并记录一段 kind="llm" 的 span (所属任务/轮次取自当前上下文)，
+    同时把 token 用量写入 llm_calls 并累加到任务。
+    """
+    model = settings.LLM_MODEL
+    usage = {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    status = "error"
+    started = time.perf_counter()
+    try:
+        with span(f"{agent}.invoke", kind="llm", agent=agent, model=model) as sp:
+            result = chain.invoke(inputs)
+            usage = extract_token_usage(result)
+            status = "ok"
+            LLM_TOKENS.inc(usage["prompt_tokens"], model=model, type="prompt")
+            LLM_TOKENS.inc(usage["completion_tokens"], model=model, type="completion")
+            sp.set("output_chars", len(getattr(result, "content", "") or ""))
+            sp.set("total_tokens", usage["total_tokens"])
+            return result
+    finally:
+        record_llm_call(agent, model, usage, (time.perf_counter() - started) * 1000, status)
@@ -16,11 +16,11 @@ class TaskManager:
         """
         在后台线程启动工作流，避免阻塞 API
         """
-        # 1. 更新数据库状态为 running
+        # 1. 更新数据库状态为 queued，真正拿到执行槽后 runner 会改为 running
         task = self.db.query(Task).filter(Task.id == self.task_id).first()
         if task:
-            task.status = "running"
-            task.current_phase = "Initializing"
+            task.status = "queued"
+            task.current_phase = "Queued"
 
             # 👇👇👇 核心修复：记录开始时间，前端计时器才能走动 👇👇👇
             if not task.started_at:
@@ -0,0 +1,290 @@
+"""
+存储回收 (后台 GC)。
+
+按任务状态与时长执行保留策略：
+  - 已结束的任务：结束 GC_PRUNE_AFTER_SECONDS 后删除构建产物与缓存 (out*/ cache*/ lib/ scratch/ 等)，
+    只保留上传文件、日志归档与声明的产物；失败 / 停止的任务保留 GC_PRUNE_FAILED_AFTER_SECONDS 便于排查
+  - 软删除的任务：GC_DELETED_RETENTION_SECONDS 宽限期后删除任务目录与全部数据库行
+  - 不再被任何任务 / 用例 / 产物引用的代码块
+回收在单独的低优先级线程中分批执行：有任务排队时推迟，每处理一个任务停顿 GC_PAUSE_SECONDS；
+同一时刻只执行一轮 (后台线程与手动触发互斥)。
+"""
+import shutil
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional, Tuple
+
+from sqlalchemy import exists, func, literal, or_
+
+from src.core.config import settings
+from src.core.metrics import registry
+from src.db.blob_store import forget_codes
+from src.db.models import (
+    Task, TestCase, StreamLog, TaskArtifact, TaskSpan, LLMCall, GasReport, CodeBlob
+)
+from src.db.session import SessionLocal
+from src.engine.dedup import FINISHED_STATUSES
+from src.engine.scheduler import scheduler
+from src.engine.tools.workspace import PERSISTED, release_workspace, storage_dir, workspace_dir
+
+GC_RECLAIMED_BYTES = registry.counter(
+    "soliforge_gc_reclaimed_bytes_total", "Bytes removed from task storage by the GC", ("reason",))
+GC_DELETED_ROWS = registry.counter(
+    "soliforge_gc_deleted_rows_total", "Database rows purged by the GC", ("table",))
+GC_RUN_SECONDS = registry.histogram(
+    "soliforge_gc_run_seconds", "Duration of one GC pass")
+
+# 任务目录中始终保留的子目录 (声明的产物)；根目录下的上传合约与日志归档不是目录，同样保留
+_KEEP = set(PERSISTED)
+# 失败 / 停止的任务保留更久的构建现场
+_FAILED_STATUSES = ("failed", "stopped", "budget_exhausted")
+# 代码块写入 (或被 put_code 再次命中) 后才被引用，宽限期内的孤儿块可能属于进行中的事务
+_BLOB_GRACE = timedelta(hours=1)
+# 软删除任务的子表，按外键依赖顺序删除
+_CHILD_TABLES = (TestCase, StreamLog, TaskArtifact, TaskSpan, LLMCall, GasReport)
+
+
+def _size(path: Path) -> int:
+    if path.is_symlink() or path.is_file():
+        return path.lstat().st_size
+    return sum(p.lstat().st_size for p in path.rglob("*") if p.is_file() and not p.is_symlink())
+
+
+def _remove(path: Path) -> int:
+    """删除文件或目录，返回释放的字节数"""
+    if not path.exists() and not path.is_symlink():
+        return 0
+    size = _size(path)
+    if path.is_dir() and not path.is_symlink():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+    return size
+
+
+def _build_outputs(task_dir: Path) -> list:
+    """构建产物与缓存：上传文件、日志归档和声明的产物之外、由流水线生成的路径"""
+    if not task_dir.is_dir():
+        return []
+    paths = [p for p in task_dir.iterdir()
+             if p.is_dir() and p.name not in _KEEP]
+    paths += [task_dir / name for name in ("foundry.toml", "remappings.txt")]
+    paths += [task_dir / "test" / "generated"]
+    return [p for p in paths if p.exists()]
+
+
+class StorageGC:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pass_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {
+            "runs": 0,
+            "skipped_busy": 0,
+            "skipped_overlap": 0,
+            "tasks_pruned": 0,
+            "tasks_purged": 0,
+            "blobs_purged": 0,
+            "bytes_reclaimed": 0,
+            "rows_deleted": {},
+            "last_run_at": None,
+            "last_run_ms": 0.0,
+            "last_error": None,
+        }
+
+    # --- 生命周期 ---
+    def start(self):
+        if settings.GC_INTERVAL_SECONDS <= 0:
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="storage-gc", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            data = dict(self._stats, rows_deleted=dict(self._stats["rows_deleted"]))
+        data["running"] = self._thread is not None and self._thread.is_alive()
+        data["interval_seconds"] = settings.GC_INTERVAL_SECONDS
+        return data
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self._stats[key] += n
+
+    def _reclaimed(self, reason: str, size: int):
+        if size:
+            GC_RECLAIMED_BYTES.inc(size, reason=reason)
+            self._count("bytes_reclaimed", size)
+
+    def _rows(self, table: str, n: int):
+        if n:
+            GC_DELETED_ROWS.inc(n, table=table)
+            with self._lock:
+                rows = self._stats["rows_deleted"]
+                rows[table] = rows.get(table, 0) + n
+
+    # --- 节流 ---
+    def _busy(self) -> bool:
+        """有任务在排队时让出 IO，下一个周期再回收"""
+        return scheduler.snapshot()["waiting"] > 0
+
+    def _pause(self) -> bool:
+        """每处理一个任务后停顿；返回 False 表示应结束本轮"""
+        if self._stop.wait(settings.GC_PAUSE_SECONDS):
+            return False
+        return not self._busy()
+
+    @staticmethod
+    def _active(task_id: str) -> bool:
+        return scheduler.is_running(task_id) or scheduler.queue_position(task_id) is not None
+
+    # --- 回收 ---
+    def prune_task(self, task: Task) -> int:
+        """删除已结束任务的构建产物与残留工作区，返回释放的字节数"""
+        reclaimed = 0
+        ws = workspace_dir(task.id)
+        if ws.exists() and ws.resolve() != storage_dir(task.id).resolve():
+            # 进程异常退出时遗留的 tmpfs 工作区：先把声明的产物写回
+            reclaimed += _size(ws)
+            release_workspace(task.id)
+        for path in _build_outputs(storage_dir(task.id)):
+            reclaimed += _remove(path)
+        return reclaimed
+
+    def purge_task(self, db, task: Task) -> int:
+        """彻底删除软删除的任务：目录、工作区与全部数据库行，返回释放的字节数"""
+        reclaimed = _remove(workspace_dir(task.id)) + _remove(storage_dir(task.id))
+        for model in _CHILD_TABLES:
+            n = db.query(model).filter(model.task_id == task.id).delete(synchronize_session=False)
+            self._rows(model.__tablename__, n)
+        db.delete(task)
+        self._rows(Task.__tablename__, 1)
+        db.commit()
+        return reclaimed
+
+    def purge_orphan_blobs(self, db) -> Tuple[int, int]:
+        """删除超过宽限期 (自写入或最近一次 put_code 命中) 且没有任何引用的代码块，返回: (删除数, 释放的字节数)"""
+        cutoff = datetime.now() - _BLOB_GRACE
+        idle = func.coalesce(CodeBlob.last_used_at, CodeBlob.created_at) < cutoff
+        referenced = or_(
+            exists().where(Task.source_hash == CodeBlob.hash),
+            exists().where(Task.fixed_hash == CodeBlob.hash),
+            exists().where(TestCase.code_hash == CodeBlob.hash),
+            exists().where(TaskArtifact.file_path == literal("blob:") + CodeBlob.hash),
+        )
+        orphans = [h for (h,) in db.query(CodeBlob.hash)
+                   .filter(idle, ~referenced)
+                   .limit(settings.GC_BATCH_SIZE * 50)]
+        if not orphans:
+            return 0, 0
+        # 删除时重新检查宽限期与引用：选出之后被 put_code 命中或被引用的代码块保留
+        purgeable = (CodeBlob.hash.in_(orphans), idle, ~referenced)
+        size = db.query(func.coalesce(func.sum(func.length(CodeBlob.data)), 0)).filter(*purgeable).scalar()
+        deleted = db.query(CodeBlob).filter(*purgeable).delete(synchronize_session=False)
+        db.commit()
+        forget_codes(orphans)
+        self._rows(CodeBlob.__tablename__, deleted)
+        self._reclaimed("orphan_blob", int(size or 0))
+        return deleted, int(size or 0)
+
+    def run_once(self) -> dict:
+        """执行一轮回收，返回本轮统计；另一轮回收仍在进行时直接跳过"""
+        if not self._pass_lock.acquire(blocking=False):
+            self._count("skipped_overlap")
+            return {"tasks_pruned": 0, "tasks_purged": 0, "blobs_purged": 0, "bytes_reclaimed": 0,
+                    "skipped": "in_progress"}
+        try:
+            return self._run_pass()
+        finally:
+            self._pass_lock.release()
+
+    def _run_pass(self) -> dict:
+        result = {"tasks_pruned": 0, "tasks_purged": 0, "blobs_purged": 0, "bytes_reclaimed": 0}
+        if self._busy():
+            self._count("skipped_busy")
+            return result
+
+        started = time.perf_counter()
+        now = datetime.now()
+        db = SessionLocal()
+        try:
+            # 1. 超过宽限期的软删除任务
+            deleted_cutoff = now - timedelta(seconds=settings.GC_DELETED_RETENTION_SECONDS)
+            purgeable = db.query(Task).filter(
+                Task.is_deleted == True,
+                func.coalesce(Task.deleted_at, Task.updated_at) < deleted_cutoff
+            ).limit(settings.GC_BATCH_SIZE).all()
+            for task in purgeable:
+                if self._active(task.id):
+                    continue
+                size = self.purge_task(db, task)
+                self._reclaimed("purged_task", size)
+                result["tasks_purged"] += 1
+                result["bytes_reclaimed"] += size
+                if not self._pause():
+                    return result
+
+            # 2. 已结束任务的构建产物 (结束之后才重新运行过的任务会再次回收)
+            done_cutoff = now - timedelta(seconds=settings.GC_PRUNE_AFTER_SECONDS)
+            failed_cutoff = now - timedelta(seconds=settings.GC_PRUNE_FAILED_AFTER_SECONDS)
+            prunable = db.query(Task).filter(
+                Task.is_deleted == False,
+                Task.status.in_(FINISHED_STATUSES),
+                Task.finished_at.isnot(None),
+                or_(Task.pruned_at.is_(None), Task.pruned_at < Task.finished_at),
+                or_(
+                    (Task.status.in_(_FAILED_STATUSES)) & (Task.finished_at < failed_cutoff),
+                    (~Task.status.in_(_FAILED_STATUSES)) & (Task.finished_at < done_cutoff),
+                )
+            ).order_by(Task.finished_at).limit(settings.GC_BATCH_SIZE).all()
+            for task in prunable:
+                if self._active(task.id):
+                    continue
+                size = self.prune_task(task)
+                task.pruned_at = datetime.now()
+                db.commit()
+                self._reclaimed("build_outputs", size)
+                result["tasks_pruned"] += 1
+                result["bytes_reclaimed"] += size
+                if not self._pause():
+                    return result
+
+            # 3. 孤儿代码块
+            result["blobs_purged"], size = self.purge_orphan_blobs(db)
+            result["bytes_reclaimed"] += size
+        except Exception as e:
+            db.rollback()
+            with self._lock:
+                self._stats["last_error"] = str(e)[:500]
+            print(f"❌ Storage GC failed: {e}")
+        finally:
+            db.close()
+            elapsed = time.perf_counter() - started
+            GC_RUN_SECONDS.observe(elapsed)
+            with self._lock:
+                self._stats["runs"] += 1
+                self._stats["tasks_pruned"] += result["tasks_pruned"]
+                self._stats["tasks_purged"] += result["tasks_purged"]
+                self._stats["blobs_purged"] += result["blobs_purged"]
+                self._stats["last_run_at"] = now.isoformat()
+                self._stats["last_run_ms"] = round(elapsed * 1000, 2)
+        return result
+
+    def _run(self):
+        while not self._stop.wait(settings.GC_INTERVAL_SECONDS):
+            result = self.run_once()
+            if result["tasks_pruned"] or result["tasks_purged"] or result["blobs_purged"]:
+                print(f"🧹 Storage GC: {result}")
+
+
+storage_gc = StorageGC()
@@ -1,17 +1,21 @@
 import os
+import time
 import traceback
-import threading
 from datetime import datetime
 from sqlalchemy.orm import Session
 from src.db.session import SessionLocal
-from src.db.models import Task, StreamLog, TaskArtifact
+from src.db.models import Task
 from src.engine.tools.file_manager import FileManager
 from src.engine.graph.workflow import create_graph
+from src.core.config import settings
 # 👇 引入日志工具
-from src.core.logger import log_to_db
-
-MAX_CONCURRENT_TASKS = 3
-task_semaphore = threading.Semaphore(MAX_CONCURRENT_TASKS)
+from src.core.logger import log_to_db, log_sink
+from src.core.tracing import span
+from src.core.log_archive import archive_task_logs, archive_filename
+from src.engine.scheduler import scheduler, user_weight
+from src.engine.dedup import prepare_warm_start
+from src.engine.budget import task_budgets, recursion_limit, BUDGET_EXHAUSTED
+from src.engine.tools.workspace import release_workspace
 
 
 def update_task_phase(task_id: str, phase_name: str):
@@ -30,32 +34,14 @@ def update_task_phase(task_id: str, phase_name: str):
 def archive_logs_to_file(task_id: str):
     db = SessionLocal()
     try:
-        logs = db.query(StreamLog).filter(StreamLog.task_id == task_id).order_by(StreamLog.timestamp).all()
-        if not logs:
-            return
-
-        full_log_content = "\n".join([f"[{log.timestamp}] [{log.level}] {log.content}" for log in logs])
-
         fm = FileManager(db, task_id)
-        log_filename = f"execution_{task_id}.log"
-        log_path = fm.task_dir / log_filename
-
-        with open(log_path, "w", encoding="utf-8") as f:
-            f.write(full_log_content)
-
-        artifact = TaskArtifact(
-            task_id=task_id,
-            artifact_type="log_file",
-            filename=log_filename,
-            file_path=str(log_path.relative_to(fm.settings.BASE_DIR)),
-            phase="archive"
-        )
-        db.add(artifact)
-        db.commit()
-        # 将归档动作也记录到日志
-        log_to_db(task_id, f"✅ Logs archived to {log_filename}")
+        archived = archive_task_logs(db, fm.task_dir, task_id)
+        if archived:
+            # 将归档动作也记录到日志
+            log_to_db(task_id, f"✅ {archived} log lines archived to {archive_filename(task_id)}")
 
     except Exception as e:
+        db.rollback()
         print(f"❌ Log archive failed: {e}")
     finally:
         db.close()
@@ -64,9 +50,17 @@ def archive_logs_to_file(task_id: str):
 def run_agent_task(task_id: str):
     print(f"Task {task_id} is waiting for execution slot...")
 
-    # 这一句在获取锁之前，先别写数据库，防止阻塞
+    # 排队前只读取调度所需的字段 (owner / priority / 角色权重)，不持有会话
+    db = SessionLocal()
+    try:
+        task = db.query(Task).filter(Task.id == task_id).first()
+        owner_id = task.owner_id if task else None
+        priority = (task.priority or 0) if task else 0
+        weight = user_weight(task.owner.role if task and task.owner else None)
+    finally:
+        db.close()
 
-    with task_semaphore:
+    with scheduler.slot(task_id, owner_id, priority, weight):
         print(f"🚀 Task {task_id} acquired slot!")
         # 👇 写入数据库，前端可见
         log_to_db(task_id, "🚀 Task acquired execution slot. Initializing environment...", "INFO")
@@ -79,6 +73,12 @@ def run_agent_task(task_id: str):
             db.close()
             return
 
+        if task.status == "stopped":
+            # 排队期间被用户停止，直接让出槽位
+            log_to_db(task_id, "🛑 Task was stopped while queued.", "WARNING")
+            db.close()
+            return
+
         task.status = "running"
         task.current_phase = "Initializing"
         db.commit()
@@ -108,15 +108,31 @@ def run_agent_task(task_id: str):
             db.close()
             return
 
+        # 相同合约的历史任务：复用其测试矩阵与修复代码热启动
+        current_source = original_code
+        warm_start = False
+        if task.warm_start_from:
+            try:
+                warm_source = prepare_warm_start(db, fm, task.warm_start_from)
+                warm_start = True
+                if warm_source:
+                    current_source = warm_source
+                    fm.save_artifact(task.contract_name, warm_source)
+                log_to_db(task_id, f"♻️ Warm start from task {task.warm_start_from[:8]}: matrix and fixes reused.")
+            except Exception as e:
+                db.rollback()
+                log_to_db(task_id, f"⚠️ Warm start failed, running from scratch: {e}", "WARNING")
+
         initial_state = {
             "task_id": task_id,
             "original_source": original_code,
-            "current_source": original_code,
+            "current_source": current_source,
+            "warm_start": warm_start,
             "current_phase": "static_scan",
             "round_count": 0,
             "consecutive_success": 0,
-            "max_retries": 5,
-            "max_rounds": 5,
+            "max_rounds": task_budgets(task)["rounds"],
+            "run_started_at": time.time(),
             "slither_report": "",
             "fuzz_logs": "",
             "exploit_code": "",
@@ -130,7 +146,8 @@ def run_agent_task(task_id: str):
         try:
             log_to_db(task_id, "🤖 AI Agents workflow started.", "INFO")
 
-            final_state = app.invoke(initial_state)
+            with span("workflow", kind="task", task_id=task_id, warm_start=warm_start):
+                final_state = app.invoke(initial_state, config={"recursion_limit": recursion_limit(initial_state["max_rounds"])})
 
             db.expire_all()
             task = db.query(Task).filter(Task.id == task_id).first()
@@ -146,6 +163,9 @@ def run_agent_task(task_id: str):
                 elif status == "secure" or status == "pass":
                     task.status = "completed"
                     task.result_summary = "All threats mitigated. Contract is secure."
+                elif status == BUDGET_EXHAUSTED:
+                    task.status = BUDGET_EXHAUSTED
+                    task.result_summary = f"Budget exhausted ({final_state.get('budget_reason', '')}). Vulnerabilities persist."
                 elif status == "needs_fix":
                     task.status = "failed"
                     task.result_summary = "Vulnerabilities persist after repair attempts."
@@ -175,8 +195,18 @@ def run_agent_task(task_id: str):
                 task.status = "failed"
                 task.result_summary = error_msg
         finally:
+            # 归档前确保缓冲区里的日志已经全部落库 (队列满时重试直到超时)
+            if not log_sink.drain(settings.LOG_ARCHIVE_FLUSH_TIMEOUT):
+                print(f"⚠️ Log sink did not drain within {settings.LOG_ARCHIVE_FLUSH_TIMEOUT}s; "
+                      f"late lines of task {task_id[:8]} stay in the database until the next archive")
             archive_logs_to_file(task_id)
 
+            # 声明的产物写回 storage，释放 tmpfs 上的工作区
+            try:
+                release_workspace(task_id)
+            except Exception as e:
+                print(f"⚠️ Workspace release failed: {e}")
+
             from sqlalchemy import func
             now = datetime.now()
 
@@ -0,0 +1,182 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.core.config import settings
+from src.core.metrics import registry, SCHEDULER_WAITS, SCHEDULER_WAIT_SECONDS
+from src.db.models import Task
+
+
+def clamp_priority(priority: Optional[int]) -> int:
+    """priority 限制在 [0, TASK_MAX_PRIORITY]"""
+    return max(0, min(int(priority or 0), settings.TASK_MAX_PRIORITY))
+
+
+def user_weight(role: Optional[str]) -> float:
+    """用户的调度权重 (按角色配置，未配置的角色为 1)"""
+    return float(settings.SCHEDULER_ROLE_WEIGHTS.get(role or "user", 1.0)) or 1.0
+
+
+@dataclass
+class QueueEntry:
+    task_id: str
+    owner_id: Optional[int]
+    priority: int
+    seq: int
+    granted: bool = False
+    weight: float = field(default=1.0)
+
+
+class FairScheduler:
+    """
+    按用户加权公平排队 (Weighted Fair Queuing) 的执行槽调度器，替代原来的全局 Semaphore。
+
+    出队顺序:
+      1. 已获得执行份额 (虚拟时间) 最少的用户先执行；每分配一个槽位，虚拟时间增加 1 / 用户权重
+         (权重按角色取 SCHEDULER_ROLE_WEIGHTS)
+      2. 同一用户内部 priority 高的先执行 (只调整自己任务的先后，不能插到其他用户前面)
+      3. 同优先级按提交顺序 (FIFO)
+    同时限制每个用户同时运行的任务数 (per-user quota)。
+    """
+
+    def __init__(self, max_slots: int, per_user_limit: int):
+        self.max_slots = max_slots
+        self.per_user_limit = per_user_limit
+        self._cond = threading.Condition()
+        self._waiting: List[QueueEntry] = []
+        self._running: Dict[str, QueueEntry] = {}
+        self._running_per_user: Dict[Optional[int], int] = {}
+        # 每个用户的虚拟时间：每分配一个槽位增加 1 / weight
+        self._vtime: Dict[Optional[int], float] = {}
+        self._seq = itertools.count()
+
+    # --- 内部工具 ---
+    def _user_vtime(self, owner_id: Optional[int]) -> float:
+        # 新用户 (或长时间空闲的用户) 从当前最小虚拟时间起步，避免“攒额度”后一次性霸占队列
+        active = [self._vtime[e.owner_id] for e in self._waiting + list(self._running.values())
+                  if e.owner_id in self._vtime]
+        floor = min(active) if active else 0.0
+        return max(self._vtime.get(owner_id, floor), floor)
+
+    def _sort_key(self, entry: QueueEntry):
+        return self._vtime.get(entry.owner_id, 0.0), -entry.priority, entry.seq
+
+    def _ordered_waiting(self) -> List[QueueEntry]:
+        return sorted(self._waiting, key=self._sort_key)
+
+    def _eligible(self, entry: QueueEntry) -> bool:
+        if self.per_user_limit <= 0:
+            return True
+        return self._running_per_user.get(entry.owner_id, 0) < self.per_user_limit
+
+    def _dispatch(self):
+        """在持有锁的情况下尽可能多地分配空闲槽位"""
+        while len(self._running) < self.max_slots:
+            candidate = next((e for e in self._ordered_waiting() if self._eligible(e)), None)
+            if candidate is None:
+                break
+            self._waiting.remove(candidate)
+            candidate.granted = True
+            self._running[candidate.task_id] = candidate
+            self._running_per_user[candidate.owner_id] = self._running_per_user.get(candidate.owner_id, 0) + 1
+            self._vtime[candidate.owner_id] = self._vtime.get(candidate.owner_id, 0.0) + 1.0 / candidate.weight
+        self._cond.notify_all()
+
+    # --- 对外接口 ---
+    def acquire(self, task_id: str, owner_id: Optional[int], priority: int = 0, weight: float = 1.0):
+        with self._cond:
+            self._vtime[owner_id] = self._user_vtime(owner_id)
+            entry = QueueEntry(task_id=task_id, owner_id=owner_id, priority=clamp_priority(priority),
+                               seq=next(self._seq), weight=weight or 1.0)
+            self._waiting.append(entry)
+            self._dispatch()
+            if not entry.granted:
+                SCHEDULER_WAITS.inc()
+            started = time.monotonic()
+            while not entry.granted:
+                self._cond.wait()
+        SCHEDULER_WAIT_SECONDS.observe(time.monotonic() - started)
+
+    def release(self, task_id: str):
+        with self._cond:
+            entry = self._running.pop(task_id, None)
+            if entry is not None:
+                remaining = self._running_per_user.get(entry.owner_id, 1) - 1
+                if remaining > 0:
+                    self._running_per_user[entry.owner_id] = remaining
+                else:
+                    self._running_per_user.pop(entry.owner_id, None)
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, task_id: str, owner_id: Optional[int], priority: int = 0, weight: float = 1.0):
+        self.acquire(task_id, owner_id, priority, weight)
+        try:
+            yield
+        finally:
+            self.release(task_id)
+
+    def queue_info(self, task_id: str) -> Optional[Tuple[int, bool]]:
+        """
+        返回: (位置, 是否被用户并发上限阻塞)。位置只计排在前面且可以被调度的任务
+        (所属用户已达 per-user 上限的任务会被 _dispatch 跳过，不占用前面的名额)。
+        被阻塞的任务要等同一用户的任务结束后才会参与调度，位置不代表等待时间。
+        已在运行或不在队列中时返回 None。
+        """
+        with self._cond:
+            ahead = 0
+            for entry in self._ordered_waiting():
+                eligible = self._eligible(entry)
+                if entry.task_id == task_id:
+                    return ahead, not eligible
+                if eligible:
+                    ahead += 1
+        return None
+
+    def queue_position(self, task_id: str) -> Optional[int]:
+        """返回任务在等待队列中的位置 (0 表示下一个被调度)，已在运行或不在队列中时返回 None"""
+        info = self.queue_info(task_id)
+        return info[0] if info else None
+
+    def is_running(self, task_id: str) -> bool:
+        with self._cond:
+            return task_id in self._running
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "max_slots": self.max_slots,
+                "per_user_limit": self.per_user_limit,
+                "running": len(self._running),
+                "waiting": len(self._waiting),
+            }
+
+
+scheduler = FairScheduler(settings.MAX_CONCURRENT_TASKS, settings.MAX_RUNNING_TASKS_PER_USER)
+
+registry.gauge("soliforge_queue_depth", "Tasks waiting for an execution slot",
+               callback=lambda: scheduler.snapshot()["waiting"])
+registry.gauge("soliforge_running_tasks", "Tasks holding an execution slot",
+               callback=lambda: scheduler.snapshot()["running"])
+
+
+def estimate_wait_seconds(db, position: int) -> Optional[int]:
+    """
+    根据最近完成任务的平均耗时 (Task.duration) 估算排队等待时间。
+    position 为等待队列中的位置，没有历史数据时返回 None。
+    """
+    recent = db.query(Task.duration) \
+        .filter(Task.finished_at.isnot(None), Task.duration > 0) \
+        .order_by(Task.finished_at.desc()) \
+        .limit(settings.QUEUE_ETA_SAMPLE_SIZE) \
+        .all()
+    if not recent:
+        return None
+
+    avg_duration = sum(r[0] for r in recent) / len(recent)
+    # 前面还有 position 个任务，每轮可以并行执行 max_slots 个
+    waves = position // scheduler.max_slots + 1
+    return int(avg_duration * waves)
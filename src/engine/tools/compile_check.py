@@ -0,0 +1,174 @@
+"""
+LLM 生成代码的编译预检 (只做语法与类型检查，不生成字节码，也不执行测试)。
+
+后端按优先级:
+  - local: 本机 solc (settings.SOLC_BINARY)，版本满足 pragma 时直接使用
+  - container: 常驻的 soliforge-worker 容器，docker exec 调用 solc-select 安装的对应版本，
+    标准 JSON 从 stdin 输入，省去每次启动容器的开销
+forge-std 从共享基础层解析 (--include-path)，任务工作区里没有 lib/。
+两者都不可用时返回 None，由调用方退回完整的 forge 编译。
+"""
+import atexit
+import json
+import os
+import re
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+from src.core.config import settings
+from src.core.metrics import COMPILE_CHECKS
+from src.core.tracing import span
+from src.engine.tools.workspace import BASE_LAYER, ensure_base_layer, workspace_roots
+
+WORKER_IMAGE = "soliforge-worker"
+_CONTAINER_TASKS_ROOT = "/tasks"
+_CONTAINER_BASE = "/base"
+_REMAPPINGS = ["forge-std/=lib/forge-std/src/"]
+_VERSION_MISMATCH = "requires different compiler version"
+
+_lock = threading.Lock()
+_container: Optional[str] = None
+
+
+def solc_version(source: str) -> str:
+    """取 pragma 中的第一个具体版本号，与 Slither 的选择方式一致"""
+    match = re.search(r'pragma solidity\s+([^;]+);', source)
+    nums = re.findall(r'(\d+\.\d+\.\d+)', match.group(1)) if match else []
+    return nums[0] if nums else "0.8.20"
+
+
+def _standard_json(source_name: str, code: str) -> str:
+    return json.dumps({
+        "language": "Solidity",
+        "sources": {source_name: {"content": code}},
+        "settings": {
+            "remappings": _REMAPPINGS,
+            # 不请求任何输出：只做解析与类型检查
+            "outputSelection": {"*": {"*": []}}
+        }
+    })
+
+
+def _errors(stdout: str) -> Optional[List[str]]:
+    """解析 solc 标准 JSON 输出中的错误；输出无法解析或编译器版本不匹配时返回 None"""
+    try:
+        output = json.loads(stdout)
+    except (ValueError, TypeError):
+        return None
+    errors = [e.get("formattedMessage") or e.get("message", "")
+              for e in output.get("errors", []) if e.get("severity") == "error"]
+    if any(_VERSION_MISMATCH in e for e in errors):
+        return None
+    return errors
+
+
+def _check_local(task_dir: Path, input_json: str) -> Optional[List[str]]:
+    binary = shutil.which(settings.SOLC_BINARY) if settings.SOLC_BINARY else None
+    if not binary:
+        return None
+    base, layer = str(task_dir.absolute()), str(BASE_LAYER.absolute())
+    result = subprocess.run(
+        [binary, "--standard-json", "--base-path", base, "--include-path", layer, "--allow-paths", f"{base},{layer}"],
+        input=input_json, capture_output=True, text=True, encoding="utf-8", errors="replace",
+        timeout=settings.COMPILE_CHECK_TIMEOUT
+    )
+    return _errors(result.stdout)
+
+
+def _stop_container():
+    global _container
+    if _container:
+        subprocess.run(["docker", "rm", "-f", _container], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        _container = None
+
+
+def _ensure_container() -> Optional[str]:
+    """启动 (或复用) 常驻编译容器，工作区根目录挂载到 /tasks，基础层只读挂载到 /base"""
+    global _container
+    with _lock:
+        if _container:
+            alive = subprocess.run(["docker", "inspect", "-f", "{{.State.Running}}", _container],
+                                   capture_output=True, text=True)
+            if alive.stdout.strip() == "true":
+                return _container
+            _container = None
+
+        name = f"soliforge-solc-{os.getpid()}"
+        subprocess.run(["docker", "rm", "-f", name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        # 可写层可能位于独立根目录或 storage/tasks，逐个挂载为 /tasks/0、/tasks/1
+        mounts = []
+        for i, root in enumerate(workspace_roots()):
+            root.mkdir(parents=True, exist_ok=True)
+            mounts += ["-v", f"{root.absolute()}:{_CONTAINER_TASKS_ROOT}/{i}"]
+        started = subprocess.run([
+            "docker", "run", "-d", "--rm", "--name", name, "--entrypoint", "",
+            *mounts,
+            "-v", f"{BASE_LAYER.absolute()}:{_CONTAINER_BASE}:ro",
+            WORKER_IMAGE, "sleep", "infinity"
+        ], capture_output=True, text=True)
+        if started.returncode != 0:
+            print(f"⚠️ Compile-check container failed to start: {started.stderr.strip()}")
+            return None
+        _container = name
+        atexit.register(_stop_container)
+        return _container
+
+
+def _check_container(task_dir: Path, input_json: str, version: str) -> Optional[List[str]]:
+    container = _ensure_container()
+    if not container:
+        return None
+    parent = task_dir.parent.absolute()
+    index = next((i for i, root in enumerate(workspace_roots()) if root.absolute() == parent), None)
+    if index is None:
+        return None
+    base = f"{_CONTAINER_TASKS_ROOT}/{index}/{task_dir.name}"
+    binary = f"/root/.solc-select/artifacts/solc-{version}/solc-{version}"
+    # 并发的检查各自调用对应版本的二进制，不使用会改动全局状态的 solc-select use
+    command = (
+        f"test -x {binary} || solc-select install {version} >/dev/null 2>&1; "
+        f"{binary} --standard-json --base-path {base} --include-path {_CONTAINER_BASE} "
+        f"--allow-paths {base},{_CONTAINER_BASE}"
+    )
+    result = subprocess.run(
+        ["docker", "exec", "-i", container, "/bin/sh", "-c", command],
+        input=input_json, capture_output=True, text=True, encoding="utf-8", errors="replace",
+        timeout=settings.COMPILE_CHECK_TIMEOUT
+    )
+    return _errors(result.stdout)
+
+
+def check_compiles(task_dir: Path, source_name: str, code: str) -> Optional[List[str]]:
+    """
+    检查 code 作为 task_dir 下的 source_name (如 test/X.t.sol) 能否编译，import 从任务目录解析。
+    返回: 错误信息列表 (空列表即通过)；没有可用后端时返回 None。
+    """
+    mode = settings.COMPILE_CHECK_MODE
+    if mode == "off":
+        return None
+
+    ensure_base_layer()
+    input_json = _standard_json(source_name, code)
+    version = solc_version(code)
+    backends = {"local": ("local",), "container": ("container",)}.get(mode, ("local", "container"))
+    for backend in backends:
+        with span("solc.check", kind="executor", tool="solc", backend=backend, source=source_name) as sp:
+            try:
+                if backend == "local":
+                    errors = _check_local(task_dir, input_json)
+                else:
+                    errors = _check_container(task_dir, input_json, version)
+            except (OSError, subprocess.SubprocessError) as e:
+                sp.set("error", str(e)[:300])
+                errors = None
+            sp.set("result", "unavailable" if errors is None else len(errors))
+        if errors is None:
+            continue
+        COMPILE_CHECKS.inc(backend=backend, result="error" if errors else "ok")
+        return errors
+
+    COMPILE_CHECKS.inc(backend="none", result="unavailable")
+    return None
@@ -0,0 +1,158 @@
+import os
+import re
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+from .docker_runner import run_forge, GENERATED_DIR, PREVIOUS_SOURCE
+from .fuzzer import get_contract_name, read_abi, _import_path, _parse_invariant_run
+from .harness import generate_differential_harness, pragma_line
+from src.core.config import settings
+
+DIFF_HARNESS_FILENAME = "DiffHarness.t.sol"
+
+_BLOCK_RE = re.compile(r'\b(function|modifier)\s+(\w+)\s*\(')
+
+
+def _strip_comments(source: str) -> str:
+    code = re.sub(r"/\*.*?\*/", " ", source, flags=re.DOTALL)
+    return re.sub(r"//[^\n]*", " ", code)
+
+
+def _blocks(source: str) -> Dict[str, str]:
+    """按名称取出函数 / 修饰器的完整定义 (签名 + 函数体，空白归一化，重载拼接在一起)"""
+    code = _strip_comments(source)
+    blocks: Dict[str, str] = {}
+    for match in _BLOCK_RE.finditer(code):
+        body_start = code.find("{", match.end())
+        decl_end = code.find(";", match.end())
+        if body_start < 0 or (0 <= decl_end < body_start):
+            # 接口 / 抽象声明，没有函数体
+            continue
+        depth, pos = 0, body_start
+        while pos < len(code):
+            if code[pos] == "{":
+                depth += 1
+            elif code[pos] == "}":
+                depth -= 1
+                if depth == 0:
+                    break
+            pos += 1
+        text = re.sub(r"\s+", " ", code[match.start():pos + 1]).strip()
+        name = match.group(2)
+        blocks[name] = f"{blocks[name]}\n{text}" if name in blocks else text
+    return blocks
+
+
+def patched_functions(previous_source: str, current_source: str) -> Set[str]:
+    """
+    本轮修补涉及的函数：定义发生变化 (含新增 / 删除) 的函数与修饰器，
+    以及直接或间接调用 / 使用了它们的函数。这些路径的行为变化是预期的，不参与差分比较。
+    """
+    prev_blocks, next_blocks = _blocks(previous_source), _blocks(current_source)
+    changed = {name for name in set(prev_blocks) | set(next_blocks)
+               if prev_blocks.get(name) != next_blocks.get(name)}
+
+    grew = True
+    while grew:
+        grew = False
+        for name, text in next_blocks.items():
+            if name in changed:
+                continue
+            if any(re.search(rf"\b{re.escape(c)}\b", text) for c in changed):
+                changed.add(name)
+                grew = True
+    return changed
+
+
+def write_previous_source(task_dir: Path, previous_source: Optional[str]):
+    """
+    构建前同步上一版本 src/DiffPrevious.sol：有上一版本时写入 (内容不变不落盘)，否则删除。
+    与当前合约同在 src/ 下，源码中的相对 import 保持有效。
+    """
+    path = task_dir / PREVIOUS_SOURCE
+    if not previous_source:
+        path.unlink(missing_ok=True)
+        return
+    if path.exists() and path.read_text(encoding="utf-8") == previous_source:
+        return
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(previous_source, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def prepare_differential_harness(task_dir: Path, contract_path: Path, next_abi: list) -> Optional[Path]:
+    """
+    在规范构建之前生成差分 harness (test/generated/DiffHarness.t.sol)。
+    上一版本需已由 write_previous_source 写入并完成首次编译；无法生成时删除旧 harness 并返回 None。
+    """
+    generated_dir = task_dir / GENERATED_DIR
+    generated_dir.mkdir(parents=True, exist_ok=True)
+    harness_path = generated_dir / DIFF_HARNESS_FILENAME
+    previous_path = task_dir / PREVIOUS_SOURCE
+
+    harness = None
+    if previous_path.exists():
+        prev_name = get_contract_name(previous_path)
+        prev_abi, _ = read_abi(task_dir / "out", previous_path, prev_name)
+        with open(contract_path, "r", encoding="utf-8") as f:
+            current_source = f.read()
+        if prev_abi is not None:
+            harness = generate_differential_harness(
+                prev_abi, next_abi, prev_name, get_contract_name(contract_path),
+                _import_path(previous_path, generated_dir), _import_path(contract_path, generated_dir),
+                pragma_line(current_source),
+                patched_functions(previous_path.read_text(encoding="utf-8"), current_source))
+
+    if harness is None:
+        harness_path.unlink(missing_ok=True)
+        return None
+    if not harness_path.exists() or harness_path.read_text(encoding="utf-8") != harness:
+        harness_path.write_text(harness, encoding="utf-8")
+    return harness_path
+
+
+def run_differential_fuzz(task_dir: Path, contract_path: Path, previous_source: str) -> dict:
+    """
+    上一版本与当前版本 (contract_path) 的差分模糊测试，harness 与编译产物来自本轮的规范构建。
+    返回: {"status": equivalent | diverged | skipped | failed, "runs", "calls",
+           "excluded": 修补涉及的函数, "divergence": {"reason", "calls"} | None, "detail"}
+    """
+    with open(contract_path, "r", encoding="utf-8") as f:
+        current_source = f.read()
+
+    excluded = patched_functions(previous_source, current_source)
+    report = {"status": "skipped", "runs": 0, "calls": 0, "excluded": sorted(excluded),
+              "divergence": None, "detail": None}
+
+    if not (task_dir / GENERATED_DIR / DIFF_HARNESS_FILENAME).exists():
+        report["detail"] = "no unpatched entry points shared by both versions"
+        return report
+
+    command = (
+        f"FOUNDRY_INVARIANT_RUNS={settings.DIFF_FUZZ_RUNS} "
+        f"FOUNDRY_INVARIANT_DEPTH={settings.FUZZ_INVARIANT_DEPTH} "
+        f"FOUNDRY_INVARIANT_FAIL_ON_REVERT=false "
+        f"FOUNDRY_INVARIANT_FAILURE_PERSIST_DIR=cache/invariant-diff "
+        f"forge test --json --match-path {GENERATED_DIR}/{DIFF_HARNESS_FILENAME}"
+    )
+    result = run_forge(task_dir, command, differential=True, excluded=len(excluded))
+    outcome = _parse_invariant_run(result.stdout)
+    report.update(runs=outcome["runs"], calls=outcome["calls"])
+
+    if outcome["failure"]:
+        report.update(status="diverged", divergence=outcome["failure"])
+    elif outcome["completed"]:
+        report["status"] = "equivalent"
+    else:
+        report.update(status="failed", detail=((result.stdout or "") + (result.stderr or ""))[-2000:])
+    return report
+
+
+def divergence_summary(report: Optional[dict]) -> str:
+    """供蓝队参考的差分结论 (无分歧时为空串)"""
+    if not report or report.get("status") != "diverged":
+        return ""
+    divergence = report["divergence"]
+    return (f"Behavioral divergence from the previous version: {divergence.get('reason') or 'unknown'} "
+            f"(after {len(divergence.get('calls') or [])} handler calls). "
+            f"Functions patched this round (excluded from comparison): {', '.join(report['excluded']) or 'none'}.")
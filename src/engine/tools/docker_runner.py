@@ -1,32 +1,64 @@
 import subprocess
 from pathlib import Path
-import re
+from typing import Optional, Tuple
 import os
+from src.core.tracing import span
+from src.engine.tools.workspace import base_mounts, ensure_base_layer
+
+# span 里按工具归类容器耗时
+_KNOWN_TOOLS = ("slither", "forge", "solc", "git")
+
+# forge 统一使用同一镜像，编译缓存 (cache/) 与产物 (out/) 才能在各步骤之间复用
+FOUNDRY_IMAGE = "ghcr.io/foundry-rs/foundry:latest"
+
+# === 工程布局 ===
+# 只有 src/ 与 test/ 参与编译；lib/ 与 foundry.toml 来自只读的共享基础层 (见 workspace.py)
+TARGET_SOURCE = "src/Target.sol"  # 当前版本
+PREVIOUS_SOURCE = "src/DiffPrevious.sol"  # 上一版本 (差分测试)
+GENERATED_DIR = "test/generated"  # 每轮构建前根据 ABI 生成的 harness
+# 本轮中途才产生的测试 (语料重放 / 反例最小化) 在 scratch/ 中单独编译，不弄脏共享的 out/
+SCRATCH_DIR = "scratch"
+SCRATCH_ENV = "FOUNDRY_TEST=scratch FOUNDRY_OUT=out-scratch FOUNDRY_CACHE_PATH=cache-scratch"
+# 并行阶段产生、需进入回归矩阵的测试先放在 pending/，由 weaponize 移入 test/
+PENDING_DIR = "pending"
+
+
+def tool_name(command: str) -> str:
+    for tool in _KNOWN_TOOLS:
+        if tool in command:
+            return tool
+    return command.split()[0] if command.split() else "unknown"
+
+
+def run_forge(work_dir: Path, command: str, container_name: Optional[str] = None,
+              **attributes) -> subprocess.CompletedProcess:
+    """在 Foundry 镜像中执行 forge 命令 (工作目录挂载为 /app，基础层只读挂载)"""
+    cmd = ["docker", "run", "--rm", "--entrypoint", ""]
+    if container_name:
+        # 具名容器，便于并行 fuzz 时提前终止
+        cmd += ["--name", container_name]
+    cmd += [
+        "-v", f"{work_dir.absolute()}:/app", *base_mounts(), "-w", "/app",
+        FOUNDRY_IMAGE,
+        "/bin/sh", "-c",
+        command
+    ]
+    with span("docker.forge", kind="executor", tool="forge", command=command[:300], **attributes) as sp:
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace")
+        sp.set("exit_code", result.returncode)
+    return result
 
 
-def create_foundry_config(work_dir: Path):
+def canonical_build(work_dir: Path) -> Tuple[bool, str]:
     """
-    自动创建 foundry.toml 配置文件。
-    这是为了确保 forge test 能在我们的临时目录结构中正确找到 .sol 和 .t.sol 文件。
+    本轮的规范构建：编译 src/ 与 test/ 到 out/ (含 build-info)。
+    之后的 Slither / Fuzzer / 差分 / gas / 回归验证只读取这份产物，不再编译。
+    返回: (是否成功, 编译输出)
     """
-    config_path = work_dir / "foundry.toml"
-
-    # 只有当配置文件不存在时才创建
-    if not config_path.exists():
-        # 配置说明：
-        # src = '.' 和 test = '.' 表示直接在当前根目录及其子目录查找源文件和测试文件
-        # 这样无论我们把文件放在 root 还是 artifacts 目录，forge 都能递归扫描到
-        config_content = """[profile.default]
-src = '.'
-test = '.'
-out = 'out'
-libs = ['lib']
-"""
-        try:
-            with open(config_path, "w", encoding="utf-8") as f:
-                f.write(config_content)
-        except Exception as e:
-            print(f"⚠️ Warning: Failed to create foundry.toml: {e}")
+    ensure_base_layer()
+    result = run_forge(work_dir, "forge build", build="canonical")
+    output = (result.stdout or "") + (result.stderr or "")
+    return result.returncode == 0, output
 
 
 def run_docker_command(work_dir: Path, command: str):
@@ -40,6 +72,7 @@ def run_docker_command(work_dir: Path, command: str):
         "docker", "run", "--rm",
         "--entrypoint", "",
         "-v", f"{abs_work_dir}:/app",
+        *base_mounts(),
         "-w", "/app",
         "soliforge-worker",
         "/bin/sh", "-c",
@@ -48,58 +81,18 @@ def run_docker_command(work_dir: Path, command: str):
 
     print(f"DEBUG: Docker Exec: {command}")
 
-    try:
-        result = subprocess.run(
-            docker_cmd,
-            capture_output=True,
-            text=True,
-            encoding='utf-8',
-            errors='replace'  # 防止特殊字符报错
-        )
-        return result.stdout, result.stderr
-    except Exception as e:
-        return "", str(e)
-
-
-def run_forge_test_json(work_dir: Path):
-    """
-    运行测试并解析每个 Test Case 的结果
-    返回:
-      results: { "testExploit_XXX": "PASS" | "FAIL" }
-      raw_output: str
-    """
-    # 1. 确保有配置文件
-    create_foundry_config(work_dir)
-
-    # 2. 运行 foundry 测试，开启详细模式 -vv
-    # --json 参数在某些版本的 forge 中行为不一致，这里我们主要解析标准输出
-    cmd = "forge test -vv"
-    stdout, stderr = run_docker_command(work_dir, cmd)
-
-    results = {}
-    full_output = (stdout or "") + "\n" + (stderr or "")
-
-    # 解析 Foundry 输出
-    # 典型输出格式:
-    # [PASS] testExploit_Reentrancy_01() (gas: 1234)
-    # [FAIL. Reason: Assertion failed] testExploit_Overflow_02() (gas: 5678)
-
-    # 正则匹配
-    matches = re.findall(r'\[(PASS|FAIL).*?\]\s+(testExploit_\w+)\(\)', full_output)
-
-    for status, name in matches:
-        # status 捕获到的可能是 "PASS" 或 "FAIL"
-        results[name] = status
-
-    return results, full_output
-
-
-def check_compilation(work_dir: Path):
-    """简单检查编译是否通过"""
-    create_foundry_config(work_dir)
-    stdout, stderr = run_docker_command(work_dir, "forge build")
-
-    # 简单的成功判定
-    if "Compiler run successful" in stdout or "No files changed" in stdout:
-        return True
-    return False
+    with span(f"docker.{tool_name(command)}", kind="executor", tool=tool_name(command), command=command[:300]) as sp:
+        try:
+            result = subprocess.run(
+                docker_cmd,
+                capture_output=True,
+                text=True,
+                encoding='utf-8',
+                errors='replace'  # 防止特殊字符报错
+            )
+            sp.set("exit_code", result.returncode)
+            return result.stdout, result.stderr
+        except Exception as e:
+            sp.status = "error"
+            sp.set("error", str(e))
+            return "", str(e)
@@ -3,6 +3,7 @@ from pathlib import Path
 from fastapi import UploadFile
 from src.core.config import settings
 from src.db.models import Task  # 👈 引入 Task 模型
+from src.engine.tools.workspace import open_workspace
 
 
 class FileManager:
@@ -33,6 +34,14 @@ class FileManager:
         """
         return self.db.query(Task).filter(Task.id == self.task_id).first()
 
+    @property
+    def work_dir(self) -> Path:
+        """
+        容器挂载的工作区 (tmpfs 上的可写层)，编译产物与中间文件只写在这里。
+        task_dir 只保存上传文件与声明的产物，见 workspace.py
+        """
+        return open_workspace(self.task_id)
+
     def save_original_file(self, file: UploadFile) -> Path:
         """
         保存前端上传的原始合约文件
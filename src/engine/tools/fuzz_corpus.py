@@ -0,0 +1,76 @@
+import hashlib
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+from src.core.config import settings
+
+_lock = threading.Lock()
+
+
+class FuzzCorpus:
+    """
+    任务级模糊测试语料，跨轮次保留在 fuzz_corpus/ 下:
+      - failures/: Foundry 的 failure_persist_dir，下次运行先重放持久化的失败序列
+      - corpus/: Foundry 的 corpus_dir，保存覆盖到新路径的输入 (支持的版本)
+      - counterexamples.jsonl: 每个反例的完整调用序列，按 ABI 哈希归组，供新一轮先行重放
+    """
+
+    def __init__(self, task_dir: Path):
+        self.root = task_dir / "fuzz_corpus"
+        self.failures_dir = self.root / "failures"
+        self.corpus_dir = self.root / "corpus"
+        self.counterexamples_path = self.root / "counterexamples.jsonl"
+        self.failures_dir.mkdir(parents=True, exist_ok=True)
+        self.corpus_dir.mkdir(parents=True, exist_ok=True)
+
+    def foundry_env(self) -> str:
+        """invariant 运行的环境变量 (容器内工作目录为任务根目录)"""
+        env = {
+            "FOUNDRY_INVARIANT_FAILURE_PERSIST_DIR": "fuzz_corpus/failures",
+            "FOUNDRY_INVARIANT_CORPUS_DIR": "fuzz_corpus/corpus",
+            "FOUNDRY_INVARIANT_DICTIONARY_WEIGHT": settings.FUZZ_DICTIONARY_WEIGHT,
+            "FOUNDRY_INVARIANT_INCLUDE_STORAGE": str(settings.FUZZ_INCLUDE_STORAGE).lower(),
+            "FOUNDRY_INVARIANT_INCLUDE_PUSH_BYTES": str(settings.FUZZ_INCLUDE_PUSH_BYTES).lower(),
+        }
+        return " ".join(f"{k}={v}" for k, v in env.items())
+
+    def record(self, digest: str, iteration: int, calls: List[str], reason: Optional[str],
+               test_file: Optional[str] = None, bucket: Optional[str] = None) -> bool:
+        """保存一个反例的完整调用序列，相同序列只记一次。返回是否为新反例"""
+        key = hashlib.sha256("\n".join(calls).encode("utf-8")).hexdigest()
+        with _lock:
+            if any(e["key"] == key for e in self._entries()):
+                return False
+            entry = {
+                "key": key,
+                "abi_hash": digest,
+                "round": iteration,
+                "calls": calls,
+                "reason": reason,
+                "test_file": test_file,
+                "bucket": bucket,
+                "time": datetime.now().isoformat()
+            }
+            with open(self.counterexamples_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        return True
+
+    def sequences(self, digest: str) -> List[dict]:
+        """当前 ABI 下可直接重放的反例 (Handler 入口随 ABI 变化，其他 ABI 的序列无法重放)"""
+        return [e for e in self._entries() if e.get("abi_hash") == digest]
+
+    def size(self) -> int:
+        return len(self._entries())
+
+    def _entries(self) -> List[dict]:
+        if not self.counterexamples_path.exists():
+            return []
+        entries = []
+        with open(self.counterexamples_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entries.append(json.loads(line))
+        return entries
@@ -1,40 +1,26 @@
 import os
+import math
+import random
 import subprocess
-import shutil
 import re
 import json
+import hashlib
+import time
+import uuid
+from concurrent.futures import as_completed
 from pathlib import Path
-from .docker_runner import create_foundry_config
-
-
-def ensure_forge_std(task_dir: Path):
-    """强力安装 forge-std"""
-    lib_dir = task_dir / "lib"
-    forge_std_dir = lib_dir / "forge-std"
-    test_sol_path = forge_std_dir / "src" / "Test.sol"
-
-    if test_sol_path.exists(): return
-    if forge_std_dir.exists():
-        try:
-            shutil.rmtree(forge_std_dir)
-        except:
-            pass
-
-    cmd = [
-        "docker", "run", "--rm", "--entrypoint", "",
-        "-v", f"{task_dir.absolute()}:/app", "-w", "/app",
-        "ghcr.io/foundry-rs/foundry:latest",
-        "/bin/sh", "-c",
-        "mkdir -p lib && git clone --depth 1 https://github.com/foundry-rs/forge-std lib/forge-std"
-    ]
-    try:
-        subprocess.run(cmd, check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-    except:
-        pass
-
-    remapping_path = task_dir / "remappings.txt"
-    with open(remapping_path, "w", encoding="utf-8") as f:
-        f.write("forge-std/=lib/forge-std/src/")
+from typing import List, Optional, Set
+from langchain_core.runnables.config import ContextThreadPoolExecutor
+from .docker_runner import (
+    run_forge, GENERATED_DIR, SCRATCH_DIR, SCRATCH_ENV, PENDING_DIR
+)
+from .fuzz_corpus import FuzzCorpus
+from .harness import (
+    abi_hash, pragma_line, generate_invariant_harness, counterexample_calls,
+    create_sequence_reproduction, create_corpus_replay
+)
+from src.core.config import settings
+from src.core.metrics import cache_lookup
 
 
 def get_contract_name(contract_path: Path) -> str:
@@ -47,164 +33,458 @@ def get_contract_name(contract_path: Path) -> str:
     return "Target"
 
 
-# Template 1: 随机 Fuzz 模板 (用于探索)
-def create_fuzz_template(contract_name: str, import_path: str, iteration: int) -> str:
-    return f"""
-pragma solidity ^0.8.20;
-import "forge-std/Test.sol";
-import "{import_path}";
+HARNESS_FILENAME = "FuzzHarness.t.sol"
+REPLAY_FILENAME = "FuzzReplay.t.sol"
+SHRINK_FILENAME = "FuzzShrink.t.sol"
+HARNESS_CACHE_DIR = settings.BASE_DIR / "storage" / "harness_cache"
+
+
+def read_abi(out_dir: Path, contract_path: Path, contract_name: str):
+    """从 forge 产物 <out>/<文件>/<合约>.json 中读取 ABI。返回: (abi | None, 错误信息)"""
+    artifact_path = out_dir / contract_path.name / f"{contract_name}.json"
+    if not artifact_path.exists():
+        return None, f"artifact not found: {artifact_path.name}"
+    try:
+        with open(artifact_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("abi", []), ""
+    except Exception as e:
+        return None, f"ABI parse error: {e}"
+
+
+def get_invariant_harness(abi: list, contract_name: str, import_path: str, pragma: str) -> Optional[str]:
+    """按 ABI 哈希缓存生成的 harness，ABI 不变的修复轮次直接复用"""
+    cache_path = HARNESS_CACHE_DIR / f"{abi_hash(abi, contract_name, import_path, pragma)}.t.sol"
+    if cache_path.exists():
+        cache_lookup("fuzz_harness", True)
+        return cache_path.read_text(encoding="utf-8")
+    cache_lookup("fuzz_harness", False)
+
+    code = generate_invariant_harness(abi, contract_name, import_path, pragma)
+    if code is None:
+        return None
+
+    HARNESS_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(code, encoding="utf-8")
+    os.replace(tmp_path, cache_path)
+    return code
+
 
-contract FuzzTest{iteration} is Test {{
-    {contract_name} public target;
-    function setUp() public {{ target = new {contract_name}(); }}
+def _import_path(contract_path: Path, from_dir: Path) -> str:
+    try:
+        rel_path = os.path.relpath(contract_path, from_dir)
+    except:
+        rel_path = f"../{contract_path.name}"
+    # 注意不能用 lstrip("./")，它会把 "../" 一并剥掉
+    import_path = rel_path.replace("\\", "/")
+    if not import_path.startswith("../") and not import_path.startswith("./"):
+        import_path = "./" + import_path
+    return import_path
 
-    function testFuzz_Exploration(uint256 amount) public {{
-        // 限制范围，避免无意义的溢出测试干扰逻辑测试
-        amount = bound(amount, 1, 100 ether);
 
-        vm.deal(address(this), amount);
-        try target.deposit{{value: amount}}() {{
-            // 如果存款成功，尝试取款
-            try target.withdraw() {{
-                // Check Invariant: Contract balance should be 0 after full withdrawal
-                // 如果 withdraw 有逻辑漏洞（比如没扣余额），这里虽然跑通了，但状态可能不对
-                // 但对于 Reentrancy，普通 Fuzz 很难直接 panic，除非我们检查不变量
-            }} catch {{}}
-        }} catch {{}}
-    }}
-}}
-"""
+def _forge_results(stdout: str) -> dict:
+    """展平 forge --json 输出: {测试名: 结果}"""
+    if not stdout or "{" not in stdout:
+        return {}
+    data = json.loads(stdout[stdout.find('{'):stdout.rfind('}') + 1])
+    results = {}
+    for contract_key, contract_val in data.items():
+        results.update(contract_val.get("test_results", {}))
+    return results
 
 
-# Template 2: 固化复现模板 (用于生成“不安全的证据”)
-def create_reproduction_test(contract_name: str, import_path: str, iteration: int, args: list) -> str:
+def _replay_sequences(task_dir: Path, filename: str, source: str, **attributes) -> dict:
     """
-    将 Fuzzer 发现的参数 'args' 硬编码生成一个具体的 Solidity 测试文件。
+    执行一个重放测试文件，返回依然打破不变量的序列: {序号: 失败原因}
+    重放文件在本轮中途生成，放在 scratch/ 中单独编译，不影响并行分支共用的 out/
     """
-    # 构造参数字符串，例如: uint256 amount = 123456;
-    # 简单起见，我们假设只有一个 uint 参数，实际需根据 JSON 类型解析
-    # 这里做个简单适配：取第一个参数作为 amount
-    fixed_val = args[0] if args else "1 ether"
+    scratch_dir = task_dir / SCRATCH_DIR
+    scratch_dir.mkdir(exist_ok=True)
+    with open(scratch_dir / filename, "w", encoding="utf-8") as f:
+        f.write(source)
 
-    return f"""
-pragma solidity ^0.8.20;
-import "forge-std/Test.sol";
-import "{import_path}";
+    result = run_forge(task_dir, f"{SCRATCH_ENV} forge test --json --match-path {SCRATCH_DIR}/{filename}", **attributes)
+    failing = {}
+    for test_name, test_data in _forge_results(result.stdout).items():
+        if test_name.startswith("test_replay_") and test_data.get("status") != "Success":
+            failing[int(test_name.split("(")[0].rsplit("_", 1)[1])] = test_data.get("reason")
+    return failing
 
-// 🔴 这是由 Fuzzer 自动生成的攻击复现代码
-// 参数已固化，用于确凿地证明漏洞存在
-contract Reproduce_Fuzz_Crash_{iteration} is Test {{
-    {contract_name} public target;
 
-    function setUp() public {{ 
-        target = new {contract_name}(); 
-    }}
+def replay_corpus(task_dir: Path, corpus: FuzzCorpus, digest: str, abi: list,
+                  contract_name: str, import_path: str, pragma: str) -> List[dict]:
+    """
+    先行重放当前 ABI 下的全部历史反例 (确定性执行，代价远低于新的探索)。
+    返回在当前版本上依然打破不变量的反例。
+    """
+    known = corpus.sequences(digest)
+    if not known:
+        return []
 
-    function testExploit_Fuzz_Reproduction() public {{
-        uint256 amount = {fixed_val};
+    source = create_corpus_replay(abi, contract_name, import_path, pragma, [e["calls"] for e in known])
+    failing = _replay_sequences(task_dir, REPLAY_FILENAME, source, corpus_replay=len(known))
+    return [known[idx] for idx in sorted(failing)]
 
-        vm.deal(address(this), amount);
 
-        console.log("Replaying Fuzz Crash with amount:", amount);
+def normalize_reason(reason: Optional[str]) -> str:
+    """去掉失败原因中的具体数值与地址，便于把同一类失败归为一组"""
+    return re.sub(r"0x[0-9a-fA-F]+|\d+", "N", reason or "").strip().lower()
 
-        // 我们期望这里会发生 Revert 或者 违反断言
-        target.deposit{{value: amount}}();
-        target.withdraw();
-    }}
-}}
-"""
 
+def crash_bucket(reason: Optional[str], calls: List[str]) -> str:
+    """反例分桶：归一化的失败原因 + 最后一次调用的 Handler 入口 (selector)"""
+    last_selector = calls[-1][:10].lower() if calls else ""
+    key = f"{normalize_reason(reason)}|{last_selector}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:16]
 
-def run_fuzz_test(task_dir: Path, contract_path: Path, iteration: int):
+
+def _same_failure(original: Optional[str], candidate: Optional[str]) -> bool:
+    if not original or not candidate:
+        return True
+    a, b = normalize_reason(original), normalize_reason(candidate)
+    return a in b or b in a
+
+
+def shrink_sequence(task_dir: Path, abi: list, contract_name: str, import_path: str, pragma: str,
+                    calls: List[str], reason: Optional[str]) -> List[str]:
     """
-    运行 Fuzzer -> 解析结果 -> 如果失败，生成固化代码 -> 返回固化代码路径
+    反例最小化 (delta debugging)：每批生成"删掉一段调用"的全部候选序列，
+    在一次 forge 调用中并行重放，保留以同一原因失败的最短候选；
+    没有候选可用时把删除粒度减半，直到粒度为 1 或批次用尽。
     """
-    ensure_forge_std(task_dir)
-    create_foundry_config(task_dir)
+    current = list(calls)
+    chunk = max(1, len(current) // 2)
+    for step in range(settings.FUZZ_SHRINK_MAX_ROUNDS):
+        if len(current) <= 1:
+            break
+        candidates = [current[:i] + current[i + chunk:] for i in range(0, len(current), chunk)]
+        candidates = [c for c in candidates if c]
+        if not candidates:
+            break
+
+        source = create_corpus_replay(abi, contract_name, import_path, pragma, candidates,
+                                      suffix="_Shrink", test_contract="FuzzShrinkReplay")
+        failing = _replay_sequences(task_dir, SHRINK_FILENAME, source,
+                                    shrink_step=step, candidates=len(candidates), sequence_length=len(current))
+        reproducing = [candidates[idx] for idx, r in failing.items() if _same_failure(reason, r)]
+        if reproducing:
+            current = min(reproducing, key=len)
+            chunk = max(1, min(chunk, len(current) // 2))
+        elif chunk > 1:
+            chunk //= 2
+        else:
+            break
+    return current
+
 
-    artifacts_dir = task_dir / "artifacts"
-    artifacts_dir.mkdir(parents=True, exist_ok=True)
+def _kill_containers(names: List[str]):
+    subprocess.run(["docker", "kill", *names], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
 
+
+def _parse_invariant_run(stdout: str) -> dict:
+    """单个 worker 的结果: 序列数 / 调用数 / 反例"""
+    outcome = {"runs": 0, "calls": 0, "failure": None, "completed": False}
     try:
-        rel_path = os.path.relpath(contract_path, artifacts_dir)
-    except:
-        rel_path = f"../{contract_path.name}"
-    import_path = rel_path.replace("\\", "/").lstrip("./")
-    if not import_path.startswith("../"): import_path = "./" + import_path
+        results = _forge_results(stdout)
+    except Exception as e:
+        print(f"JSON Parse Error: {e}")
+        return outcome
+
+    outcome["completed"] = bool(results)
+    for test_name, test_data in results.items():
+        kind = test_data.get("kind", {})
+        if "Invariant" in kind:
+            outcome["runs"] += kind["Invariant"].get("runs", 0)
+            outcome["calls"] += kind["Invariant"].get("calls", 0)
+
+        if test_data.get("status") != "Success" and outcome["failure"] is None:
+            # 提取反例的完整调用序列 (Handler 的 calldata，逐字节保留全部参数)
+            outcome["failure"] = {
+                "reason": test_data.get("reason"),
+                "calls": counterexample_calls(test_data.get("counterexample"))
+            }
+    return outcome
+
+
+def run_fuzz_campaign(task_dir: Path, corpus: FuzzCorpus, runs: int, depth: int, workers: int) -> dict:
+    """
+    以 workers 个并行 forge 进程执行 invariant 测试：各自使用不同的 --fuzz-seed，平分 runs 预算。
+    任一 worker 找到反例即终止其余 worker。
+    返回合并后的统计: {"runs", "calls", "workers": [...], "completed", "failure", "stopped_early"}
+    """
+    workers = max(1, workers)
+    runs_per_worker = max(1, math.ceil(runs / workers))
+    base_seed = random.getrandbits(32)
+    campaign_id = uuid.uuid4().hex[:8]
+    names = [f"soliforge-fuzz-{campaign_id}-{i}" for i in range(workers)]
+
+    def work(idx: int) -> dict:
+        seed = base_seed + idx
+        command = (
+            f"{corpus.foundry_env()} "
+            f"FOUNDRY_INVARIANT_RUNS={runs_per_worker} FOUNDRY_INVARIANT_DEPTH={depth} "
+            "FOUNDRY_INVARIANT_FAIL_ON_REVERT=false "
+            f"forge test --json --fuzz-seed {seed} --match-path {GENERATED_DIR}/{HARNESS_FILENAME}"
+        )
+        result = run_forge(task_dir, command, container_name=names[idx],
+                              worker=idx, seed=seed, invariant_runs=runs_per_worker, invariant_depth=depth)
+        outcome = _parse_invariant_run(result.stdout)
+        outcome.update(worker=idx, seed=seed)
+        return outcome
+
+    merged = {"runs": 0, "calls": 0, "workers": [], "completed": 0, "failure": None, "stopped_early": False}
+    with ContextThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(work, idx) for idx in range(workers)]
+        for future in as_completed(futures):
+            outcome = future.result()
+            merged["runs"] += outcome["runs"]
+            merged["calls"] += outcome["calls"]
+            merged["completed"] += 1 if outcome["completed"] else 0
+            merged["workers"].append({
+                "worker": outcome["worker"],
+                "seed": outcome["seed"],
+                "runs": outcome["runs"],
+                "calls": outcome["calls"],
+                "failed": outcome["failure"] is not None
+            })
+
+            if outcome["failure"] and merged["failure"] is None:
+                merged["failure"] = outcome["failure"]
+                pending = [names[i] for i, f in enumerate(futures) if not f.done()]
+                if pending:
+                    merged["stopped_early"] = True
+                    _kill_containers(pending)
+
+    merged["workers"].sort(key=lambda w: w["worker"])
+    return merged
+
+
+def parse_lcov(path: Path, source_name: str) -> Set[tuple]:
+    """从 lcov 报告中取出目标合约已覆盖的行与分支"""
+    covered = set()
+    if not path.exists():
+        return covered
+
+    in_target = False
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("SF:"):
+                path = line[3:]
+                in_target = os.path.basename(path) == source_name and not path.startswith(("lib/", "test/", SCRATCH_DIR, PENDING_DIR))
+            elif not in_target:
+                continue
+            elif line.startswith("DA:"):
+                number, hits = line[3:].split(",")[:2]
+                if hits.isdigit() and int(hits) > 0:
+                    covered.add(("line", int(number)))
+            elif line.startswith("BRDA:"):
+                number, block, branch, taken = line[5:].split(",")[:4]
+                if taken.isdigit() and int(taken) > 0:
+                    covered.add(("branch", int(number), block, branch))
+    return covered
+
+
+def sample_coverage(task_dir: Path, corpus: FuzzCorpus, contract_path: Path, seed: int, runs: int, depth: int) -> Optional[Set[tuple]]:
+    """
+    以某个 worker 的 seed 与 runs 重跑一次插桩的 invariant 测试 (forge coverage)，
+    得到该 worker 本次探索覆盖的行与分支。失败时返回 None。
+    """
+    report_file = corpus.root / "lcov.info"
+    if report_file.exists():
+        report_file.unlink()
+    # 插桩构建与普通构建不同，使用独立的产物目录，不覆盖共享的 out/
+    command = (
+        f"{corpus.foundry_env()} "
+        f"FOUNDRY_INVARIANT_RUNS={runs} FOUNDRY_INVARIANT_DEPTH={depth} FOUNDRY_INVARIANT_FAIL_ON_REVERT=false "
+        f"FOUNDRY_OUT=out-coverage FOUNDRY_CACHE_PATH=cache-coverage "
+        f"forge coverage --report lcov --report-file fuzz_corpus/lcov.info "
+        f"--fuzz-seed {seed} --match-path {GENERATED_DIR}/{HARNESS_FILENAME}"
+    )
+    run_forge(task_dir, command, seed=seed, invariant_runs=runs)
+    if not report_file.exists():
+        return None
+    return parse_lcov(report_file, contract_path.name)
+
+
+def run_adaptive_fuzzing(task_dir: Path, corpus: FuzzCorpus, contract_path: Path) -> dict:
+    """
+    按增量执行并行 fuzz campaign，每个增量后采样覆盖率：
+    覆盖率连续 FUZZ_PLATEAU_INCREMENTS 个增量没有增长、时间用尽、达到 runs 上限或找到反例时停止。
+    返回: 与 run_fuzz_campaign 相同的合并统计，外加 coverage_curve / stop_reason
+    """
+    depth = settings.FUZZ_INVARIANT_DEPTH
+    workers = max(1, settings.FUZZ_WORKERS)
+    increment = max(settings.FUZZ_INCREMENT_RUNS, workers)
+    started = time.monotonic()
+
+    merged = {"runs": 0, "calls": 0, "workers": [], "completed": 0, "failure": None,
+              "stopped_early": False, "coverage_curve": [], "stop_reason": "max_runs"}
+    covered = set()
+    plateau = 0
+
+    while merged["runs"] < settings.FUZZ_INVARIANT_RUNS:
+        runs = min(increment, settings.FUZZ_INVARIANT_RUNS - merged["runs"])
+        campaign = run_fuzz_campaign(task_dir, corpus, runs, depth, workers)
+        merged["runs"] += campaign["runs"]
+        merged["calls"] += campaign["calls"]
+        merged["completed"] += campaign["completed"]
+        merged["workers"].extend(dict(w, increment=len(merged["coverage_curve"])) for w in campaign["workers"])
+
+        if campaign["failure"]:
+            merged["failure"] = campaign["failure"]
+            merged["stopped_early"] = campaign["stopped_early"]
+            merged["stop_reason"] = "counterexample"
+            break
+        if campaign["completed"] == 0:
+            merged["stop_reason"] = "no_result"
+            break
+
+        # 以第一个 worker 的 seed 采样本增量的覆盖率 (确定性重放，代价约为增量的 1/workers)
+        first = campaign["workers"][0]
+        sample = sample_coverage(task_dir, corpus, contract_path, first["seed"], max(1, first["runs"]), depth)
+        new_items = len(sample - covered) if sample is not None else None
+        if sample is not None:
+            covered |= sample
+        elapsed = round(time.monotonic() - started, 3)
+        merged["coverage_curve"].append({
+            "runs": merged["runs"],
+            "covered": len(covered) if sample is not None else None,
+            "new": new_items,
+            "elapsed": elapsed
+        })
+
+        if new_items == 0:
+            plateau += 1
+            if plateau >= settings.FUZZ_PLATEAU_INCREMENTS:
+                merged["stop_reason"] = "plateau"
+                break
+        else:
+            plateau = 0
 
-    contract_name = get_contract_name(contract_path)
+        if elapsed >= settings.FUZZ_TIME_BUDGET_SECONDS:
+            merged["stop_reason"] = "time_budget"
+            break
 
-    # 1. 生成并运行随机 Fuzz 测试
-    fuzz_filename = f"FuzzTest_Round{iteration}.t.sol"
-    fuzz_path = artifacts_dir / fuzz_filename
-    with open(fuzz_path, "w", encoding="utf-8") as f:
-        f.write(create_fuzz_template(contract_name, import_path, iteration))
+    return merged
 
-    fuzz_runs = 1000  # 提高到 1000 轮
-    container_test_path = f"/app/artifacts/{fuzz_filename}"
 
-    cmd = [
-        "docker", "run", "--rm", "--entrypoint", "",
-        "-v", f"{task_dir.absolute()}:/app", "-w", "/app",
-        "ghcr.io/foundry-rs/foundry:latest",
-        "/bin/sh", "-c",
-        f"forge test --json --fuzz-runs {fuzz_runs} --match-path {container_test_path}"
-    ]
+def prepare_fuzz_harness(task_dir: Path, contract_path: Path, abi: list) -> Optional[Path]:
+    """
+    在本轮的规范构建之前写入 (或复用缓存的) 不变量 harness: test/generated/FuzzHarness.t.sol。
+    没有可模糊测试的入口时删除旧 harness 并返回 None。
+    """
+    generated_dir = task_dir / GENERATED_DIR
+    generated_dir.mkdir(parents=True, exist_ok=True)
+    harness_path = generated_dir / HARNESS_FILENAME
 
-    stats = {"runs": fuzz_runs, "failures": 0}
+    contract_name = get_contract_name(contract_path)
+    with open(contract_path, "r", encoding="utf-8") as f:
+        pragma = pragma_line(f.read())
+    harness = get_invariant_harness(abi, contract_name, _import_path(contract_path, generated_dir), pragma)
+    if harness is None:
+        harness_path.unlink(missing_ok=True)
+        return None
+    # 内容不变时不落盘，forge 缓存保持有效
+    if not harness_path.exists() or harness_path.read_text(encoding="utf-8") != harness:
+        harness_path.write_text(harness, encoding="utf-8")
+    return harness_path
 
-    try:
-        result = subprocess.run(cmd, capture_output=True, text=True, encoding="utf-8", errors="replace")
-
-        if result.stdout and "{" in result.stdout:
-            try:
-                json_str = result.stdout[result.stdout.find('{'):result.stdout.rfind('}') + 1]
-                data = json.loads(json_str)
-
-                counterexample_args = []
-                found_failure = False
-
-                for contract_key, contract_val in data.items():
-                    test_results = contract_val.get("test_results", {})
-                    for test_name, test_data in test_results.items():
-                        kind = test_data.get("kind", {})
-                        if "Fuzz" in kind:
-                            stats["runs"] = kind["Fuzz"].get("runs", fuzz_runs)
-
-                        if test_data.get("status") != "Success":
-                            stats["failures"] = 1
-                            found_failure = True
-                            # 提取反例参数
-                            # counterexample 格式通常是: [ "0x...", "123" ]
-                            cex = test_data.get("counterexample")
-                            if cex and isinstance(cex, list):  # 新版 Foundry
-                                # 处理一下参数，把 16进制转十进制字符串，或者直接用
-                                counterexample_args = cex
-                            elif test_data.get("reason"):  # 有时候直接给 reason
-                                pass
-
-                # 🌟 关键逻辑：如果发现失败，生成“复现脚本”
-                if found_failure:
-                    print(f"DEBUG: Fuzzer found failure! Args: {counterexample_args}")
-
-                    # 生成固化的 .t.sol
-                    repro_code = create_reproduction_test(contract_name, import_path, iteration, counterexample_args)
-                    repro_filename = f"Exploit_Fuzzer_Repro_{iteration}.t.sol"  # 命名统一为 Exploit_
-                    repro_path = artifacts_dir / repro_filename
-
-                    with open(repro_path, "w", encoding="utf-8") as f:
-                        f.write(repro_code)
-
-                    # 返回新生成的固化文件路径，而不是随机 Fuzz 文件路径
-                    return "success", stats, repro_path
-
-            except Exception as e:
-                print(f"JSON Parse Error: {e}")
-
-            # 如果全是 Success，还是返回 Fuzz 文件
-            return "success", stats, fuzz_path
-        else:
-            return "failed", stats, fuzz_path
 
+def run_fuzz_test(task_dir: Path, contract_path: Path, iteration: int):
+    """
+    读取本轮构建的 ABI 与 harness -> 重放历史反例 -> invariant 模式模糊测试
+    -> 如果失败，固化调用序列并存入语料 -> 返回固化代码路径 (pending/，由 weaponize 移入 test/)
+    编译已由本轮的规范构建完成，这里只执行测试。
+    """
+    generated_dir = task_dir / GENERATED_DIR
+    scratch_dir = task_dir / SCRATCH_DIR
+    pending_dir = task_dir / PENDING_DIR
+    pending_dir.mkdir(exist_ok=True)
+
+    contract_name = get_contract_name(contract_path)
+    with open(contract_path, "r", encoding="utf-8") as f:
+        pragma = pragma_line(f.read())
+
+    corpus = FuzzCorpus(task_dir)
+    stats = {"runs": 0, "calls": 0, "failures": 0, "known_failures": 0, "corpus_size": corpus.size()}
+
+    # 1. 从规范构建的产物读取 ABI
+    abi, error = read_abi(task_dir / "out", contract_path, contract_name)
+    if abi is None:
+        return "failed", f"ABI unavailable for {contract_name}: {error}", None
+
+    # 2. harness 由构建节点生成；不存在即没有可调用的写函数
+    harness_path = generated_dir / HARNESS_FILENAME
+    if not harness_path.exists():
+        print(f"DEBUG: {contract_name} has no state-changing entry points, skipping fuzzing.")
+        return "success", stats, None
+
+    # 3. 先重放语料中的历史反例。仍然有效的反例已在测试矩阵中 (回归验证会标红)，
+    #    本轮不再花预算重新发现同一个问题
+    digest = abi_hash(abi, contract_name, _import_path(contract_path, generated_dir), pragma)
+    import_path = _import_path(contract_path, scratch_dir)
+    try:
+        still_failing = replay_corpus(task_dir, corpus, digest, abi, contract_name, import_path, pragma)
     except Exception as e:
-        return "error", stats, None
\ No newline at end of file
+        print(f"Corpus replay failed: {e}")
+        still_failing = []
+    if still_failing:
+        stats["known_failures"] = len(still_failing)
+        stats["reason"] = still_failing[0].get("reason")
+        print(f"DEBUG: {len(still_failing)} known counterexample(s) still reproduce, skipping exploration.")
+        return "success", stats, harness_path
+
+    # 4. 新的探索：多 seed 并行、按覆盖率增长自适应分配预算
+    #    (失败持久化 / 语料目录 / 字典配置见 FuzzCorpus.foundry_env)
+    campaign = run_adaptive_fuzzing(task_dir, corpus, contract_path)
+    stats.update(
+        runs=campaign["runs"],
+        calls=campaign["calls"],
+        workers=campaign["workers"],
+        stopped_early=campaign["stopped_early"],
+        coverage_curve=campaign["coverage_curve"],
+        stop_reason=campaign["stop_reason"]
+    )
+
+    failure = campaign["failure"]
+    if failure:
+        stats["failures"] = 1
+        stats["reason"] = failure["reason"]
+        calls = failure["calls"]
+
+        # 🌟 关键逻辑：如果发现失败，先最小化调用序列再生成“复现脚本”
+        try:
+            shrunk = shrink_sequence(task_dir, abi, contract_name, import_path, pragma, calls, failure["reason"])
+        except Exception as e:
+            print(f"Counterexample shrinking failed: {e}")
+            shrunk = calls
+        print(f"DEBUG: Fuzzer found failure! Sequence length: {len(calls)} -> {len(shrunk)}")
+        stats.update(
+            original_length=len(calls),
+            sequence_length=len(shrunk),
+            bucket=crash_bucket(failure["reason"], shrunk)
+        )
+        calls = shrunk
+
+        # 固化为测试 (先放在 pending/，与 test/ 同级，import 路径不变)，回归验证会针对修复后的版本重放
+        repro_code = create_sequence_reproduction(
+            abi, contract_name, _import_path(contract_path, pending_dir), pragma, iteration, calls)
+        repro_filename = f"Exploit_Fuzzer_Repro_{iteration}.t.sol"  # 命名统一为 Exploit_
+        repro_path = pending_dir / repro_filename
+
+        with open(repro_path, "w", encoding="utf-8") as f:
+            f.write(repro_code)
+
+        corpus.record(digest, iteration, calls, failure["reason"], repro_filename, stats["bucket"])
+        stats["corpus_size"] = corpus.size()
+
+        # 返回新生成的固化文件路径，而不是 harness 路径
+        return "success", stats, repro_path
+
+    if campaign["completed"] == 0:
+        # 没有任何 worker 输出结果 (通常是编译失败)
+        return "failed", stats, harness_path
+
+    # 如果全是 Success，还是返回 harness 路径
+    return "success", stats, harness_path
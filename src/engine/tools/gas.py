@@ -0,0 +1,115 @@
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .docker_runner import run_forge, GENERATED_DIR
+from .fuzzer import get_contract_name, read_abi, _import_path
+from .harness import generate_gas_probe, gas_probe_functions, pragma_line, _signature
+
+GAS_PROBE_FILENAME = "GasProbe.t.sol"
+GAS_SNAPSHOT_FILENAME = "GasProbe.gas-snapshot"
+
+_SNAPSHOT_RE = re.compile(r"^\w+:testGas_(\d+)_\w+\(\) \(gas: (\d+)\)")
+
+
+def prepare_gas_probe(task_dir: Path, contract_path: Path, abi: list) -> Optional[Path]:
+    """
+    在规范构建之前生成 gas 探针 (test/generated/GasProbe.t.sol)，内容不变时不落盘。
+    合约没有写函数时删除旧探针并返回 None。
+    """
+    generated_dir = task_dir / GENERATED_DIR
+    generated_dir.mkdir(parents=True, exist_ok=True)
+    probe_path = generated_dir / GAS_PROBE_FILENAME
+
+    with open(contract_path, "r", encoding="utf-8") as f:
+        pragma = pragma_line(f.read())
+    probe = generate_gas_probe(abi, get_contract_name(contract_path), _import_path(contract_path, generated_dir), pragma)
+    if probe is None:
+        probe_path.unlink(missing_ok=True)
+        return None
+    if not probe_path.exists() or probe_path.read_text(encoding="utf-8") != probe:
+        probe_path.write_text(probe, encoding="utf-8")
+    return probe_path
+
+
+def run_gas_snapshot(task_dir: Path, contract_path: Path) -> Dict[str, int]:
+    """
+    对本轮规范构建中的 gas 探针执行 forge snapshot。
+    返回: {函数签名: gas}；合约没有写函数时为空。执行失败时抛出异常。
+    """
+    if not (task_dir / GENERATED_DIR / GAS_PROBE_FILENAME).exists():
+        return {}
+
+    contract_name = get_contract_name(contract_path)
+    abi, _ = read_abi(task_dir / "out", contract_path, contract_name)
+    if abi is None:
+        raise Exception(f"ABI unavailable for {contract_name}, canonical build missing")
+
+    artifacts_dir = task_dir / "artifacts"
+    artifacts_dir.mkdir(parents=True, exist_ok=True)
+    snapshot_path = artifacts_dir / GAS_SNAPSHOT_FILENAME
+    snapshot_path.unlink(missing_ok=True)
+    result = run_forge(
+        task_dir,
+        f"forge snapshot --match-path {GENERATED_DIR}/{GAS_PROBE_FILENAME} --snap artifacts/{GAS_SNAPSHOT_FILENAME}",
+        gas_probe=True
+    )
+    if not snapshot_path.exists():
+        raise Exception(f"forge snapshot produced no output: {((result.stdout or '') + (result.stderr or ''))[-1000:]}")
+
+    functions = gas_probe_functions(abi)
+    gas = {}
+    with open(snapshot_path, "r", encoding="utf-8") as f:
+        for line in f:
+            match = _SNAPSHOT_RE.match(line.strip())
+            if match and int(match.group(1)) < len(functions):
+                gas[_signature(functions[int(match.group(1))])] = int(match.group(2))
+    return gas
+
+
+def gas_baseline(rows: list, current_version: str, skip_rejected: bool) -> Tuple[Optional[str], Optional[Dict[str, int]]]:
+    """
+    从已落库的 GasReport 中选对比基线：当前版本之前最近的一个版本。
+    skip_rejected 时跳过含 regressed 记录的版本 (reject 模式下它们已被退回，不能成为基线)。
+    返回: (基线版本号, {函数签名: gas})；没有可用版本时为 (None, None)。
+    """
+    current = int(current_version.lstrip("v"))
+    versions: Dict[int, list] = {}
+    for row in rows:
+        number = int(row.version.lstrip("v"))
+        if number < current:
+            versions.setdefault(number, []).append(row)
+    for number in sorted(versions, reverse=True):
+        if skip_rejected and any(r.status == "regressed" for r in versions[number]):
+            continue
+        return f"v{number}", {r.function: r.gas for r in versions[number]}
+    return None, None
+
+
+def compare_gas(current: Dict[str, int], previous: Optional[Dict[str, int]], threshold_pct: float) -> List[dict]:
+    """
+    逐函数对比两个版本的 gas。previous 为 None 表示基线版本 (全部记为 new)。
+    返回: [{"function", "gas", "previous_gas", "delta", "delta_pct", "status"}]
+    """
+    rows = []
+    for function, gas in sorted(current.items()):
+        before = (previous or {}).get(function)
+        if before is None:
+            rows.append({"function": function, "gas": gas, "previous_gas": None,
+                         "delta": None, "delta_pct": None, "status": "new"})
+            continue
+        delta = gas - before
+        delta_pct = round(delta * 100 / before, 2) if before else None
+        regressed = delta > 0 and (delta_pct is None or delta_pct > threshold_pct)
+        rows.append({"function": function, "gas": gas, "previous_gas": before, "delta": delta,
+                     "delta_pct": delta_pct, "status": "regressed" if regressed else "ok"})
+    return rows
+
+
+def gas_regression_summary(rows: List[dict], threshold_pct: float) -> str:
+    """供蓝队参考的 gas 回归说明 (没有超阈值的函数时为空串)"""
+    regressed = [r for r in rows if r["status"] == "regressed"]
+    if not regressed:
+        return ""
+    items = "; ".join(f"{r['function']}: {r['previous_gas']} -> {r['gas']} gas (+{r['delta_pct']}%)" for r in regressed)
+    return f"Gas regressions above {threshold_pct}% on legitimate paths: {items}."
@@ -0,0 +1,609 @@
+"""
+根据 forge 编译产物中的 ABI 生成 Handler 式不变量测试 (forge invariant 模式)。
+
+生成内容:
+  - ReentrantActor: 收到 ETH 时以相同 calldata 重入一次目标合约
+  - FuzzHandler: 每个外部写函数一个入口 (参数有界)，记录每个 actor 的 ETH 净收益
+  - FuzzInvariantTest: 只以 Handler 为目标，断言标准的余额 / 记账不变量
+  - 复现测试: 按反例 calldata 序列重放 Handler 调用，不变量被打破即攻击成功
+  - 差分测试: 上一版本与当前版本并排部署，相同调用序列下比较两者的行为
+  - gas 探针: 每个写函数一个测试，forge snapshot 记录合法路径的 gas
+"""
+import hashlib
+import json
+import re
+from typing import List, Optional, Set
+
+# 生成逻辑有不兼容变化时递增，使缓存的 harness 失效
+HARNESS_VERSION = "2"
+
+# 有界参数的取值上限
+MAX_AMOUNT = "1000 ether"
+MAX_VALUE = "100 ether"
+
+_ACTOR_COUNT = 3
+
+
+def abi_hash(abi: list, contract_name: str, import_path: str, pragma: str) -> str:
+    payload = json.dumps({
+        "abi": abi,
+        "contract": contract_name,
+        "import": import_path,
+        "pragma": pragma,
+        "version": HARNESS_VERSION,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def pragma_line(source: str) -> str:
+    """沿用目标合约的 pragma，避免与锁定版本的合约编译器冲突"""
+    match = re.search(r'pragma solidity\s+[^;]+;', source)
+    return match.group(0) if match else "pragma solidity ^0.8.20;"
+
+
+def _supported(sol_type: str) -> bool:
+    # 数组 / 结构体参数不生成入口
+    return "[" not in sol_type and not sol_type.startswith("tuple")
+
+
+def _param(sol_type: str, name: str):
+    """
+    返回 (入口函数形参, 入口内的约束语句, 编码进 calldata 的表达式)。
+    uint256 按金额约束，address 从 actor / 目标合约中选取。
+    """
+    if sol_type == "uint256":
+        return f"uint256 {name}", f"{name} = bound({name}, 0, {MAX_AMOUNT});", name
+    if sol_type == "address":
+        return f"uint256 {name}Seed", "", f"_address({name}Seed)"
+    if sol_type in ("string", "bytes"):
+        return f"{sol_type} memory {name}", "", name
+    return f"{sol_type} {name}", "", name
+
+
+def _default_arg(sol_type: str) -> str:
+    """构造函数参数的默认值"""
+    if sol_type.startswith("uint") or sol_type.startswith("int"):
+        return f"{sol_type}({MAX_AMOUNT})" if sol_type == "uint256" else f"{sol_type}(0)"
+    if sol_type == "address":
+        return "address(this)"
+    if sol_type == "bool":
+        return "false"
+    if sol_type == "string":
+        return '""'
+    if sol_type == "bytes":
+        return 'bytes("")'
+    return f"{sol_type}(0)"
+
+
+def mutable_functions(abi: list) -> List[dict]:
+    """可由 Handler 调用的外部写函数 (不含 view/pure 及不支持的参数类型)"""
+    functions = []
+    for item in abi:
+        if item.get("type") != "function":
+            continue
+        if item.get("stateMutability") in ("view", "pure"):
+            continue
+        inputs = item.get("inputs", [])
+        if not all(_supported(i.get("type", "")) for i in inputs):
+            continue
+        functions.append(item)
+    return functions
+
+
+def _has_view(abi: list, name: str, inputs: List[str]) -> bool:
+    for item in abi:
+        if item.get("type") == "function" and item.get("name") == name \
+                and item.get("stateMutability") in ("view", "pure") \
+                and [i.get("type") for i in item.get("inputs", [])] == inputs:
+            outputs = item.get("outputs", [])
+            return len(outputs) == 1 and outputs[0].get("type") == "uint256"
+    return False
+
+
+def _handler_entry(item: dict, index: int) -> str:
+    name = item["name"]
+    types = [i["type"] for i in item.get("inputs", [])]
+    signature = f"{name}({','.join(types)})"
+    payable = item.get("stateMutability") == "payable"
+
+    params = ["uint256 actorSeed"]
+    bounds = []
+    args = []
+    for pos, sol_type in enumerate(types):
+        decl, bound_stmt, expr = _param(sol_type, f"p{pos}")
+        params.append(decl)
+        if bound_stmt:
+            bounds.append(bound_stmt)
+        if sol_type == "address":
+            # 作为参数传入的其他 actor (transfer / withdrawTo 的接收方) 可能合法地获得他人的资金
+            bounds.append(f"address a{pos} = {expr};")
+            bounds.append(f"_credit(actorSeed, a{pos});")
+            expr = f"a{pos}"
+        args.append(expr)
+    if payable:
+        params.append("uint256 value")
+        bounds.append(f"value = bound(value, 0, {MAX_VALUE});")
+
+    encode_args = "".join(f", {a}" for a in args)
+    body = "".join(f"        {b}\n" for b in bounds)
+    return f"""
+    function call_{index}_{name}({", ".join(params)}) public {{
+{body}        _call(actorSeed, {"value" if payable else "0"}, abi.encodeWithSignature("{signature}"{encode_args}));
+    }}
+"""
+
+
+def _invariant_checks(abi: list, contract_name: str) -> str:
+    checks = ["""        int256 netEth;
+        for (uint256 i = 0; i < actors.length; i++) {
+            netEth += ghost_netEth[actors[i]];
+            // 没有从其他 actor 获得过额度 (转账 / 代为提取) 的 actor 不应取回比投入更多的 ETH
+            if (!ghost_credited[actors[i]] && ghost_netEth[actors[i]] > 0)
+                return (false, "actor extracted more ETH than it deposited");
+        }
+        // 全体 actor 取回的 ETH 之和不应超过投入之和
+        if (netEth > 0) return (false, "actors extracted more ETH than they deposited");"""]
+
+    balance_getter = None
+    for getter in ("balances", "balanceOf"):
+        if _has_view(abi, getter, ["address"]):
+            balance_getter = getter
+            break
+
+    if balance_getter:
+        has_payable = any(i.get("stateMutability") == "payable" for i in abi if i.get("type") in ("function", "receive"))
+        if _has_view(abi, "totalSupply", []):
+            checks.append(f"""        uint256 sum;
+        for (uint256 i = 0; i < actors.length; i++) sum += target.{balance_getter}(actors[i]);
+        // 账本余额之和不得超过总供应量
+        if (sum > target.totalSupply()) return (false, "sum of balances exceeds totalSupply");""")
+        elif has_payable:
+            checks.append(f"""        uint256 owed;
+        for (uint256 i = 0; i < actors.length; i++) owed += target.{balance_getter}(actors[i]);
+        // 偿付能力：记账余额之和不得超过合约实际持有的 ETH
+        if (owed > address(target).balance) return (false, "recorded balances exceed contract ETH");""")
+
+    return "\n".join(checks)
+
+
+def _handler_source(abi: list, contract_name: str, suffix: str) -> str:
+    entries = [_handler_entry(item, idx) for idx, item in enumerate(mutable_functions(abi))]
+    if any(item.get("type") == "receive" for item in abi):
+        entries.append("""
+    function call_receive(uint256 actorSeed, uint256 value) public {
+        value = bound(value, 0, %s);
+        _call(actorSeed, value, "");
+    }
+""" % MAX_VALUE)
+
+    return f"""
+contract ReentrantActor{suffix} {{
+    address public target;
+    bytes public lastCall;
+    uint256 public depth;
+
+    function execute(address _target, uint256 value, bytes calldata data) external {{
+        target = _target;
+        lastCall = data;
+        depth = 0;
+        _target.call{{value: value}}(data);
+    }}
+
+    receive() external payable {{
+        // 收到 ETH 时以相同 calldata 重入一次
+        if (depth == 0 && target != address(0)) {{
+            depth = 1;
+            target.call(lastCall);
+        }}
+    }}
+}}
+
+contract FuzzHandler{suffix} is Test {{
+    {contract_name} public target;
+    ReentrantActor{suffix} public reentrant;
+    address[] public actors;
+    mapping(address => int256) public ghost_netEth;
+    mapping(address => bool) public ghost_credited;
+    uint256 public ghost_calls;
+
+    constructor({contract_name} _target) {{
+        target = _target;
+        reentrant = new ReentrantActor{suffix}();
+        for (uint256 i = 1; i <= {_ACTOR_COUNT}; i++) actors.push(address(uint160(0x10000 + i)));
+        actors.push(address(reentrant));
+    }}
+
+    function actorCount() public view returns (uint256) {{
+        return actors.length;
+    }}
+
+    function _address(uint256 seed) internal view returns (address) {{
+        uint256 idx = seed % (actors.length + 1);
+        return idx == actors.length ? address(target) : actors[idx];
+    }}
+
+    function _isActor(address account) internal view returns (bool) {{
+        for (uint256 i = 0; i < actors.length; i++) if (actors[i] == account) return true;
+        return false;
+    }}
+
+    function _credit(uint256 actorSeed, address to) internal {{
+        if (to != actors[bound(actorSeed, 0, actors.length - 1)] && _isActor(to)) ghost_credited[to] = true;
+    }}
+
+    function _call(uint256 actorSeed, uint256 value, bytes memory data) internal {{
+        address actor = actors[bound(actorSeed, 0, actors.length - 1)];
+        vm.deal(actor, actor.balance + value);
+        uint256[] memory before = new uint256[](actors.length);
+        for (uint256 i = 0; i < actors.length; i++) before[i] = actors[i].balance;
+        if (actor == address(reentrant)) {{
+            reentrant.execute(address(target), value, data);
+        }} else {{
+            vm.prank(actor);
+            address(target).call{{value: value}}(data);
+        }}
+        // 投入的 value 计为负，取回的 ETH 计为正；调用方之外收到 ETH 的 actor 视为获得了他人的额度
+        for (uint256 i = 0; i < actors.length; i++) {{
+            int256 delta = int256(actors[i].balance) - int256(before[i]);
+            ghost_netEth[actors[i]] += delta;
+            if (delta > 0 && actors[i] != actor) ghost_credited[actors[i]] = true;
+        }}
+        ghost_calls++;
+    }}
+{"".join(entries)}
+    function checkInvariants() public view returns (bool, string memory) {{
+{_invariant_checks(abi, contract_name)}
+        return (true, "");
+    }}
+}}
+"""
+
+
+def _deploy_expr(abi: list, contract_name: str) -> str:
+    ctor = next((i for i in abi if i.get("type") == "constructor"), None)
+    args = ", ".join(_default_arg(i["type"]) for i in (ctor or {}).get("inputs", []))
+    return f"new {contract_name}({args})"
+
+
+def generate_invariant_harness(abi: list, contract_name: str, import_path: str, pragma: str) -> Optional[str]:
+    """没有可调用的写函数时返回 None (无可模糊测试的入口)"""
+    if not mutable_functions(abi) and not any(i.get("type") == "receive" for i in abi):
+        return None
+
+    return f"""// 由 ABI 自动生成的不变量测试 (harness v{HARNESS_VERSION})
+{pragma}
+import "forge-std/Test.sol";
+import "{import_path}";
+{_handler_source(abi, contract_name, "")}
+contract FuzzInvariantTest is Test {{
+    {contract_name} public target;
+    FuzzHandler public handler;
+
+    function setUp() public {{
+        target = {_deploy_expr(abi, contract_name)};
+        handler = new FuzzHandler(target);
+        targetContract(address(handler));
+    }}
+
+    function invariant_accounting() public {{
+        (bool ok, string memory reason) = handler.checkInvariants();
+        assertTrue(ok, reason);
+    }}
+}}
+"""
+
+
+def counterexample_calls(counterexample) -> List[str]:
+    """
+    从 forge 的反例中取出 Handler 调用的 calldata 序列。
+    invariant 反例为 {"Sequence": [{"calldata": "0x..", ...}]}，部分版本直接给出列表。
+    """
+    if isinstance(counterexample, dict):
+        counterexample = counterexample.get("Sequence", [])
+    calls = []
+    for call in counterexample or []:
+        if isinstance(call, dict) and call.get("calldata"):
+            calls.append(call["calldata"])
+    return calls
+
+
+def _replay_lines(calls: List[str]) -> str:
+    return "\n".join(
+        f'        address(handler).call(hex"{data[2:] if data.startswith("0x") else data}");'
+        for data in calls
+    )
+
+
+def create_corpus_replay(abi: list, contract_name: str, import_path: str, pragma: str,
+                         sequences: List[List[str]], suffix: str = "_Replay",
+                         test_contract: str = "FuzzCorpusReplay") -> str:
+    """
+    语料重放测试：每个历史反例一个测试函数，重放后断言不变量成立。
+    测试失败 (test_replay_<序号>) 即该反例在当前版本上依然有效。
+    同一工程中的多个重放文件需使用不同的 suffix / test_contract 以免合约重名。
+    """
+    tests = "\n".join(f"""
+    function test_replay_{idx}() public {{
+{_replay_lines(calls)}
+        (bool ok, string memory reason) = handler.checkInvariants();
+        assertTrue(ok, reason);
+    }}""" for idx, calls in enumerate(sequences))
+    return f"""// 由 Fuzzer 语料自动生成的反例重放测试
+{pragma}
+import "forge-std/Test.sol";
+import "{import_path}";
+{_handler_source(abi, contract_name, suffix)}
+contract {test_contract} is Test {{
+    {contract_name} public target;
+    FuzzHandler{suffix} public handler;
+
+    function setUp() public {{
+        target = {_deploy_expr(abi, contract_name)};
+        handler = new FuzzHandler{suffix}(target);
+    }}
+{tests}
+}}
+"""
+
+
+def create_sequence_reproduction(abi: list, contract_name: str, import_path: str, pragma: str,
+                                 iteration: int, calls: List[str]) -> str:
+    """
+    将不变量反例固化为具体测试：按顺序重放 Handler 调用，最后断言不变量已被打破。
+    攻击成功 (测试通过) 即漏洞依然存在，与红队用例的判定方式一致。
+    """
+    suffix = f"_R{iteration}"
+    replay = _replay_lines(calls)
+    return f"""// 🔴 这是由 Fuzzer 自动生成的攻击复现代码
+// 调用序列已固化，用于确凿地证明漏洞存在
+{pragma}
+import "forge-std/Test.sol";
+import "{import_path}";
+{_handler_source(abi, contract_name, suffix)}
+contract Reproduce_Fuzz_Crash_{iteration} is Test {{
+    {contract_name} public target;
+    FuzzHandler{suffix} public handler;
+
+    function setUp() public {{
+        target = {_deploy_expr(abi, contract_name)};
+        handler = new FuzzHandler{suffix}(target);
+    }}
+
+    function testExploit_Fuzz_Reproduction() public {{
+{replay}
+        (bool ok, ) = handler.checkInvariants();
+        assertFalse(ok, "Invariants hold: vulnerability mitigated");
+    }}
+}}
+"""
+
+
+def _signature(item: dict) -> str:
+    return f"{item['name']}({','.join(i['type'] for i in item.get('inputs', []))})"
+
+
+def _diff_entry(item: dict, index: int) -> str:
+    signature = _signature(item)
+    payable = item.get("stateMutability") == "payable"
+
+    params = ["uint256 actorSeed"]
+    bounds = []
+    args_prev, args_next = [], []
+    for pos, sol_type in enumerate(i["type"] for i in item.get("inputs", [])):
+        decl, bound_stmt, expr = _param(sol_type, f"p{pos}")
+        params.append(decl)
+        if bound_stmt:
+            bounds.append(bound_stmt)
+        if sol_type == "address":
+            # 指向"目标合约自身"的地址参数需分别指向各自的部署实例
+            args_prev.append(f"_address(p{pos}Seed, address(prev))")
+            args_next.append(f"_address(p{pos}Seed, address(next))")
+        else:
+            args_prev.append(expr)
+            args_next.append(expr)
+    if payable:
+        params.append("uint256 value")
+        bounds.append(f"value = bound(value, 0, {MAX_VALUE});")
+
+    body = "".join(f"        {b}\n" for b in bounds)
+    return f"""
+    function call_{index}_{item["name"]}({", ".join(params)}) public {{
+{body}        _call(actorSeed, {"value" if payable else "0"}, "{signature}",
+            abi.encodeWithSignature("{signature}"{"".join(f", {a}" for a in args_prev)}),
+            abi.encodeWithSignature("{signature}"{"".join(f", {a}" for a in args_next)}));
+    }}
+"""
+
+
+def _comparable_views(prev_abi: list, next_abi: list, excluded: Set[str]) -> List[dict]:
+    """两个版本都有、参数为空或单个 address、且不在修补范围内的只读函数"""
+    prev_views = {_signature(i) for i in prev_abi
+                  if i.get("type") == "function" and i.get("stateMutability") in ("view", "pure")}
+    views = []
+    for item in next_abi:
+        if item.get("type") != "function" or item.get("stateMutability") not in ("view", "pure"):
+            continue
+        inputs = [i.get("type") for i in item.get("inputs", [])]
+        if inputs not in ([], ["address"]) or not item.get("outputs"):
+            continue
+        if item["name"] in excluded or _signature(item) not in prev_views:
+            continue
+        views.append(item)
+    return views
+
+
+def _view_checks(views: List[dict]) -> str:
+    checks = []
+    for item in views:
+        signature = _signature(item)
+        if item.get("inputs"):
+            checks.append(f"""        for (uint256 i = 0; i < actors.length; i++) {{
+            if (!_sameView(abi.encodeWithSignature("{signature}", actors[i]))) return (false, "view {signature} differs");
+        }}""")
+        else:
+            checks.append(f"""        if (!_sameView(abi.encodeWithSignature("{signature}"))) return (false, "view {signature} differs");""")
+    return "\n".join(checks)
+
+
+def generate_differential_harness(prev_abi: list, next_abi: list, prev_name: str, next_name: str,
+                                  prev_import: str, next_import: str, pragma: str,
+                                  excluded: Set[str]) -> Optional[str]:
+    """
+    差分不变量测试：上一版本 (以 <名称>_Prev 别名导入) 与当前版本并排部署，
+    Handler 以相同的 actor 与 calldata 依次调用两者，比较成功与否 / 返回数据 / 退回的 ETH，
+    并在每个序列后比较合约余额与只读函数。excluded 中的函数 (本轮修补的路径) 不参与比较。
+    两个版本没有共同的可调用入口时返回 None。
+    """
+    prev_signatures = {_signature(i) for i in mutable_functions(prev_abi)}
+    functions = [i for i in mutable_functions(next_abi)
+                 if _signature(i) in prev_signatures and i["name"] not in excluded]
+    if not functions:
+        return None
+
+    alias = f"{prev_name}_Prev"
+    entries = "".join(_diff_entry(item, idx) for idx, item in enumerate(functions))
+    return f"""// 由两个版本的 ABI 自动生成的差分测试 (harness v{HARNESS_VERSION})
+{pragma}
+import "forge-std/Test.sol";
+import {{{next_name}}} from "{next_import}";
+import {{{prev_name} as {alias}}} from "{prev_import}";
+
+contract DiffHandler is Test {{
+    {alias} public prev;
+    {next_name} public next;
+    address[] public actors;
+    string public divergence;
+
+    constructor({alias} _prev, {next_name} _next) {{
+        prev = _prev;
+        next = _next;
+        for (uint256 i = 1; i <= {_ACTOR_COUNT}; i++) actors.push(address(uint160(0x10000 + i)));
+    }}
+
+    function _address(uint256 seed, address self) internal view returns (address) {{
+        uint256 idx = seed % (actors.length + 1);
+        return idx == actors.length ? self : actors[idx];
+    }}
+
+    function _call(uint256 actorSeed, uint256 value, string memory label, bytes memory dataPrev, bytes memory dataNext) internal {{
+        address actor = actors[bound(actorSeed, 0, actors.length - 1)];
+
+        vm.deal(actor, value);
+        vm.prank(actor);
+        (bool okPrev, bytes memory retPrev) = address(prev).call{{value: value}}(dataPrev);
+        uint256 paidPrev = actor.balance;
+
+        vm.deal(actor, value);
+        vm.prank(actor);
+        (bool okNext, bytes memory retNext) = address(next).call{{value: value}}(dataNext);
+        uint256 paidNext = actor.balance;
+
+        // 只记录第一处分歧，之后的调用不再覆盖
+        if (bytes(divergence).length > 0) return;
+        if (okPrev != okNext) {{
+            divergence = string(abi.encodePacked(label, okPrev ? ": reverts only in the new version" : ": succeeds only in the new version"));
+        }} else if (okPrev && keccak256(retPrev) != keccak256(retNext)) {{
+            divergence = string(abi.encodePacked(label, ": return data differs"));
+        }} else if (paidPrev != paidNext) {{
+            divergence = string(abi.encodePacked(label, ": ETH returned to caller differs"));
+        }}
+    }}
+
+    function _sameView(bytes memory data) internal view returns (bool) {{
+        (bool okPrev, bytes memory retPrev) = address(prev).staticcall(data);
+        (bool okNext, bytes memory retNext) = address(next).staticcall(data);
+        return okPrev == okNext && keccak256(retPrev) == keccak256(retNext);
+    }}
+{entries}
+    function checkEquivalence() public view returns (bool, string memory) {{
+        if (bytes(divergence).length > 0) return (false, divergence);
+        if (address(prev).balance != address(next).balance) return (false, "contract ETH balance differs");
+{_view_checks(_comparable_views(prev_abi, next_abi, excluded))}
+        return (true, "");
+    }}
+}}
+
+contract DiffInvariantTest is Test {{
+    {alias} public prev;
+    {next_name} public next;
+    DiffHandler public handler;
+
+    function setUp() public {{
+        prev = {_deploy_expr(prev_abi, alias)};
+        next = {_deploy_expr(next_abi, next_name)};
+        handler = new DiffHandler(prev, next);
+        targetContract(address(handler));
+    }}
+
+    function invariant_equivalence() public {{
+        (bool ok, string memory reason) = handler.checkEquivalence();
+        assertTrue(ok, reason);
+    }}
+}}
+"""
+
+
+def _probe_arg(sol_type: str) -> str:
+    """gas 探针调用的固定参数 (合法用户的典型取值)"""
+    if sol_type == "uint256":
+        return "1 ether"
+    if sol_type.startswith("uint") or sol_type.startswith("int"):
+        return f"{sol_type}(1)"
+    if sol_type == "address":
+        return "address(uint160(0x10001))"
+    if sol_type == "bool":
+        return "true"
+    if sol_type == "string":
+        return '"probe"'
+    if sol_type == "bytes":
+        return 'bytes("probe")'
+    return f"{sol_type}(0)"
+
+
+def gas_probe_functions(abi: list) -> List[dict]:
+    """参与 gas 探针的函数，顺序与 testGas_<序号>_<函数名> 一致"""
+    return mutable_functions(abi)
+
+
+def generate_gas_probe(abi: list, contract_name: str, import_path: str, pragma: str) -> Optional[str]:
+    """
+    合法路径 gas 探针 (forge snapshot)：部署者在 setUp 中先以无参 payable 函数 / receive 存入 ETH，
+    每个测试只调用一个写函数，测试 gas 即该函数在典型状态下的开销。
+    使用 low-level call，修复后某个路径开始 revert 时仍会产生可比的记录。
+    """
+    functions = gas_probe_functions(abi)
+    if not functions:
+        return None
+
+    funding = [f'        address(target).call{{value: 10 ether}}(abi.encodeWithSignature("{_signature(i)}"));'
+               for i in functions if i.get("stateMutability") == "payable" and not i.get("inputs")]
+    if not funding and any(i.get("type") == "receive" for i in abi):
+        funding.append('        address(target).call{value: 10 ether}("");')
+
+    tests = []
+    for idx, item in enumerate(functions):
+        signature = _signature(item)
+        args = "".join(f", {_probe_arg(i['type'])}" for i in item.get("inputs", []))
+        value = "{value: 1 ether}" if item.get("stateMutability") == "payable" else ""
+        tests.append(f"""
+    function testGas_{idx}_{item["name"]}() public {{
+        address(target).call{value}(abi.encodeWithSignature("{signature}"{args}));
+    }}""")
+
+    return f"""// 由 ABI 自动生成的合法路径 gas 探针 (harness v{HARNESS_VERSION})
+{pragma}
+import "forge-std/Test.sol";
+import "{import_path}";
+
+contract GasProbeTest is Test {{
+    {contract_name} public target;
+
+    receive() external payable {{}}
+
+    function setUp() public {{
+        vm.deal(address(this), 100 ether);
+        target = {_deploy_expr(abi, contract_name)};
+{"".join(f"{line}{chr(10)}" for line in funding)}    }}
+{chr(10).join(tests)}
+}}
+"""
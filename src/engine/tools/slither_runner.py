@@ -1,5 +1,4 @@
 import json
-import shutil
 from src.engine.tools.docker_runner import run_docker_command
 
 
@@ -9,60 +8,34 @@ def run_slither_scan(file_manager, version: str) -> str:
     参数:
       version: 当前版本号 (e.g., "v1", "v2")
 
-    保存路径: storage/tasks/{id}/artifacts/slither_report_{version}.json
+    直接读取本轮规范构建 (forge build) 的 out/build-info，不再自行选择 solc 版本重新编译。
+    保存路径: {工作区}/artifacts/slither_report_{version}.json (节点结束时持久化到 storage/tasks/{id})
     返回: 格式化后的 Markdown 报告字符串
     """
-    # 1. 准备工作目录：统一使用 artifacts 目录
-    artifacts_dir = file_manager.task_dir / "artifacts"
+    # 1. 准备输出目录
+    artifacts_dir = file_manager.work_dir / "artifacts"
     if not artifacts_dir.exists():
         artifacts_dir.mkdir(parents=True, exist_ok=True)
 
-    contract_name = file_manager.task.contract_name
-
-    # 自动同步逻辑：确保 artifacts 目录下有合约文件
-    root_contract_path = file_manager.task_dir / contract_name
-    artifact_contract_path = artifacts_dir / contract_name
-
-    if root_contract_path.exists() and not artifact_contract_path.exists():
-        shutil.copy(root_contract_path, artifact_contract_path)
-        print(f"DEBUG: Copied contract to artifacts: {artifact_contract_path}")
-
-    # 2. 确定 Solidity 版本
-    solc_version = "0.8.20"  # 默认
-    try:
-        if artifact_contract_path.exists():
-            with open(artifact_contract_path, "r", encoding="utf-8") as f:
-                content = f.read()
-                import re
-                match = re.search(r'pragma solidity\s+([^;]+);', content)
-                if match:
-                    ver_str = match.group(1)
-                    nums = re.findall(r'(\d+\.\d+\.\d+)', ver_str)
-                    if nums:
-                        solc_version = nums[0]
-    except Exception as e:
-        print(f"Version detection failed: {e}")
-
-    # 3. 构造带版本号的文件名
+    # 2. 构造带版本号的文件名；Slither 不会覆盖已有的 JSON 报告
     report_filename = f"slither_report_{version}.json"
+    report_path = artifacts_dir / report_filename
+    report_path.unlink(missing_ok=True)
 
-    # 4. 构造命令
+    # 3. 构造命令：只分析 src/ 下的当前版本 (依赖库、测试与上一版本不计入)
     cmd = (
-        f"solc-select install {solc_version} && "
-        f"solc-select use {solc_version} && "
-        f"slither {contract_name} "
+        "slither . --ignore-compile --foundry-out-directory out "
+        '--filter-paths "lib/|test/|DiffPrevious" '
         "--exclude-informational --exclude-optimization --exclude-low "
-        f"--json {report_filename}"
+        f"--json artifacts/{report_filename}"
     )
 
-    print(f"DEBUG: Running Slither ({version}) in artifacts dir: {cmd}")
+    print(f"DEBUG: Running Slither ({version}) on canonical build: {cmd}")
 
-    # 5. 执行 Docker 命令
-    stdout, stderr = run_docker_command(artifacts_dir, cmd)
-
-    # 6. 读取生成的 JSON 报告
-    report_path = artifacts_dir / report_filename
+    # 4. 执行 Docker 命令
+    stdout, stderr = run_docker_command(file_manager.work_dir, cmd)
 
+    # 5. 读取生成的 JSON 报告
     if not report_path.exists():
         return f"Slither failed to generate report ({version}).\n\nSTDOUT:\n{stdout}\n\nSTDERR:\n{stderr}"
 
@@ -94,4 +67,47 @@ def run_slither_scan(file_manager, version: str) -> str:
         return formatted_report
 
     except Exception as e:
-        return f"Error parsing Slither JSON: {str(e)}"
\ No newline at end of file
+        return f"Error parsing Slither JSON: {str(e)}"
+
+
+# 交给红队的严重程度，与扫描参数 (--exclude-low/-informational/-optimization) 保持一致
+EXPLOITABLE_IMPACTS = ("High", "Medium")
+
+
+def load_slither_findings(file_manager, version: str) -> list:
+    """
+    读取 run_slither_scan 生成的 JSON 报告，按检测器 (check) 分组，只保留 High / Medium。
+    同一检测器的多处命中通常可以用同一个攻击脚本证明，作为红队的一个任务。
+    返回: [{"check", "impact", "count", "report"}]，按严重程度排序；报告缺失时返回空列表
+    """
+    report_path = file_manager.work_dir / "artifacts" / f"slither_report_{version}.json"
+    if not report_path.exists():
+        return []
+
+    try:
+        with open(report_path, "r", encoding="utf-8") as f:
+            detectors = json.load(f).get("results", {}).get("detectors", [])
+    except Exception as e:
+        print(f"Slither findings parse failed: {e}")
+        return []
+
+    groups = {}
+    for item in detectors:
+        if item.get("impact") not in EXPLOITABLE_IMPACTS:
+            continue
+        check = item.get("check", "Unknown")
+        group = groups.setdefault(check, {"check": check, "impact": item.get("impact", "Unknown"), "descriptions": []})
+        group["descriptions"].append(item.get("description", "No description").strip())
+
+    impact_order = {impact: i for i, impact in enumerate(EXPLOITABLE_IMPACTS)}
+    findings = []
+    for group in sorted(groups.values(), key=lambda g: impact_order[g["impact"]]):
+        report = f"### Slither Finding ({version}): {group['check']} [{group['impact']}]\n\n"
+        report += "\n".join(f"- {d}" for d in group["descriptions"])
+        findings.append({
+            "check": group["check"],
+            "impact": group["impact"],
+            "count": len(group["descriptions"]),
+            "report": report
+        })
+    return findings
\ No newline at end of file
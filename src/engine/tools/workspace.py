@@ -0,0 +1,220 @@
+"""
+任务工作区 = 只读的共享基础层 + 每个任务的可写层。
+
+  - 基础层 storage/base/: lib/forge-std、foundry.toml、remappings.txt，全局只安装一次，
+    以只读方式挂载进容器 (/app/lib、/app/foundry.toml、/app/remappings.txt)
+  - 可写层 {WORKSPACE_ROOT}/{task_id}/: 源码、生成的 harness、out/、cache/ 等中间文件，
+    可配置到独立目录或 tmpfs (WORKSPACE_TMPFS=true 时为 /dev/shm/soliforge)
+  - storage/tasks/{task_id}/ 只保存声明过的产物 (PERSISTED)，由节点结束时同步，任务结束后释放可写层
+
+未配置独立根目录，或其剩余空间不足 WORKSPACE_MIN_FREE_MB 时，新任务的可写层就是 storage/tasks/{task_id} 本身
+(与旧行为一致)；已创建的可写层不会中途迁移。
+"""
+import functools
+import os
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from typing import List, Optional
+
+from src.core.config import settings
+from src.core.tracing import span
+
+TASKS_ROOT = settings.STORAGE_DIR / "tasks"
+BASE_LAYER = settings.STORAGE_DIR / "base"
+
+FOUNDRY_CONFIG = """[profile.default]
+src = 'src'
+test = 'test'
+out = 'out'
+libs = ['lib']
+cache_path = 'cache'
+build_info = true
+"""
+REMAPPINGS = "forge-std/=lib/forge-std/src/\n"
+
+# 需要持久化的产物 (目录 -> 相对该目录的 glob)，其余文件 (out/ cache/ scratch/ pending/ 生成的 harness 等) 随工作区释放
+PERSISTED = {
+    "artifacts": "*",  # Slither 报告、gas 快照
+    "fuzz_corpus": "**/*",  # 模糊测试语料与历史反例，跨轮次 / 重启复用
+    "test": "*.t.sol",  # 测试矩阵中的攻击脚本 (不含 test/generated/)
+}
+
+_base_lock = threading.Lock()
+_workspace_lock = threading.Lock()
+# 因独立根目录空间不足而直接在 storage 下工作的任务，任务结束前不再迁移
+_on_disk = set()
+
+
+def separate_root() -> Optional[Path]:
+    """可写层的独立根目录 (WORKSPACE_ROOT 或 tmpfs)；未配置时返回 None"""
+    if settings.WORKSPACE_ROOT:
+        return Path(settings.WORKSPACE_ROOT)
+    shm = Path("/dev/shm")
+    if settings.WORKSPACE_TMPFS and shm.is_dir() and os.access(shm, os.W_OK):
+        return shm / "soliforge"
+    return None
+
+
+def workspace_roots() -> List[Path]:
+    """可能存放可写层的全部根目录 (独立根目录在前)"""
+    root = separate_root()
+    if root is None or root.absolute() == TASKS_ROOT.absolute():
+        return [TASKS_ROOT]
+    return [root, TASKS_ROOT]
+
+
+def _has_room(root: Path) -> bool:
+    probe = root if root.exists() else root.parent
+    try:
+        free = shutil.disk_usage(probe).free
+    except OSError:
+        return False
+    return free >= settings.WORKSPACE_MIN_FREE_MB * 1024 * 1024
+
+
+def storage_dir(task_id: str) -> Path:
+    return TASKS_ROOT / task_id
+
+
+def workspace_dir(task_id: str) -> Path:
+    """任务的可写层：已存在的优先 (不中途迁移)，新任务在独立根目录空间不足时退回 storage"""
+    root = separate_root()
+    if root is None or task_id in _on_disk:
+        return storage_dir(task_id)
+    ws = root / task_id
+    if ws.exists() or _has_room(root):
+        return ws
+    return storage_dir(task_id)
+
+
+def _write_if_changed(path: Path, content: str):
+    if path.exists() and path.read_text(encoding="utf-8") == content:
+        return
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(content, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def ensure_base_layer() -> Path:
+    """安装共享基础层 (forge-std 只 clone 一次)，配置内容变化时覆盖"""
+    with _base_lock:
+        BASE_LAYER.mkdir(parents=True, exist_ok=True)
+        _write_if_changed(BASE_LAYER / "foundry.toml", FOUNDRY_CONFIG)
+        _write_if_changed(BASE_LAYER / "remappings.txt", REMAPPINGS)
+
+        forge_std_dir = BASE_LAYER / "lib" / "forge-std"
+        if (forge_std_dir / "src" / "Test.sol").exists():
+            return BASE_LAYER
+        shutil.rmtree(forge_std_dir, ignore_errors=True)
+
+        cmd = [
+            "docker", "run", "--rm", "--entrypoint", "",
+            "-v", f"{BASE_LAYER.absolute()}:/base", "-w", "/base",
+            "ghcr.io/foundry-rs/foundry:latest",
+            "/bin/sh", "-c",
+            "mkdir -p lib && git clone --depth 1 https://github.com/foundry-rs/forge-std lib/forge-std"
+        ]
+        with span("docker.git", kind="executor", tool="git", command="git clone forge-std"):
+            try:
+                subprocess.run(cmd, check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            except OSError as e:
+                print(f"⚠️ forge-std install failed: {e}")
+    return BASE_LAYER
+
+
+def base_mounts() -> List[str]:
+    """挂载共享基础层的 docker 参数 (只读，覆盖工作区中的同名路径)"""
+    base = BASE_LAYER.absolute()
+    return [
+        "-v", f"{base / 'lib'}:/app/lib:ro",
+        "-v", f"{base / 'foundry.toml'}:/app/foundry.toml:ro",
+        "-v", f"{base / 'remappings.txt'}:/app/remappings.txt:ro",
+    ]
+
+
+def _declared_files(root: Path, name: str) -> dict:
+    folder = root / name
+    if not folder.is_dir():
+        return {}
+    return {p.relative_to(root): p for p in folder.glob(PERSISTED[name]) if p.is_file()}
+
+
+def open_workspace(task_id: str) -> Path:
+    """取任务的可写层；首次打开 (或进程重启后) 从 storage 恢复已持久化的产物"""
+    ws = workspace_dir(task_id)
+    if ws.exists() and (ws != storage_dir(task_id) or task_id in _on_disk or separate_root() is None):
+        return ws
+    with _workspace_lock:
+        ws = workspace_dir(task_id)
+        if ws == storage_dir(task_id) and separate_root() is not None and task_id not in _on_disk:
+            _on_disk.add(task_id)
+            print(f"⚠️ Workspace root {separate_root()} is low on space; task {task_id[:8]} works in {ws}")
+        if ws.exists():
+            return ws
+        tmp_dir = ws.with_name(f".{task_id}.{os.getpid()}.tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        source = storage_dir(task_id)
+        for name in PERSISTED:
+            for relative, path in _declared_files(source, name).items():
+                (tmp_dir / relative).parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(path, tmp_dir / relative)
+        os.replace(tmp_dir, ws)
+    return ws
+
+
+def persist_artifacts(task_id: str, *names: str) -> int:
+    """
+    把可写层中声明的产物同步到 storage (只复制大小 / 修改时间变化的文件，并删除可写层中已不存在的文件)。
+    返回复制的文件数；可写层就是 storage 时什么也不做。
+    """
+    ws, dest = workspace_dir(task_id), storage_dir(task_id)
+    if not ws.exists() or ws.resolve() == dest.resolve():
+        return 0
+
+    copied = 0
+    for name in names or tuple(PERSISTED):
+        current = _declared_files(ws, name)
+        for relative, path in current.items():
+            target = dest / relative
+            stat = path.stat()
+            if target.exists():
+                saved = target.stat()
+                if saved.st_size == stat.st_size and saved.st_mtime_ns == stat.st_mtime_ns:
+                    continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(path, target)
+            copied += 1
+        for relative, path in _declared_files(dest, name).items():
+            if relative not in current:
+                path.unlink(missing_ok=True)
+    return copied
+
+
+def persists(*names: str):
+    """LangGraph 节点装饰器：节点结束时 (包括失败) 持久化其声明的产物"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(state, *args, **kwargs):
+            try:
+                return func(state, *args, **kwargs)
+            finally:
+                with span("workspace.persist", kind="io", artifacts=",".join(names)) as sp:
+                    sp.set("copied", persist_artifacts(state["task_id"], *names))
+
+        return wrapper
+
+    return decorator
+
+
+def release_workspace(task_id: str):
+    """任务结束：同步全部声明的产物后删除可写层"""
+    persist_artifacts(task_id)
+    ws = workspace_dir(task_id)
+    if ws.exists() and ws.resolve() != storage_dir(task_id).resolve():
+        shutil.rmtree(ws, ignore_errors=True)
+    with _workspace_lock:
+        _on_disk.discard(task_id)
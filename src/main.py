@@ -1,14 +1,21 @@
 import uvicorn
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from src.api.routes import tasks, auth
+from src.api.routes import tasks, auth, system
 from src.core.config import settings
+from src.core.logger import log_sink
+from src.core.metrics import registry
+from src.engine.retention import storage_gc
 from src.db.session import engine
 from src.db.base import Base
+from src.db.search import ensure_task_search_index
 
 # 创建数据库表 (如果表不存在)
 # 注意：在生产环境中通常使用 Alembic 做迁移，但开发环境这样最快
 Base.metadata.create_all(bind=engine)
+# 任务名全文索引 (SQLite FTS5 / MySQL FULLTEXT)
+ensure_task_search_index(engine)
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
@@ -28,6 +35,26 @@ app.add_middleware(
 # 注册路由
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(tasks.router, prefix="/api/tasks", tags=["tasks"])
+app.include_router(system.router, prefix="/api/system", tags=["system"])
+
+
+
+# Prometheus 抓取端点
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.on_event("startup")
+def start_storage_gc():
+    storage_gc.start()
+
+
+@app.on_event("shutdown")
+def flush_logs_on_shutdown():
+    # 退出前把内存中尚未落库的日志写完
+    log_sink.shutdown()
+    storage_gc.stop()
 
 if __name__ == "__main__":
     uvicorn.run(
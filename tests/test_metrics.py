@@ -0,0 +1,76 @@
+"""
+/metrics 抓取测试：端点可用、输出符合 Prometheus 文本格式 (text/plain; version=0.0.4)。
+运行: pip install -r requirements-dev.txt && python -m pytest -q
+"""
+import os
+import re
+import tempfile
+
+# 使用临时 SQLite 库，避免导入 src.main 时在项目根目录建表
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/metrics_test.db")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from src.core.metrics import CACHE_REQUESTS, SCHEDULER_WAIT_SECONDS  # noqa: E402
+from src.main import app  # noqa: E402
+
+# 样本行: 名称{标签} 数值
+SAMPLE_RE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*"'
+                       r'(,[a-zA-Z_][a-zA-Z0-9_]*="(?:[^"\\]|\\.)*")*\})? (-?[0-9.e+-]+|[+-]Inf|NaN)$')
+
+EXPECTED_FAMILIES = {
+    "soliforge_scheduler_waits_total": "counter",
+    "soliforge_scheduler_wait_seconds": "histogram",
+    "soliforge_container_run_seconds": "histogram",
+    "soliforge_llm_tokens_total": "counter",
+    "soliforge_cache_requests_total": "counter",
+    "soliforge_queue_depth": "gauge",
+    "soliforge_running_tasks": "gauge",
+    "soliforge_gc_reclaimed_bytes_total": "counter",
+}
+
+
+def _scrape() -> str:
+    client = TestClient(app)
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    return response.text
+
+
+def test_metrics_exposes_expected_families():
+    body = _scrape()
+    types = dict(re.findall(r"^# TYPE (\S+) (\S+)$", body, re.M))
+    helps = set(re.findall(r"^# HELP (\S+) .+$", body, re.M))
+    for name, kind in EXPECTED_FAMILIES.items():
+        assert types.get(name) == kind, name
+        assert name in helps, name
+
+
+def test_metrics_exposition_format():
+    CACHE_REQUESTS.inc(cache="metrics_test", result="hit")
+    SCHEDULER_WAIT_SECONDS.observe(0.2)
+    body = _scrape()
+    assert body.endswith("\n")
+
+    declared = set()
+    for line in body.splitlines():
+        if line.startswith("# HELP "):
+            continue
+        if line.startswith("# TYPE "):
+            name = line.split()[2]
+            assert name not in declared, f"duplicate family {name}"
+            declared.add(name)
+            continue
+        assert SAMPLE_RE.match(line), f"malformed sample: {line!r}"
+        name = re.split(r"[{ ]", line, 1)[0]
+        assert name in declared or re.sub(r"_(bucket|sum|count)$", "", name) in declared, line
+
+    assert 'soliforge_cache_requests_total{cache="metrics_test",result="hit"} 1' in body
+    # 直方图: 累积桶、+Inf 桶等于 _count
+    buckets = re.findall(r'^soliforge_scheduler_wait_seconds_bucket\{le="([^"]+)"\} (\S+)$', body, re.M)
+    counts = [float(v) for _, v in buckets]
+    assert counts == sorted(counts)
+    assert buckets[-1][0] == "+Inf"
+    total = re.search(r"^soliforge_scheduler_wait_seconds_count (\S+)$", body, re.M).group(1)
+    assert float(buckets[-1][1]) == float(total)